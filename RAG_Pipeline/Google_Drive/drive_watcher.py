@@ -1,11 +1,22 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set, Tuple
 from datetime import datetime, timedelta, timezone
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseDownload, set_user_agent
+from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+import threading
+import copy
+import logging
 import random
 import time
 import json
@@ -14,14 +25,145 @@ import os
 import io
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from common.text_processor import extract_text_from_file, chunk_text, create_embeddings
-from common.db_handler import process_file_for_rag, delete_document_by_file_id
+from common.db_handler import process_file_for_rag, process_files_for_rag, delete_document_by_file_id
+
+logger = logging.getLogger(__name__)
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/drive.metadata.readonly',
           'https://www.googleapis.com/auth/drive.readonly']
 
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Drive accepts at most 100 calls in a single batch request
+BATCH_PROBE_SIZE = 100
+
+# Statuses and 403 reasons that Drive documents as safe to retry with backoff
+RETRYABLE_STATUSES = {429, 500, 502, 503}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+# Drive only gzips responses for clients whose user agent contains "gzip"
+USER_AGENT = 'brainforge-drive-watcher (gzip)'
+
+# Size of each ranged download request; bounds the response body held on top of
+# the file buffer (MediaIoBaseDownload defaults to 100 MB)
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Refresh credentials this long before they expire so a cycle never stalls on it
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+# A saved known_files cache older than this is rebuilt with a fresh scan
+KNOWN_FILES_MAX_AGE = 24 * 60 * 60
+
+# Minimum seconds between config rewrites when only last_check_time changed
+CONFIG_SAVE_INTERVAL = 5 * 60
+
+# Lifetime requested for push notification channels, and how long before expiry
+# they are renewed
+CHANNEL_LIFETIME = timedelta(days=1)
+CHANNEL_RENEW_MARGIN = timedelta(minutes=10)
+
+# While a push channel is open, polling is only a reconciliation pass for missed
+# notifications, so it runs this rarely (in seconds) unless the interval is longer
+PUSH_RECONCILE_INTERVAL = 15 * 60
+
+# Number of changed files downloaded and processed concurrently
+MAX_PROCESS_WORKERS = 8
+
+# Configuration used when the config file is missing or unreadable
+DEFAULT_CONFIG = {
+    "supported_mime_types": [
+        "application/pdf",
+        "text/plain",
+        "text/html",
+        "text/csv",
+        "application/vnd.google-apps.document",
+        "application/vnd.google-apps.spreadsheet",
+        "application/vnd.google-apps.presentation"
+    ],
+    "export_mime_types": {
+        "application/vnd.google-apps.document": "text/plain",
+        "application/vnd.google-apps.spreadsheet": "text/csv",
+        "application/vnd.google-apps.presentation": "text/plain"
+    },
+    "text_processing": {
+        "default_chunk_size": 400,
+        "default_chunk_overlap": 0
+    },
+    "last_check_time": "1970-01-01T00:00:00.000Z"
+}
+
+def parse_drive_time(value: str) -> datetime:
+    """
+    Parse an RFC 3339 timestamp as used by Drive and the config file.
+    
+    Args:
+        value: Timestamp such as '2023-01-01T00:00:00.000Z'
+        
+    Returns:
+        Timezone-aware datetime in UTC
+    """
+    # fromisoformat only accepts a trailing 'Z' from Python 3.11 on
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def format_drive_time(value: datetime) -> str:
+    """
+    Format a UTC datetime as an RFC 3339 timestamp for Drive queries and the config file.
+    
+    Args:
+        value: Datetime in UTC (naive values are taken as UTC)
+        
+    Returns:
+        Timestamp such as '2023-01-01T00:00:00.000000Z'
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec='microseconds') + 'Z'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+class _NotificationHandler(BaseHTTPRequestHandler):
+    """
+    Receives Drive push notifications and wakes the watcher.
+    """
+    def do_POST(self):
+        watcher = self.server.watcher
+        channel = watcher.channel
+        if channel and self.headers.get('X-Goog-Channel-ID') == channel['id']:
+            # The first message on a new channel only confirms it ('sync')
+            if self.headers.get('X-Goog-Resource-State') != 'sync':
+                watcher.wake_event.set()
+        self.send_response(200)
+        self.end_headers()
+    
+    def log_message(self, format, *args):
+        pass
+
+class OrjsonModel(JsonModel):
+    """
+    JsonModel that parses Drive API responses with orjson.
+    """
+    def deserialize(self, content):
+        try:
+            body = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return content.decode('utf-8') if isinstance(content, bytes) else content
+        if self._data_wrapper and isinstance(body, dict) and 'data' in body:
+            body = body['data']
+        return body
+
 class GoogleDriveWatcher:
     def __init__(self, credentials_path: str = 'credentials.json', token_path: str = 'token.json', folder_id: str = None, config_path: str = None):
         """
@@ -36,8 +178,23 @@ class GoogleDriveWatcher:
         self.token_path = token_path
         self.folder_id = folder_id
         self.service = None
+        self.credentials = None
+        self._thread_local = threading.local()  # Per-thread Drive services for worker threads
+        self._known_files_lock = threading.Lock()
         self.known_files = {}  # Store file IDs and their last modified time
+        self.parents_index = {}  # Map folder IDs to the IDs of their direct children
+        self.watched_ids = set()  # IDs of the watched folder and everything below it
+        self.page_token = None  # Changes API token to resume from
+        self._config_saved_at = None  # time.monotonic() of the last config write
+        self._formatted_check_time = None  # (last_check_time, its config string) as last formatted
+        self._saved_page_token = None  # Page token as of the last config write
         self.initialized = False  # Flag to track if we've done the initial scan
+        self.wake_event = threading.Event()  # Set by push notifications to check early
+        self.channel = None  # Active push notification channel, if any
+        self._notification_server = None
+        self._mime_supported: Dict[str, bool] = {}  # MIME type -> supported, cached from config by load_config
+        self._supported_mime_prefixes: Tuple[str, ...] = ()  # Cached from config by load_config
+        self._export_mime_types: Dict[str, str] = {}  # Cached from config by load_config
         
         # Load configuration
         self.config = {}
@@ -46,6 +203,8 @@ class GoogleDriveWatcher:
         else:
             # Default to config.json in the same directory as this script
             self.config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+        # Sidecar file caching known_files between runs
+        self.known_files_path = os.path.splitext(self.config_path)[0] + '.known_files.json'
         self.load_config()
         
     def load_config(self) -> None:
@@ -60,58 +219,118 @@ class GoogleDriveWatcher:
             # Load the last check time from config
             last_check_time_str = self.config.get('last_check_time', '1970-01-01T00:00:00.000Z')
             try:
-                self.last_check_time = datetime.strptime(last_check_time_str, '%Y-%m-%dT%H:%M:%S.%fZ')
+                self.last_check_time = parse_drive_time(last_check_time_str)
                 print(f"Resuming from last check time: {self.last_check_time}")
             except ValueError:
                 # If the date format is invalid, use the default
-                self.last_check_time = datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+                self.last_check_time = EPOCH
                 print("Invalid last check time format in config, using default")
 
+            # Load the Changes API page token from config
+            self.page_token = self.config.get('start_page_token')
+
+            # Optional public URL that Drive push notifications are sent to
+            self.webhook_url = self.config.get('webhook_url')
+            self.webhook_port = self.config.get('webhook_port', 8080)
+
             if not self.folder_id:
                 self.folder_id = self.config.get('watch_folder_id', None)                  
                 
         except Exception as e:
             print(f"Error loading configuration: {e}")
-            self.config = {
-                "supported_mime_types": [
-                    "application/pdf",
-                    "text/plain",
-                    "text/html",
-                    "text/csv",
-                    "application/vnd.google-apps.document",
-                    "application/vnd.google-apps.spreadsheet",
-                    "application/vnd.google-apps.presentation"
-                ],
-                "export_mime_types": {
-                    "application/vnd.google-apps.document": "text/plain",
-                    "application/vnd.google-apps.spreadsheet": "text/csv",
-                    "application/vnd.google-apps.presentation": "text/plain"
-                },
-                "text_processing": {
-                    "default_chunk_size": 400,
-                    "default_chunk_overlap": 0
-                },
-                "last_check_time": "1970-01-01T00:00:00.000Z"
-            }
-            self.last_check_time = datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+            self.config = copy.deepcopy(DEFAULT_CONFIG)
+            self.last_check_time = EPOCH
+            self.webhook_url = None
+            self.webhook_port = 8080
             print("Using default configuration")          
+        
+        # Cache the lookups used for every processed file
+        supported_mime_types = self.config.get('supported_mime_types', [])
+        self._mime_supported = dict.fromkeys(supported_mime_types, True)
+        self._supported_mime_prefixes = tuple(supported_mime_types)
+        self._export_mime_types = self.config.get('export_mime_types', {})
             
-    def save_last_check_time(self) -> None:
+    def save_last_check_time(self, force: bool = False) -> None:
         """
-        Save the last check time to the config file.
+        Save the last check time and the Changes API page token to the config file.
+        
+        The file is only rewritten when the page token moved or CONFIG_SAVE_INTERVAL
+        has passed since the last save, since the time alone changes every cycle.
+        
+        Args:
+            force: Write the file even if neither has happened
         """
+        # Update the last_check_time in the config, formatting it only when it changed
+        if self._formatted_check_time is None or self._formatted_check_time[0] is not self.last_check_time:
+            self._formatted_check_time = (self.last_check_time, format_drive_time(self.last_check_time))
+        self.config['last_check_time'] = self._formatted_check_time[1]
+        if self.page_token:
+            self.config['start_page_token'] = self.page_token
+        
+        now = time.monotonic()
+        if (not force
+                and self._config_saved_at is not None
+                and self.page_token == self._saved_page_token
+                and now - self._config_saved_at < CONFIG_SAVE_INTERVAL):
+            return
+        
         try:
-            # Update the last_check_time in the config
-            self.config['last_check_time'] = self.last_check_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            
             # Write the updated config back to the file
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=2)
-                
+            self._write_json(self.config_path, self.config, indent=2)
+            self._config_saved_at = now
+            self._saved_page_token = self.page_token
             print(f"Saved last check time: {self.last_check_time}")
         except Exception as e:
             print(f"Error saving last check time: {e}")
     
+    @staticmethod
+    def _write_json(path: str, data: Any, indent: Optional[int] = None) -> None:
+        """
+        Write JSON to a file atomically, so a crash mid-write never leaves it truncated.
+        
+        Args:
+            path: Path of the file to write
+            data: The data to serialize
+            indent: Indentation passed to json.dump; compact output uses orjson when installed
+        """
+        tmp_path = path + '.tmp'
+        if orjson and indent is None:
+            with open(tmp_path, 'wb') as f:
+                f.write(orjson.dumps(data))
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    
+    def load_known_files(self) -> bool:
+        """
+        Load known_files saved by a previous run, if the cache is recent enough.
+        
+        Returns:
+            True if known_files was loaded, False if an initial scan is needed
+        """
+        try:
+            if time.time() - os.path.getmtime(self.known_files_path) > KNOWN_FILES_MAX_AGE:
+                return False
+            with open(self.known_files_path, 'rb') as f:
+                content = f.read()
+            self.known_files = orjson.loads(content) if orjson else json.loads(content)
+            print(f"Loaded {len(self.known_files)} known files from {self.known_files_path}")
+            return True
+        except (OSError, ValueError):
+            return False
+    
+    def save_known_files(self) -> None:
+        """
+        Save known_files so the next run can skip the initial scan.
+        """
+        try:
+            with self._known_files_lock:
+                known_files = dict(self.known_files)
+            self._write_json(self.known_files_path, known_files)
+        except Exception as e:
+            print(f"Error saving known files: {e}")
+    
     def authenticate(self) -> None:
         """
         Authenticate with Google Drive API.
@@ -120,8 +339,8 @@ class GoogleDriveWatcher:
         
         # Check if token.json exists
         if os.path.exists(self.token_path):
-            creds = Credentials.from_authorized_user_info(
-                json.loads(open(self.token_path).read()), SCOPES)
+            with open(self.token_path, 'r') as f:
+                creds = Credentials.from_authorized_user_info(json.load(f), SCOPES)
         
         # If there are no valid credentials, let the user log in
         if not creds or not creds.valid:
@@ -143,84 +362,377 @@ class GoogleDriveWatcher:
                 token.write(creds.to_json())
         
         # Build the Drive API service
-        self.service = build('drive', 'v3', credentials=creds)
+        self.credentials = creds
+        self.service = self._build_service(creds)
     
-    def get_folder_contents(self, folder_id: str, time_str: str) -> List[Dict[str, Any]]:
+    def _build_service(self, creds: Credentials):
         """
-        Get all files and subfolders in a folder that have been modified or created after the specified time.
+        Build a Drive API service on its own HTTP connection.
         
         Args:
-            folder_id: The ID of the folder to check
-            time_str: The time string in RFC 3339 format
+            creds: The authorized user credentials
             
         Returns:
-            List of files and folders with their metadata
+            The Drive API service
         """
-        # Query for files in this folder that were modified OR created after the specified time
-        query = f"(modifiedTime > '{time_str}' or createdTime > '{time_str}') and '{folder_id}' in parents"
+        # httplib2 sends Accept-Encoding: gzip and decodes compressed responses transparently
+        http = AuthorizedHttp(creds, http=httplib2.Http())
+        set_user_agent(http, USER_AGENT)
+        if orjson:
+            # Large list responses parse several times faster with orjson
+            return build('drive', 'v3', http=http, model=OrjsonModel())
+        return build('drive', 'v3', http=http)
+    
+    def _get_service(self):
+        """
+        Get the Drive API service for the current thread.
         
-        results = self.service.files().list(
-            q=query,
-            pageSize=100,
-            fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, createdTime, trashed)"
-        ).execute()
+        httplib2 connections are not thread-safe, so worker threads each build
+        their own service from the shared credentials.
         
-        items = results.get('files', [])
+        Returns:
+            The Drive API service
+        """
+        if self.credentials is None or threading.current_thread() is threading.main_thread():
+            return self.service
+        service = getattr(self._thread_local, 'service', None)
+        if service is None:
+            service = self._build_service(self.credentials)
+            self._thread_local.service = service
+        return service
+    
+    def refresh_credentials_if_expiring(self) -> None:
+        """
+        Refresh the credentials ahead of time when they are about to expire.
+        """
+        creds = self.credentials
+        if not creds or not creds.expiry or not creds.refresh_token:
+            return
         
-        # Find all subfolders in this folder (regardless of modification time)
-        folder_query = f"'{folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder'"
-        folder_results = self.service.files().list(
-            q=folder_query,
-            pageSize=100,
-            fields="files(id)"
-        ).execute()
+        # Credentials.expiry is a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if creds.expiry - now < CREDENTIALS_REFRESH_MARGIN:
+            try:
+                creds.refresh(Request())
+                with open(self.token_path, 'w') as token:
+                    token.write(creds.to_json())
+            except Exception as e:
+                print(f"Error refreshing credentials: {e}")
+    
+    def _is_retryable(self, error: HttpError) -> bool:
+        """
+        Check whether a Drive API error is a transient failure worth retrying.
         
-        subfolders = folder_results.get('files', [])
+        Args:
+            error: The HttpError raised by the API client
+            
+        Returns:
+            True if the request should be retried
+        """
+        status = error.resp.status
+        if status in RETRYABLE_STATUSES:
+            return True
+        if status == 403:
+            try:
+                errors = json.loads(error.content).get('error', {}).get('errors', [])
+            except (ValueError, AttributeError, TypeError):
+                return False
+            return any(e.get('reason') in RETRYABLE_REASONS for e in errors)
+        return False
+    
+    def _with_backoff(self, call, max_tries: int = 6):
+        """
+        Run a Drive API call, retrying transient errors with exponential backoff.
         
-        # Recursively get contents of each subfolder
-        for subfolder in subfolders:
-            subfolder_items = self.get_folder_contents(subfolder['id'], time_str)
-            items.extend(subfolder_items)
+        Args:
+            call: Zero-argument callable performing the API call
+            max_tries: Maximum number of attempts before the error is raised
+            
+        Returns:
+            Whatever the call returns
+        """
+        for attempt in range(max_tries):
+            try:
+                return call()
+            except HttpError as e:
+                if attempt == max_tries - 1 or not self._is_retryable(e):
+                    raise
+                retry_after = e.resp.get('retry-after')
+                if retry_after and str(retry_after).isdigit():
+                    delay = float(retry_after)
+                else:
+                    delay = min(64, 2 ** attempt) + random.random()
+                print(f"Drive API returned {e.resp.status}, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+    
+    def _execute(self, request, max_tries: int = 6):
+        """
+        Execute a Drive API request with exponential backoff on transient errors.
         
-        return items
+        Args:
+            request: The HttpRequest (or BatchHttpRequest) to execute
+            max_tries: Maximum number of attempts before the error is raised
+            
+        Returns:
+            The response of the request
+        """
+        return self._with_backoff(request.execute, max_tries)
     
+    def list_all_files(self) -> List[Dict[str, Any]]:
+        """
+        List every non-trashed file in the drive, following pagination.
+
+        Returns:
+            List of files and folders with their metadata and parents
+        """
+        files = []
+        page_token = None
+
+        while True:
+            results = self._execute(self.service.files().list(
+                q="trashed = false",
+                pageSize=1000,
+                pageToken=page_token,
+                fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, createdTime, parents)"
+            ))
+
+            files.extend(results.get('files', []))
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return files
+
+    def _index_parents(self, files: List[Dict[str, Any]]) -> None:
+        """
+        Rebuild the parent -> children index from a drive listing.
+
+        Args:
+            files: Files and folders with their parents
+        """
+        self.parents_index = {}
+        for file in files:
+            for parent_id in file.get('parents', []):
+                self.parents_index.setdefault(parent_id, []).append(file['id'])
+
+    def get_descendant_ids(self, folder_id: str) -> Set[str]:
+        """
+        Get the IDs of everything below a folder using the cached parents index.
+
+        Args:
+            folder_id: The ID of the root folder
+
+        Returns:
+            Set of file and folder IDs in the subtree (excluding the root itself)
+        """
+        descendants = set()
+        pending = deque([folder_id])
+
+        # Breadth-first walk from the root down through the parent -> children index
+        while pending:
+            for child_id in self.parents_index.get(pending.popleft(), []):
+                if child_id not in descendants:
+                    descendants.add(child_id)
+                    pending.append(child_id)
+
+        return descendants
+
+    def get_folder_contents(self, folder_id: str, time_str: str) -> List[Dict[str, Any]]:
+        """
+        Get all files and subfolders in a folder that have been modified or created after the specified time.
+
+        The whole drive is listed once and the subtree is resolved in memory, rather than
+        issuing list calls for every subfolder.
+
+        Args:
+            folder_id: The ID of the folder to check
+            time_str: The time string in RFC 3339 format
+
+        Returns:
+            List of files and folders with their metadata
+        """
+        files = self.list_all_files()
+
+        self._index_parents(files)
+
+        subtree = self.get_descendant_ids(folder_id)
+        if folder_id == self.folder_id:
+            self.watched_ids = {folder_id} | subtree
+        since = parse_drive_time(time_str)
+
+        return [
+            file for file in files
+            if file['id'] in subtree and self._changed_since(file, since)
+        ]
+
+    @staticmethod
+    def _changed_since(file: Dict[str, Any], since: datetime) -> bool:
+        """
+        Check whether a file was modified or created after the specified time.
+
+        Args:
+            file: The file metadata from Google Drive
+            since: Timezone-aware datetime to compare against
+
+        Returns:
+            True if the file's modifiedTime or createdTime is later than since
+        """
+        for key in ('modifiedTime', 'createdTime'):
+            value = file.get(key)
+            if value and parse_drive_time(value) > since:
+                return True
+        return False
+    
+    def get_start_page_token(self) -> str:
+        """
+        Get the Changes API token that marks the current state of the drive.
+
+        Returns:
+            The start page token to resume listing changes from
+        """
+        response = self._execute(self.service.changes().getStartPageToken())
+        return response['startPageToken']
+
     def get_changes(self) -> List[Dict[str, Any]]:
         """
         Get changes in Google Drive since the last check.
-        
+
+        Uses the Drive Changes API from the stored page token, so each poll only returns
+        the delta since the previous one. Removed files are returned as trashed entries.
+        Falls back to a time-based listing when no page token has been stored yet.
+
         Returns:
             List of changed files with their metadata
         """
-        if not self.service:
-            self.authenticate()
-        
+        if not self.page_token:
+            return self.get_changes_since_last_check()
+
+        if self.folder_id and not self.watched_ids:
+            self.refresh_watched_ids()
+
+        files = []
+        page_token = self.page_token
+
+        while page_token:
+            results = self._execute(self.service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, webViewLink, modifiedTime, trashed, parents))"
+            ))
+
+            for change in results.get('changes', []):
+                file = self._file_from_change(change)
+                if file:
+                    files.append(file)
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                self.page_token = results.get('newStartPageToken', self.page_token)
+
+        # Update the last check time
+        self.last_check_time = datetime.now(timezone.utc)
+
+        # Save the updated last check time and page token to config
+        self.save_last_check_time()
+
+        return files
+
+    def get_changes_since_last_check(self) -> List[Dict[str, Any]]:
+        """
+        Get files modified or created since the last check time, then start tracking
+        changes with a fresh page token.
+
+        Files we know about that were deleted in the meantime are returned as trashed entries.
+
+        Returns:
+            List of changed files with their metadata
+        """
+        # Take the token before listing so nothing changed during the listing is missed
+        self.page_token = self.get_start_page_token()
+
         # Convert last_check_time to RFC 3339 format
-        time_str = self.last_check_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        
+        time_str = format_drive_time(self.last_check_time)
+
         files = []
-        
-        # If a specific folder is specified, recursively get all files in that folder and its subfolders
-        if self.folder_id:
-            files = self.get_folder_contents(self.folder_id, time_str)
-        else:
-            # If no folder is specified, get all files in the drive that were modified OR created after the specified time
-            query = f"modifiedTime > '{time_str}' or createdTime > '{time_str}'"
-            results = self.service.files().list(
-                q=query,
-                pageSize=100,
-                fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, createdTime, trashed)"
-            ).execute()
-            
-            files = results.get('files', [])
-        
+
+        # Deletions are not visible in a time-based listing, so reconcile known files
+        # once, probing them in the background while the listing runs
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            deleted_future = executor.submit(self.check_for_deleted_files)
+
+            # If a specific folder is specified, get all files in that folder and its subfolders
+            if self.folder_id:
+                files = self.get_folder_contents(self.folder_id, time_str)
+            else:
+                # If no folder is specified, get all files in the drive that were modified OR created after the specified time
+                query = f"modifiedTime > '{time_str}' or createdTime > '{time_str}'"
+                results = self._execute(self.service.files().list(
+                    q=query,
+                    pageSize=100,
+                    fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, trashed)"
+                ))
+
+                files = results.get('files', [])
+
+            for file_id in deleted_future.result():
+                files.append(self._removed_file(file_id))
+
         # Update the last check time
         self.last_check_time = datetime.now(timezone.utc)
-        
-        # Save the updated last check time to config
+
+        # Save the updated last check time and page token to config
         self.save_last_check_time()
-        
+
         return files
-    
+
+    def refresh_watched_ids(self) -> None:
+        """
+        Rebuild the parents index and the set of IDs inside the watched folder.
+        """
+        self._index_parents(self.list_all_files())
+        self.watched_ids = {self.folder_id} | self.get_descendant_ids(self.folder_id)
+
+    def _file_from_change(self, change: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Convert a Changes API entry into file metadata, filtered to the watched folder.
+
+        Args:
+            change: A change resource from changes().list
+
+        Returns:
+            The file metadata (trashed for removals), or None if the change is irrelevant
+        """
+        file_id = change['fileId']
+        file = change.get('file')
+
+        if change.get('removed') or not file:
+            if not self.folder_id or file_id in self.known_files or file_id in self.watched_ids:
+                self.watched_ids.discard(file_id)
+                return self._removed_file(file_id)
+            return None
+
+        if not self.folder_id:
+            return file
+
+        if any(parent_id in self.watched_ids for parent_id in file.get('parents', [])):
+            # Track new subfolders so changes to their children are picked up
+            if file.get('mimeType') == FOLDER_MIME_TYPE:
+                self.watched_ids.add(file_id)
+            return file
+
+        # A known file that moved out of the watched folder is treated as removed
+        if file_id in self.known_files:
+            self.watched_ids.discard(file_id)
+            return self._removed_file(file_id, file.get('name', 'Unknown'))
+
+        return None
+
+    @staticmethod
+    def _removed_file(file_id: str, name: str = 'Unknown') -> Dict[str, Any]:
+        """
+        Build trashed file metadata for a file that is gone from the watched location.
+        """
+        return {'id': file_id, 'name': name, 'mimeType': '', 'trashed': True}
+
     def download_file(self, file_id: str, mime_type: str) -> Optional[bytes]:
         """
         Download a file from Google Drive.
@@ -232,44 +744,66 @@ class GoogleDriveWatcher:
         Returns:
             The file content as bytes, or None if download failed
         """
-        if not self.service:
-            self.authenticate()
+        service = self._get_service()
         
         try:
             file_content = io.BytesIO()
             
             # Check if this is a Google Workspace file that needs to be exported
-            export_mime_types = self.config.get('export_mime_types', {})
+            export_mime_types = self._export_mime_types
             if mime_type in export_mime_types:
                 # Export the file in the appropriate format
-                request = self.service.files().export_media(
+                request = service.files().export_media(
                     fileId=file_id, 
                     mimeType=export_mime_types[mime_type]
                 )
             else:
                 # For regular files, download directly
-                request = self.service.files().get_media(fileId=file_id)
+                request = service.files().get_media(fileId=file_id)
             
             # Download the file
-            downloader = MediaIoBaseDownload(file_content, request)
+            downloader = MediaIoBaseDownload(file_content, request, chunksize=DOWNLOAD_CHUNK_SIZE)
             done = False
             while not done:
-                status, done = downloader.next_chunk()
+                status, done = self._with_backoff(downloader.next_chunk)
             
-            # Reset the pointer to the beginning of the file
-            file_content.seek(0)
-            return file_content.read()
+            # Hand back the buffer's bytes without another read pass
+            return file_content.getvalue()
         
         except Exception as e:
             print(f"Error downloading file {file_id}: {e}")
             return None
     
-    def process_file(self, file: Dict[str, Any]) -> None:
+    def _is_supported_mime_type(self, mime_type: str) -> bool:
         """
-        Process a file for the RAG pipeline.
+        Check whether a MIME type is supported, remembering the answer for the type.
+        
+        Args:
+            mime_type: The MIME type of the file
+            
+        Returns:
+            True if files of this type should be processed
+        """
+        supported = self._mime_supported.get(mime_type)
+        if supported is None:
+            # Most types match exactly, but entries such as 'image/svg' are also
+            # prefixes of the real type ('image/svg+xml')
+            supported = mime_type.startswith(self._supported_mime_prefixes)
+            self._mime_supported[mime_type] = supported
+        return supported
+    
+    def extract_file(self, file: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Download a file and extract its text, ready to be processed for the RAG pipeline.
+        
+        Trashed files are removed from the database here, and unchanged or
+        unsupported files are skipped.
         
         Args:
             file: The file metadata from Google Drive
+            
+        Returns:
+            The process_file_for_rag arguments for the file, or None if there is nothing to process
         """
         file_id = file['id']
         file_name = file['name']
@@ -281,38 +815,190 @@ class GoogleDriveWatcher:
         if is_trashed:
             print(f"File '{file_name}' (ID: {file_id}) has been trashed. Removing from database...")
             delete_document_by_file_id(file_id)
-            if file_id in self.known_files:
-                del self.known_files[file_id]
-            return
+            with self._known_files_lock:
+                self.known_files.pop(file_id, None)
+            return None
+        
+        # Skip files whose content was already processed at this modifiedTime
+        modified_time = file.get('modifiedTime')
+        if modified_time and self.known_files.get(file_id) == modified_time:
+            print(f"File '{file_name}' (ID: {file_id}) is unchanged since it was last processed")
+            return None
         
         # Skip unsupported file types
-        supported_mime_types = self.config.get('supported_mime_types', [])
-        if not any(mime_type.startswith(t) for t in supported_mime_types):
+        if not self._is_supported_mime_type(mime_type):
             print(f"Skipping unsupported file type: {mime_type}")
-            return
+            return None
         
         # Download the file
         file_content = self.download_file(file_id, mime_type)
         if not file_content:
             print(f"Failed to download file '{file_name}' (ID: {file_id})")
-            return
+            return None
         
         # Extract text from the file
         text = extract_text_from_file(file_content, mime_type, file_name, self.config)
         if not text:
             print(f"No text could be extracted from file '{file_name}' (ID: {file_id})")
+            return None
+        
+        return {
+            'file_content': file_content,
+            'text': text,
+            'file_id': file_id,
+            'file_url': web_view_link,
+            'file_title': file_name,
+            'mime_type': mime_type
+        }
+    
+    def process_file(self, file: Dict[str, Any]) -> None:
+        """
+        Process a file for the RAG pipeline.
+        
+        Args:
+            file: The file metadata from Google Drive
+        """
+        extracted = self.extract_file(file)
+        if extracted is None:
             return
         
         # Process the file for RAG
-        success = process_file_for_rag(file_content, text, file_id, web_view_link, file_name, mime_type, self.config)
+        success = process_file_for_rag(
+            extracted['file_content'], extracted['text'], extracted['file_id'], extracted['file_url'],
+            extracted['file_title'], extracted['mime_type'], self.config
+        )
+        self._record_processed(file, success)
+    
+    def process_files(self, files: List[Dict[str, Any]]) -> None:
+        """
+        Process changed files for the RAG pipeline.
+        
+        Files are downloaded and extracted concurrently, then the chunks of all
+        of them are embedded together before being stored.
+        
+        Args:
+            files: The file metadata from Google Drive
+        """
+        def extract(file):
+            logger.debug("change: id=%s name=%s", file['id'], file.get('name'))
+            try:
+                return self.extract_file(file)
+            except Exception as e:
+                print(f"Error processing file {file.get('id')}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=MAX_PROCESS_WORKERS) as executor:
+            extracted = list(executor.map(extract, files))
+        
+        ready = [(file, item) for file, item in zip(files, extracted) if item is not None]
+        if ready:
+            results = process_files_for_rag([item for _, item in ready], self.config)
+            for (file, _), success in zip(ready, results):
+                self._record_processed(file, success)
+    
+    def _record_processed(self, file: Dict[str, Any], success: bool) -> None:
+        """
+        Report the outcome of processing a file, recording it in known_files if it succeeded.
         
-        # Update the known files dictionary
-        self.known_files[file_id] = file.get('modifiedTime')
+        Failed files keep their previous entry, so they are processed again the
+        next time Drive reports them rather than skipped as unchanged.
         
+        Args:
+            file: The file metadata from Google Drive
+            success: Whether the file was processed successfully
+        """
         if success:
-            print(f"Successfully processed file '{file_name}' (ID: {file_id})")
+            with self._known_files_lock:
+                self.known_files[file['id']] = file.get('modifiedTime')
+            print(f"Successfully processed file '{file['name']}' (ID: {file['id']})")
         else:
-            print(f"Failed to process file '{file_name}' (ID: {file_id})")
+            print(f"Failed to process file '{file['name']}' (ID: {file['id']})")
+    
+    def start_push_notifications(self) -> None:
+        """
+        Start the webhook listener and keep a Changes API watch channel open.
+        
+        Does nothing unless webhook_url is configured, in which case the watcher
+        still polls every interval but is also woken as soon as Drive reports a change.
+        """
+        if not self.webhook_url or not self.page_token:
+            return
+        
+        if self._notification_server is None:
+            self._notification_server = ThreadingHTTPServer(('', self.webhook_port), _NotificationHandler)
+            self._notification_server.watcher = self
+            threading.Thread(target=self._notification_server.serve_forever, daemon=True).start()
+            print(f"Listening for Drive push notifications on port {self.webhook_port}")
+        
+        now = datetime.now(timezone.utc)
+        if self.channel and self.channel['expiration'] - now > CHANNEL_RENEW_MARGIN:
+            return
+        
+        # Open the new channel before closing the old one so no notification is missed
+        old_channel = self.channel
+        expiration = now + CHANNEL_LIFETIME
+        try:
+            response = self._execute(self.service.changes().watch(
+                pageToken=self.page_token,
+                body={
+                    'id': str(uuid4()),
+                    'type': 'web_hook',
+                    'address': self.webhook_url,
+                    'expiration': int(expiration.timestamp() * 1000)
+                }
+            ))
+        except Exception as e:
+            print(f"Error opening push notification channel: {e}")
+            return
+        # Drive may shorten the lifetime; it reports the real expiry in milliseconds
+        if response.get('expiration'):
+            expiration = datetime.fromtimestamp(int(response['expiration']) / 1000, timezone.utc)
+        self.channel = {
+            'id': response['id'],
+            'resourceId': response['resourceId'],
+            'expiration': expiration
+        }
+        if old_channel:
+            self._stop_channel(old_channel)
+    
+    def next_wait_seconds(self, interval_seconds: int) -> float:
+        """
+        Get how long to wait before the next check.
+        
+        Args:
+            interval_seconds: The polling interval used without push notifications
+            
+        Returns:
+            The number of seconds to wait, waking early anyway on a notification
+        """
+        if not self.channel:
+            return interval_seconds
+        # Wake in time to renew the channel before it expires
+        renew_in = (self.channel['expiration'] - CHANNEL_RENEW_MARGIN - datetime.now(timezone.utc)).total_seconds()
+        return max(interval_seconds, min(PUSH_RECONCILE_INTERVAL, renew_in))
+    
+    def stop_push_notifications(self) -> None:
+        """
+        Close the watch channel and shut down the webhook listener.
+        """
+        if self.channel:
+            self._stop_channel(self.channel)
+            self.channel = None
+        if self._notification_server is not None:
+            self._notification_server.shutdown()
+            self._notification_server.server_close()
+            self._notification_server = None
+    
+    def _stop_channel(self, channel: Dict[str, Any]) -> None:
+        """
+        Ask Drive to stop sending notifications for a channel.
+        """
+        try:
+            self._execute(self.service.channels().stop(
+                body={'id': channel['id'], 'resourceId': channel['resourceId']}
+            ))
+        except Exception as e:
+            print(f"Error stopping push notification channel: {e}")
     
     def check_for_deleted_files(self) -> List[str]:
         """
@@ -321,9 +1007,6 @@ class GoogleDriveWatcher:
         Returns:
             List of IDs of deleted files
         """
-        if not self.service:
-            self.authenticate()
-            
         # We'll only check files we know about
         deleted_files = []
         
@@ -331,25 +1014,50 @@ class GoogleDriveWatcher:
         if not self.known_files:
             return deleted_files
             
-        # Check each known file to see if it still exists or has been trashed
-        for file_id in list(self.known_files.keys()):
-            try:
-                # Get the file metadata
-                file = self.service.files().get(
-                    fileId=file_id,
-                    fields="trashed,name"
-                ).execute()
+        def probe(batch_ids, max_tries=6):
+            service = self._get_service()
+            for attempt in range(max_tries):
+                # Calls inside a batch fail individually, so rate-limited ones are probed again
+                throttled = []
                 
-                # If the file is in the trash, consider it deleted
-                if file.get('trashed', False):
-                    print(f"File '{file.get('name', 'Unknown')}' (ID: {file_id}) is in trash")
-                    deleted_files.append(file_id)
-            except Exception as e:
-                # If we get an error (like file not found), the file is deleted
-                if 'File not found' in str(e) or '404' in str(e):
-                    deleted_files.append(file_id)
-                else:
-                    print(f"Error checking file {file_id}: {e}")
+                def on_probe(request_id, response, exception):
+                    if exception is not None:
+                        # A 404 means the file is gone; anything else is reported and skipped
+                        if isinstance(exception, HttpError) and exception.resp.status == 404:
+                            deleted_files.append(request_id)
+                        elif (isinstance(exception, HttpError) and self._is_retryable(exception)
+                              and attempt < max_tries - 1):
+                            throttled.append(request_id)
+                        else:
+                            print(f"Error checking file {request_id}: {exception}")
+                    elif response.get('trashed', False):
+                        print(f"File '{response.get('name', 'Unknown')}' (ID: {request_id}) is in trash")
+                        deleted_files.append(request_id)
+                
+                batch = service.new_batch_http_request(callback=on_probe)
+                for file_id in batch_ids:
+                    batch.add(
+                        service.files().get(fileId=file_id, fields="trashed,name"),
+                        request_id=file_id
+                    )
+                self._execute(batch)
+                
+                if not throttled:
+                    return
+                batch_ids = throttled
+                delay = min(64, 2 ** attempt) + random.random()
+                print(f"{len(throttled)} file checks were rate limited, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+        
+        # Probe the known files in batches so each HTTP round-trip covers up to
+        # BATCH_PROBE_SIZE files instead of one, with several batches in flight
+        file_ids = list(self.known_files.keys())
+        batches = [file_ids[start:start + BATCH_PROBE_SIZE] for start in range(0, len(file_ids), BATCH_PROBE_SIZE)]
+        if len(batches) == 1:
+            probe(batches[0])
+        else:
+            with ThreadPoolExecutor(max_workers=MAX_PROCESS_WORKERS) as executor:
+                list(executor.map(probe, batches))
         
         return deleted_files
     
@@ -368,68 +1076,71 @@ class GoogleDriveWatcher:
             if not self.service:
                 self.authenticate()
             
+            # Reuse the known_files saved by a recent run instead of rescanning
+            if not self.initialized and self.load_known_files():
+                self.initialized = True
+            
             # Initial scan to build the known_files dictionary
             if not self.initialized:
                 print("Performing initial scan of files...")
                 # Get all files in the watched folder
                 # Use the last check time from config or default to 1970-01-01
-                time_str = self.last_check_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                time_str = format_drive_time(self.last_check_time)
                 if self.folder_id:
                     files = self.get_folder_contents(self.folder_id, time_str)  # Get all files
                 else:
-                    # If watching all of Drive, get all files
-                    results = self.service.files().list(
+                    # If watching all of Drive, get all files; only the ID and
+                    # modifiedTime are kept, so request nothing else
+                    results = self._execute(self.service.files().list(
+                        q="trashed = false",
                         pageSize=1000,
-                        fields="nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, trashed)"
-                    ).execute()
+                        fields="nextPageToken, files(id, modifiedTime)"
+                    ))
                     files = results.get('files', [])
                 
                 # Build the known_files dictionary - only store the modifiedTime
+                since = self.last_check_time
                 for file in files:
                     if not file.get('trashed', False):  # Skip files in trash
-                        # Only store the modifiedTime to avoid processing all files
-                        self.known_files[file['id']] = file.get('modifiedTime')
+                        # Files changed since the last run still have to be processed by
+                        # the first check, so don't record their modifiedTime as seen yet
+                        if self._changed_since(file, since):
+                            self.known_files[file['id']] = None
+                        else:
+                            self.known_files[file['id']] = file.get('modifiedTime')
                 
                 print(f"Found {len(self.known_files)} files in initial scan.")
                 self.initialized = True
+                self.save_known_files()
             
             while True:
-                # Get changes since the last check
-                changed_files = self.get_changes()
+                self.refresh_credentials_if_expiring()
                 
-                # Check for deleted files (every 5 cycles to reduce API calls)
-                deleted_file_ids = []
-
-                # Uncomment this code and delete the line below it if you want to check for deleted files less often (for performance gains with many files)
-                # if random.random() < 0.2:  # ~20% chance each cycle, or about once every 5 cycles
-                #    print("Checking for deleted files...")
-                #     deleted_file_ids = self.check_for_deleted_files()
-                deleted_file_ids = self.check_for_deleted_files()
+                # Notifications arriving from here on wake the next wait early
+                self.wake_event.clear()
+                
+                # Get changes since the last check (removed files come back as trashed)
+                changed_files = self.get_changes()
                 
                 # Process changed files
                 if changed_files:
                     print(f"Found {len(changed_files)} changed files.")
-                    for file in changed_files:
-                        print(file)
-                        self.process_file(file)
-                        # Update known_files with just the modifiedTime
-                        self.known_files[file['id']] = file.get('modifiedTime')
+                    self.process_files(changed_files)
+                    self.save_known_files()
                 
-                # Process deleted files
-                if deleted_file_ids:
-                    print(f"Found {len(deleted_file_ids)} deleted files.")
-                    for file_id in deleted_file_ids:
-                        print(f"File with ID: {file_id} has been deleted. Removing from database...")
-                        delete_document_by_file_id(file_id)
-                        # Remove from known_files
-                        del self.known_files[file_id]
+                self.start_push_notifications()
                 
-                # Wait for the next check
-                print(f"Waiting {interval_seconds} seconds until next check...")
-                time.sleep(interval_seconds)
+                # Wait for the next check, or until Drive reports a change
+                wait_seconds = self.next_wait_seconds(interval_seconds)
+                print(f"Waiting {wait_seconds:.0f} seconds until next check...")
+                self.wake_event.wait(wait_seconds)
         
         except KeyboardInterrupt:
             print("Watcher stopped by user.")
         except Exception as e:
             print(f"Error in watcher: {e}")
             raise
+        finally:
+            self.stop_push_notifications()
+            if self.initialized:
+                self.save_last_check_time(force=True)
@@ -6,9 +6,15 @@ import sys
 import json
 import io
 import random
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import time
+import threading
+import copy
+from types import MappingProxyType
+from googleapiclient.errors import HttpError
+from googleapiclient.model import JsonModel
+import httplib2
 
 # Mock environment variables before importing modules that use them
 with patch.dict(os.environ, {
@@ -30,37 +36,86 @@ with patch.dict(os.environ, {
         
         # Add the parent directory to sys.path to import the modules
         sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-        from Google_Drive.drive_watcher import GoogleDriveWatcher, SCOPES
+        from Google_Drive.drive_watcher import GoogleDriveWatcher, OrjsonModel, orjson, parse_drive_time, format_drive_time, SCOPES, DOWNLOAD_CHUNK_SIZE, CONFIG_SAVE_INTERVAL, PUSH_RECONCILE_INTERVAL
+
+# Canonical configuration shared by the tests; exposed read-only through mock_config
+MOCK_CONFIG = {
+    "supported_mime_types": [
+        "application/pdf",
+        "text/plain",
+        "text/csv"
+    ],
+    "export_mime_types": {
+        "application/vnd.google-apps.document": "text/plain",
+        "application/vnd.google-apps.spreadsheet": "text/csv"
+    },
+    "text_processing": {
+        "default_chunk_size": 400,
+        "default_chunk_overlap": 0
+    },
+    "last_check_time": "2023-01-01T00:00:00.000Z",
+    "watch_folder_id": "test_folder_id"
+}
+
+class _FakeRequest:
+    """A Drive API request that returns a canned response."""
+
+    def __init__(self, response):
+        self._response = response
+
+    def execute(self, **kwargs):
+        return self._response
+
+
+class _FakeFilesResource:
+    """Stands in for service.files(), serving pages keyed by pageToken and recording list() calls."""
+
+    def __init__(self, pages):
+        self._pages = pages
+        self.list_calls = []
+
+    def list(self, **kwargs):
+        self.list_calls.append(kwargs)
+        return _FakeRequest(self._pages[kwargs.get('pageToken')])
+
+
+class _FakeChangesResource:
+    """Stands in for service.changes(), handing out a fixed start page token."""
+
+    def __init__(self, start_page_token):
+        self._start_page_token = start_page_token
+
+    def getStartPageToken(self, **kwargs):
+        return _FakeRequest({'startPageToken': self._start_page_token})
+
+
+class _FakeDriveService:
+    """Plain-object Drive service for listing tests, avoiding MagicMock attribute chains."""
+
+    def __init__(self, pages, start_page_token='token1'):
+        self._files = _FakeFilesResource(pages)
+        self._changes = _FakeChangesResource(start_page_token)
+
+    def files(self):
+        return self._files
+
+    def changes(self):
+        return self._changes
+
 
 class TestGoogleDriveWatcher:
-    @pytest.fixture
+    @pytest.fixture(scope="session")
     def mock_config(self):
-        """Fixture for a mock configuration"""
-        return {
-            "supported_mime_types": [
-                "application/pdf",
-                "text/plain",
-                "text/csv"
-            ],
-            "export_mime_types": {
-                "application/vnd.google-apps.document": "text/plain",
-                "application/vnd.google-apps.spreadsheet": "text/csv"
-            },
-            "text_processing": {
-                "default_chunk_size": 400,
-                "default_chunk_overlap": 0
-            },
-            "last_check_time": "2023-01-01T00:00:00.000Z",
-            "watch_folder_id": "test_folder_id"
-        }
+        """Fixture for a mock configuration (read-only; use dict(mock_config) for a mutable copy)"""
+        return MappingProxyType(MOCK_CONFIG)
     
-    @pytest.fixture
-    def watcher(self, tmp_path, mock_config):
-        """Fixture for a GoogleDriveWatcher instance with mocked configuration"""
+    @pytest.fixture(scope="session")
+    def watcher_template(self, tmp_path_factory, mock_config):
+        """Fixture for a GoogleDriveWatcher built once from a temporary config file"""
         # Create a temporary config file
-        config_path = tmp_path / "config.json"
+        config_path = tmp_path_factory.mktemp("drive_watcher") / "config.json"
         with open(config_path, 'w') as f:
-            json.dump(mock_config, f)
+            json.dump(dict(mock_config), f)
         
         # Create the watcher with the temporary config file
         return GoogleDriveWatcher(
@@ -69,12 +124,44 @@ class TestGoogleDriveWatcher:
             config_path=str(config_path)
         )
     
+    @pytest.fixture(scope="module")
+    def _patch_common(self, module_mocker):
+        """Install the patches shared across the module once instead of per test"""
+        return {
+            'authenticate': module_mocker.patch.object(GoogleDriveWatcher, 'authenticate'),
+            'extract_text_from_file': module_mocker.patch('Google_Drive.drive_watcher.extract_text_from_file'),
+            'process_file_for_rag': module_mocker.patch('Google_Drive.drive_watcher.process_file_for_rag'),
+            'process_files_for_rag': module_mocker.patch('Google_Drive.drive_watcher.process_files_for_rag'),
+            'delete_document_by_file_id': module_mocker.patch('Google_Drive.drive_watcher.delete_document_by_file_id'),
+        }
+    
+    @pytest.fixture(autouse=True)
+    def common_mocks(self, _patch_common):
+        """Fixture for the shared mocks, reset so no return value or call leaks between tests"""
+        for shared_mock in _patch_common.values():
+            shared_mock.reset_mock(return_value=True, side_effect=True)
+        return _patch_common
+    
+    @pytest.fixture
+    def watcher(self, watcher_template):
+        """Fixture for a fresh copy of the template watcher that tests can change freely"""
+        watcher = copy.copy(watcher_template)
+        watcher.config = copy.deepcopy(watcher_template.config)
+        watcher.known_files = {}
+        watcher.parents_index = {}
+        watcher.watched_ids = set()
+        watcher._mime_supported = dict(watcher_template._mime_supported)
+        watcher._thread_local = threading.local()
+        watcher._known_files_lock = threading.Lock()
+        watcher.wake_event = threading.Event()
+        return watcher
+    
     @patch('builtins.open', new_callable=mock_open)
     @patch('json.load')
     def test_load_config_success(self, mock_json_load, mock_file_open, mock_config):
         """Test loading configuration successfully"""
         # Setup mock
-        mock_json_load.return_value = mock_config
+        mock_json_load.return_value = dict(mock_config)
         
         # Create watcher with mocked open
         watcher = GoogleDriveWatcher(config_path='test_config.json')
@@ -83,7 +170,7 @@ class TestGoogleDriveWatcher:
         assert watcher.config == mock_config
         assert watcher.folder_id == mock_config['watch_folder_id']
         # Verify last_check_time was parsed correctly
-        assert watcher.last_check_time == datetime.strptime('2023-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+        assert watcher.last_check_time == datetime(2023, 1, 1, tzinfo=timezone.utc)
     
     @patch('builtins.open')
     def test_load_config_file_not_found(self, mock_open, capfd):
@@ -98,7 +185,7 @@ class TestGoogleDriveWatcher:
         assert 'supported_mime_types' in watcher.config
         assert 'export_mime_types' in watcher.config
         assert 'text_processing' in watcher.config
-        assert watcher.last_check_time == datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+        assert watcher.last_check_time == datetime(1970, 1, 1, tzinfo=timezone.utc)
         
         # Check that error was printed
         captured = capfd.readouterr()
@@ -119,7 +206,7 @@ class TestGoogleDriveWatcher:
         watcher = GoogleDriveWatcher(config_path='test_config.json')
         
         # Verify default date was used
-        assert watcher.last_check_time == datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+        assert watcher.last_check_time == datetime(1970, 1, 1, tzinfo=timezone.utc)
         
         # Check that error was printed
         captured = capfd.readouterr()
@@ -134,12 +221,32 @@ class TestGoogleDriveWatcher:
         watcher.last_check_time = test_time
         
         # Call the method
-        watcher.save_last_check_time()
+        with patch('os.replace') as mock_replace:
+            watcher.save_last_check_time()
         
-        # Verify the config was updated and written to file
+        # Verify the config was updated and written to file through a temporary file
         assert watcher.config['last_check_time'] == test_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
         mock_json_dump.assert_called_once()
-        mock_file_open.assert_called_once_with(watcher.config_path, 'w')
+        mock_file_open.assert_called_once_with(watcher.config_path + '.tmp', 'w')
+        mock_replace.assert_called_once_with(watcher.config_path + '.tmp', watcher.config_path)
+    
+    def test_save_last_check_time_throttled(self, watcher):
+        """Test that the config is only rewritten when the page token moves or time passes"""
+        watcher.page_token = 'token1'
+        with patch.object(GoogleDriveWatcher, '_write_json') as mock_write:
+            watcher.save_last_check_time()
+            watcher.save_last_check_time()
+            assert mock_write.call_count == 1
+            
+            # A new page token is saved straight away
+            watcher.page_token = 'token2'
+            watcher.save_last_check_time()
+            assert mock_write.call_count == 2
+            
+            # So is the time once the save interval has passed
+            watcher._config_saved_at -= CONFIG_SAVE_INTERVAL
+            watcher.save_last_check_time()
+            assert mock_write.call_count == 3
     
     @patch('builtins.open')
     @patch('json.dump')
@@ -159,60 +266,51 @@ class TestGoogleDriveWatcher:
         captured = capfd.readouterr()
         assert "Error saving last check time" in captured.out
     
-    @patch.object(GoogleDriveWatcher, 'authenticate')
-    def test_get_folder_contents(self, mock_authenticate, watcher):
+    def test_get_folder_contents(self, watcher):
         """Test getting folder contents"""
-        # Setup mock service
-        mock_service = MagicMock()
-        watcher.service = mock_service
-        
-        # Mock files list response for the folder
-        mock_files_response = {
-            'files': [
-                {'id': 'file1', 'name': 'File 1', 'mimeType': 'text/plain'},
-                {'id': 'file2', 'name': 'File 2', 'mimeType': 'application/pdf'}
-            ]
-        }
-        mock_service.files().list().execute.return_value = mock_files_response
-        
-        # Mock folders list response
-        mock_folders_response = {
-            'files': [
-                {'id': 'subfolder1'},
-                {'id': 'subfolder2'}
-            ]
+        new_time = '2023-02-01T00:00:00.000Z'
+        old_time = '2022-12-01T00:00:00.000Z'
+        folder_mime = 'application/vnd.google-apps.folder'
+
+        # The drive listing spans two pages and includes files outside the watched folder
+        pages = {
+            None: {
+                'files': [
+                    {'id': 'file1', 'mimeType': 'text/plain', 'parents': ['test_folder'], 'modifiedTime': new_time},
+                    {'id': 'file2', 'mimeType': 'application/pdf', 'parents': ['test_folder'], 'modifiedTime': old_time},
+                    {'id': 'subfolder1', 'mimeType': folder_mime, 'parents': ['test_folder'], 'modifiedTime': old_time},
+                    {'id': 'other_file', 'mimeType': 'text/plain', 'parents': ['other_folder'], 'modifiedTime': new_time}
+                ],
+                'nextPageToken': 'page2'
+            },
+            'page2': {
+                'files': [
+                    {'id': 'file3', 'mimeType': 'text/csv', 'parents': ['subfolder1'],
+                     'modifiedTime': old_time, 'createdTime': new_time},
+                    {'id': 'file4', 'mimeType': 'text/plain', 'parents': ['subfolder1'], 'modifiedTime': old_time}
+                ]
+            }
         }
-        # First call returns files, second call returns folders
-        mock_service.files().list.side_effect = lambda **kwargs: MagicMock(
-            execute=lambda: mock_files_response if 'mimeType' not in kwargs.get('q', '') 
-                           else mock_folders_response
-        )
-        
-        # Mock recursive calls for subfolders
-        watcher.get_folder_contents = MagicMock()
-        watcher.get_folder_contents.side_effect = [
-            [{'id': 'file3', 'name': 'File 3', 'mimeType': 'text/csv'}],
-            [{'id': 'file4', 'name': 'File 4', 'mimeType': 'text/plain'}]
-        ]
-        
-        # Call the original method
-        original_method = GoogleDriveWatcher.get_folder_contents
-        result = original_method(watcher, 'test_folder', '2023-01-01T00:00:00Z')
-        
-        # Verify the result combines files from the folder and subfolders
-        assert len(result) == 4
-        assert {'id': 'file1', 'name': 'File 1', 'mimeType': 'text/plain'} in result
-        assert {'id': 'file2', 'name': 'File 2', 'mimeType': 'application/pdf'} in result
-        assert {'id': 'file3', 'name': 'File 3', 'mimeType': 'text/csv'} in result
-        assert {'id': 'file4', 'name': 'File 4', 'mimeType': 'text/plain'} in result
+        watcher.service = _FakeDriveService(pages)
+
+        # Call the method
+        result = watcher.get_folder_contents('test_folder', '2023-01-01T00:00:00.000000Z')
+
+        # Only files in the subtree modified or created after the time are returned
+        assert sorted(f['id'] for f in result) == ['file1', 'file3']
+
+        # One paginated listing replaces the per-folder recursion
+        assert len(watcher.service.files().list_calls) == 2
+        assert watcher.get_descendant_ids('test_folder') == {'file1', 'file2', 'subfolder1', 'file3', 'file4'}
     
-    @patch.object(GoogleDriveWatcher, 'authenticate')
     @patch.object(GoogleDriveWatcher, 'get_folder_contents')
     @patch.object(GoogleDriveWatcher, 'save_last_check_time')
-    def test_get_changes_with_folder(self, mock_save, mock_get_folder, mock_authenticate, watcher):
+    def test_get_changes_with_folder(self, mock_save, mock_get_folder, watcher):
         """Test getting changes with a specific folder ID"""
         # Setup
         watcher.folder_id = 'test_folder'
+        watcher.service = MagicMock()
+        watcher.service.changes().getStartPageToken().execute.return_value = {'startPageToken': 'token1'}
         mock_files = [
             {'id': 'file1', 'name': 'File 1', 'mimeType': 'text/plain'},
             {'id': 'file2', 'name': 'File 2', 'mimeType': 'application/pdf'}
@@ -227,37 +325,82 @@ class TestGoogleDriveWatcher:
         mock_get_folder.assert_called_once()
         assert 'test_folder' in mock_get_folder.call_args[0]
         mock_save.assert_called_once()
+        # Later polls resume from the Changes API token
+        assert watcher.page_token == 'token1'
     
-    @patch.object(GoogleDriveWatcher, 'authenticate')
     @patch.object(GoogleDriveWatcher, 'save_last_check_time')
-    def test_get_changes_without_folder(self, mock_save, mock_authenticate, watcher):
+    def test_get_changes_without_folder(self, mock_save, watcher):
         """Test getting changes without a specific folder ID"""
         # Setup
         watcher.folder_id = None
-        watcher.service = MagicMock()
         mock_files = [
             {'id': 'file1', 'name': 'File 1', 'mimeType': 'text/plain'},
             {'id': 'file2', 'name': 'File 2', 'mimeType': 'application/pdf'}
         ]
-        # Setup the mock to return the files when called with the right parameters
-        mock_list = MagicMock()
-        mock_execute = MagicMock(return_value={'files': mock_files})
-        mock_list.execute = mock_execute
-        watcher.service.files().list = MagicMock(return_value=mock_list)
+        watcher.service = _FakeDriveService({None: {'files': mock_files}})
         
         # Call the method
         result = watcher.get_changes()
         
         # Verify results
         assert result == mock_files
-        # Instead of checking call count, check that it was called with the right parameters
-        watcher.service.files().list.assert_called_with(
-            q=mock.ANY,  # We don't need to check the exact query string
-            pageSize=100,
-            fields='nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, createdTime, trashed)'
-        )
+        # Check that it was called with the right parameters
+        assert watcher.service.files().list_calls == [{
+            'q': mock.ANY,  # We don't need to check the exact query string
+            'pageSize': 100,
+            'fields': 'nextPageToken, files(id, name, mimeType, webViewLink, modifiedTime, trashed)'
+        }]
+        assert watcher.page_token == 'token1'
         mock_save.assert_called_once()
     
+    @patch.object(GoogleDriveWatcher, 'save_last_check_time')
+    def test_get_changes_with_page_token(self, mock_save, watcher):
+        """Test getting changes from the Changes API page token"""
+        # Setup
+        watcher.folder_id = 'test_folder'
+        watcher.page_token = 'token1'
+        watcher.watched_ids = {'test_folder', 'subfolder1'}
+        watcher.known_files = {'moved_file': '2023-01-01T00:00:00Z', 'deleted_file': '2023-01-01T00:00:00Z'}
+        watcher.service = MagicMock()
+
+        pages = {
+            'token1': {
+                'changes': [
+                    {'fileId': 'file1', 'file': {'id': 'file1', 'name': 'File 1', 'mimeType': 'text/plain',
+                                                 'parents': ['subfolder1']}},
+                    {'fileId': 'other_file', 'file': {'id': 'other_file', 'name': 'Other', 'mimeType': 'text/plain',
+                                                      'parents': ['other_folder']}},
+                    {'fileId': 'deleted_file', 'removed': True}
+                ],
+                'nextPageToken': 'token2'
+            },
+            'token2': {
+                'changes': [
+                    {'fileId': 'new_folder', 'file': {'id': 'new_folder', 'name': 'New Folder',
+                                                      'mimeType': 'application/vnd.google-apps.folder',
+                                                      'parents': ['test_folder']}},
+                    {'fileId': 'moved_file', 'file': {'id': 'moved_file', 'name': 'Moved', 'mimeType': 'text/plain',
+                                                      'parents': ['other_folder']}}
+                ],
+                'newStartPageToken': 'token3'
+            }
+        }
+        watcher.service.changes().list.side_effect = lambda **kwargs: MagicMock(
+            execute=lambda: pages[kwargs['pageToken']]
+        )
+
+        # Call the method
+        result = watcher.get_changes()
+
+        # Files outside the watched folder are ignored; removals come back trashed
+        assert [f['id'] for f in result] == ['file1', 'deleted_file', 'new_folder', 'moved_file']
+        assert result[1]['trashed'] is True
+        assert result[3]['trashed'] is True
+        assert 'new_folder' in watcher.watched_ids
+        assert watcher.page_token == 'token3'
+        watcher.service.files().list.assert_not_called()
+        mock_save.assert_called_once()
+
     def test_download_file_regular(self):
         """Test downloading a regular file"""
         # Create a watcher instance with a mocked download_file method
@@ -323,8 +466,7 @@ class TestGoogleDriveWatcher:
             # Restore the original method
             watcher.download_file = original_download_file
     
-    @patch.object(GoogleDriveWatcher, 'authenticate')
-    def test_download_file_error(self, mock_authenticate, watcher, capfd):
+    def test_download_file_error(self, watcher, capfd):
         """Test error handling when downloading a file"""
         # Setup
         watcher.service = MagicMock()
@@ -340,11 +482,34 @@ class TestGoogleDriveWatcher:
         captured = capfd.readouterr()
         assert "Error downloading file" in captured.out
     
+    @patch('Google_Drive.drive_watcher.MediaIoBaseDownload')
+    @patch('time.sleep')
+    def test_download_file_chunks(self, mock_sleep, mock_downloader_cls, watcher):
+        """Test that downloads use large chunks and retry a failed chunk only"""
+        watcher.service = MagicMock()
+        
+        def mock_downloader(fd, request, chunksize):
+            chunks = [b'first ', HttpError(httplib2.Response({'status': 503}), b''), b'second']
+            def next_chunk():
+                chunk = chunks.pop(0)
+                if isinstance(chunk, Exception):
+                    raise chunk
+                fd.write(chunk)
+                return None, not chunks
+            return MagicMock(next_chunk=next_chunk)
+        mock_downloader_cls.side_effect = mock_downloader
+        
+        result = watcher.download_file('file1', 'application/pdf')
+        
+        assert result == b'first second'
+        assert mock_downloader_cls.call_args[1]['chunksize'] == DOWNLOAD_CHUNK_SIZE
+        assert mock_sleep.call_count == 1
+    
     @patch.object(GoogleDriveWatcher, 'download_file')
-    @patch('Google_Drive.drive_watcher.extract_text_from_file')
-    @patch('Google_Drive.drive_watcher.process_file_for_rag')
-    def test_process_file_success(self, mock_process_rag, mock_extract_text, mock_download, watcher):
+    def test_process_file_success(self, mock_download, watcher, common_mocks):
         """Test successfully processing a file"""
+        mock_extract_text = common_mocks['extract_text_from_file']
+        mock_process_rag = common_mocks['process_file_for_rag']
         # Setup mocks
         file_data = {
             'id': 'file1',
@@ -370,9 +535,38 @@ class TestGoogleDriveWatcher:
         # Verify known files was updated
         assert watcher.known_files['file1'] == '2023-01-01T00:00:00Z'
     
-    @patch('Google_Drive.drive_watcher.delete_document_by_file_id')
-    def test_process_file_trashed(self, mock_delete, watcher, capfd):
+    @patch.object(GoogleDriveWatcher, 'download_file')
+    def test_process_file_unchanged(self, mock_download, watcher):
+        """Test that a file with an unchanged modifiedTime is not reprocessed"""
+        file_data = {
+            'id': 'file1',
+            'name': 'test.txt',
+            'mimeType': 'text/plain',
+            'modifiedTime': '2023-01-01T00:00:00Z'
+        }
+        watcher.known_files = {'file1': '2023-01-01T00:00:00Z'}
+        
+        watcher.process_file(file_data)
+        
+        mock_download.assert_not_called()
+    
+    def test_is_supported_mime_type_prefix(self, watcher):
+        """Test that supported types match exactly or as prefixes of the real type"""
+        watcher._mime_supported = {'application/pdf': True, 'image/svg': True}
+        watcher._supported_mime_prefixes = ('application/pdf', 'image/svg')
+        
+        with patch.object(GoogleDriveWatcher, 'download_file', return_value=None) as mock_download:
+            for mime_type in ('application/pdf', 'image/svg+xml', 'video/mp4'):
+                watcher.process_file({'id': mime_type, 'name': 'file', 'mimeType': mime_type})
+        
+        assert [c[0][1] for c in mock_download.call_args_list] == ['application/pdf', 'image/svg+xml']
+        # Prefix matches are remembered so later files of the type skip the scan
+        assert watcher._mime_supported['image/svg+xml'] is True
+        assert watcher._mime_supported['video/mp4'] is False
+    
+    def test_process_file_trashed(self, watcher, common_mocks, capfd):
         """Test processing a file that has been trashed"""
+        mock_delete = common_mocks['delete_document_by_file_id']
         # Setup
         file_data = {
             'id': 'file1',
@@ -428,9 +622,9 @@ class TestGoogleDriveWatcher:
         assert "Failed to download file" in captured.out
     
     @patch.object(GoogleDriveWatcher, 'download_file')
-    @patch('Google_Drive.drive_watcher.extract_text_from_file')
-    def test_process_file_no_text_extracted(self, mock_extract_text, mock_download, watcher, capfd):
+    def test_process_file_no_text_extracted(self, mock_download, watcher, common_mocks, capfd):
         """Test processing a file when no text can be extracted"""
+        mock_extract_text = common_mocks['extract_text_from_file']
         # Setup
         file_data = {
             'id': 'file1',
@@ -447,8 +641,7 @@ class TestGoogleDriveWatcher:
         captured = capfd.readouterr()
         assert "No text could be extracted" in captured.out
     
-    @patch.object(GoogleDriveWatcher, 'authenticate')
-    def test_check_for_deleted_files(self, mock_authenticate, watcher):
+    def test_check_for_deleted_files(self, watcher):
         """Test checking for deleted files"""
         # Setup
         watcher.service = MagicMock()
@@ -456,21 +649,27 @@ class TestGoogleDriveWatcher:
             'file1': '2023-01-01T00:00:00Z',  # Not trashed
             'file2': '2023-01-01T00:00:00Z',  # Trashed
             'file3': '2023-01-01T00:00:00Z',  # Not found (404)
-            'file4': '2023-01-01T00:00:00Z',  # Other error
+            'file4': '2023-01-01T00:00:00Z',  # Other (non-transient) error
+        }
+        
+        # Mock batch responses
+        responses = {
+            'file1': ({'trashed': False, 'name': 'File 1'}, None),
+            'file2': ({'trashed': True, 'name': 'File 2'}, None),
+            'file3': (None, HttpError(MagicMock(status=404), b'File not found')),
+            'file4': (None, HttpError(MagicMock(status=403), b'Other error')),
         }
+        batches = []
         
-        # Mock get file responses
-        def mock_get_file(fileId, fields):
-            if fileId == 'file1':
-                return MagicMock(execute=lambda: {'trashed': False, 'name': 'File 1'})
-            elif fileId == 'file2':
-                return MagicMock(execute=lambda: {'trashed': True, 'name': 'File 2'})
-            elif fileId == 'file3':
-                raise Exception("File not found: 404")
-            else:
-                raise Exception("Other error")
+        def mock_new_batch(callback):
+            batch = MagicMock()
+            added = []
+            batch.add.side_effect = lambda request, request_id: added.append(request_id)
+            batch.execute.side_effect = lambda: [callback(rid, *responses[rid]) for rid in added]
+            batches.append(added)
+            return batch
         
-        watcher.service.files().get = mock_get_file
+        watcher.service.new_batch_http_request.side_effect = mock_new_batch
         
         # Call the method
         result = watcher.check_for_deleted_files()
@@ -480,4 +679,268 @@ class TestGoogleDriveWatcher:
         assert 'file3' in result  # Not found (404)
         assert 'file1' not in result  # Not trashed
         assert 'file4' not in result  # Other error
-        
\ No newline at end of file
+        assert batches == [['file1', 'file2', 'file3', 'file4']]
+    
+    @patch('time.sleep')
+    def test_check_for_deleted_files_retries_rate_limited(self, mock_sleep, watcher):
+        """Test that calls rate limited inside a batch are probed again on their own"""
+        watcher.service = MagicMock()
+        watcher.known_files = {'file1': '2023-01-01T00:00:00Z', 'file2': '2023-01-01T00:00:00Z'}
+        
+        # file2 is rate limited on the first batch and reported missing on the retry
+        responses = [
+            {'file1': ({'trashed': False, 'name': 'File 1'}, None),
+             'file2': (None, HttpError(httplib2.Response({'status': 429}), b'Rate limited'))},
+            {'file2': (None, HttpError(httplib2.Response({'status': 404}), b'File not found'))},
+        ]
+        batches = []
+        
+        def mock_new_batch(callback):
+            batch = MagicMock()
+            added = []
+            round_responses = responses[len(batches)]
+            batch.add.side_effect = lambda request, request_id: added.append(request_id)
+            batch.execute.side_effect = lambda: [callback(rid, *round_responses[rid]) for rid in added]
+            batches.append(added)
+            return batch
+        
+        watcher.service.new_batch_http_request.side_effect = mock_new_batch
+        
+        assert watcher.check_for_deleted_files() == ['file2']
+        assert batches == [['file1', 'file2'], ['file2']]
+        mock_sleep.assert_called_once()
+            
+    @patch('time.sleep')
+    def test_execute_retries_transient_errors(self, mock_sleep, watcher):
+        """Test that transient Drive errors are retried with backoff"""
+        request = MagicMock()
+        rate_limited = HttpError(
+            httplib2.Response({'status': 403}),
+            json.dumps({'error': {'errors': [{'reason': 'rateLimitExceeded'}]}}).encode()
+        )
+        unavailable = HttpError(httplib2.Response({'status': 503, 'retry-after': '3'}), b'')
+        request.execute.side_effect = [rate_limited, unavailable, {'files': []}]
+        
+        result = watcher._execute(request)
+        
+        assert result == {'files': []}
+        assert request.execute.call_count == 3
+        assert mock_sleep.call_count == 2
+        assert 1 <= mock_sleep.call_args_list[0][0][0] < 2
+        assert mock_sleep.call_args_list[1][0][0] == 3
+    
+    @patch('time.sleep')
+    def test_execute_raises_non_retryable_errors(self, mock_sleep, watcher):
+        """Test that permanent Drive errors are raised immediately"""
+        request = MagicMock()
+        request.execute.side_effect = HttpError(httplib2.Response({'status': 404}), b'File not found')
+        
+        with pytest.raises(HttpError):
+            watcher._execute(request)
+        
+        assert request.execute.call_count == 1
+        mock_sleep.assert_not_called()
+    
+    @patch.object(GoogleDriveWatcher, '_build_service')
+    def test_get_service_per_thread(self, mock_build_service, watcher):
+        """Test that worker threads get their own Drive service"""
+        watcher.service = MagicMock()
+        watcher.credentials = MagicMock()
+        mock_build_service.side_effect = lambda creds: MagicMock()
+        
+        # The main thread uses the shared service
+        assert watcher._get_service() is watcher.service
+        
+        # Each worker thread builds and reuses its own service
+        services = []
+        def worker():
+            services.append((watcher._get_service(), watcher._get_service()))
+        threads = [threading.Thread(target=worker) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert mock_build_service.call_count == 2
+        assert all(first is second for first, second in services)
+        assert services[0][0] is not services[1][0]
+        assert all(first is not watcher.service for first, _ in services)
+    
+    @patch('Google_Drive.drive_watcher.Request')
+    def test_refresh_credentials_if_expiring(self, mock_request, watcher, tmp_path):
+        """Test that credentials close to expiry are refreshed ahead of time"""
+        watcher.token_path = str(tmp_path / 'token.json')
+        watcher.credentials = MagicMock(refresh_token='refresh')
+        watcher.credentials.to_json.return_value = '{}'
+        
+        # Credentials valid for an hour are left alone
+        watcher.credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+        watcher.refresh_credentials_if_expiring()
+        watcher.credentials.refresh.assert_not_called()
+        
+        # Credentials expiring within the margin are refreshed and saved
+        watcher.credentials.expiry = datetime.utcnow() + timedelta(minutes=1)
+        watcher.refresh_credentials_if_expiring()
+        watcher.credentials.refresh.assert_called_once()
+        assert os.path.exists(watcher.token_path)
+    
+    def test_save_and_load_known_files(self, watcher, tmp_path):
+        """Test that known_files round-trips through the sidecar cache"""
+        watcher.known_files_path = str(tmp_path / 'config.known_files.json')
+        watcher.known_files = {'file1': '2023-01-01T00:00:00Z'}
+        watcher.save_known_files()
+        
+        watcher.known_files = {}
+        assert watcher.load_known_files() is True
+        assert watcher.known_files == {'file1': '2023-01-01T00:00:00Z'}
+        
+        # A stale cache is ignored so the initial scan runs again
+        stale = time.time() - 2 * 24 * 60 * 60
+        os.utime(watcher.known_files_path, (stale, stale))
+        watcher.known_files = {}
+        assert watcher.load_known_files() is False
+        assert watcher.known_files == {}
+    
+    def test_load_known_files_missing(self, watcher, tmp_path):
+        """Test that a missing cache falls back to the initial scan"""
+        watcher.known_files_path = str(tmp_path / 'missing.json')
+        assert watcher.load_known_files() is False
+    
+    @pytest.mark.skipif(orjson is None, reason="orjson is not installed")
+    def test_orjson_model_matches_json_model(self):
+        """Test that the orjson response model parses like the default JsonModel"""
+        content = json.dumps({'files': [{'id': 'file1', 'name': 'Résumé'}], 'nextPageToken': 'page2'}).encode()
+        
+        assert OrjsonModel().deserialize(content) == JsonModel().deserialize(content)
+        assert OrjsonModel().deserialize(b'') == JsonModel().deserialize(b'')
+    
+    def test_parse_and_format_drive_time(self):
+        """Test that Drive timestamps round-trip through the helpers"""
+        parsed = parse_drive_time('2023-05-15T10:30:00.123Z')
+        
+        assert parsed == datetime(2023, 5, 15, 10, 30, 0, 123000, tzinfo=timezone.utc)
+        assert format_drive_time(parsed) == '2023-05-15T10:30:00.123000Z'
+        assert format_drive_time(datetime(2023, 5, 15, 10, 30)) == '2023-05-15T10:30:00.000000Z'
+        assert parse_drive_time('2023-05-15T12:30:00+02:00') == datetime(2023, 5, 15, 10, 30, tzinfo=timezone.utc)
+    
+    @patch('Google_Drive.drive_watcher.ThreadingHTTPServer')
+    def test_start_push_notifications(self, mock_server_cls, watcher):
+        """Test opening and renewing the push notification channel"""
+        watcher.service = MagicMock()
+        watcher.webhook_url = 'https://example.com/drive-webhook'
+        watcher.page_token = 'token1'
+        expiration = datetime.now(timezone.utc) + timedelta(hours=2)
+        watcher.service.changes().watch().execute.return_value = {
+            'id': 'channel1', 'resourceId': 'resource1',
+            'expiration': str(int(expiration.timestamp() * 1000))
+        }
+        
+        watcher.start_push_notifications()
+        
+        assert watcher.channel['id'] == 'channel1'
+        watch_kwargs = watcher.service.changes().watch.call_args[1]
+        assert watch_kwargs['pageToken'] == 'token1'
+        assert watch_kwargs['body']['address'] == 'https://example.com/drive-webhook'
+        mock_server_cls.assert_called_once()
+        
+        # A channel far from expiry is kept as is
+        watcher.service.changes().watch.reset_mock()
+        watcher.start_push_notifications()
+        watcher.service.changes().watch.assert_not_called()
+        
+        # Stopping closes the channel
+        watcher.stop_push_notifications()
+        watcher.service.channels().stop.assert_called_with(
+            body={'id': 'channel1', 'resourceId': 'resource1'}
+        )
+        assert watcher.channel is None
+    
+    def test_start_push_notifications_disabled(self, watcher):
+        """Test that push notifications are skipped without a webhook URL"""
+        watcher.service = MagicMock()
+        watcher.webhook_url = None
+        watcher.page_token = 'token1'
+        
+        watcher.start_push_notifications()
+        
+        watcher.service.changes().watch.assert_not_called()
+        assert watcher.channel is None
+    
+    def test_next_wait_seconds(self, watcher):
+        """Test that an open push channel turns polling into a rare reconciliation pass"""
+        now = datetime.now(timezone.utc)
+        watcher.channel = None
+        assert watcher.next_wait_seconds(60) == 60
+        
+        watcher.channel = {'id': 'c', 'resourceId': 'r', 'expiration': now + timedelta(days=1)}
+        assert watcher.next_wait_seconds(60) == PUSH_RECONCILE_INTERVAL
+        
+        # A channel about to expire is renewed at the next regular check
+        watcher.channel['expiration'] = now + timedelta(minutes=11)
+        assert watcher.next_wait_seconds(60) == 60
+    
+    def test_check_for_deleted_files_multiple_batches(self, watcher):
+        """Test that known files beyond one batch are probed in several batches"""
+        watcher.service = MagicMock()
+        watcher.known_files = {f'file{i}': '2023-01-01T00:00:00Z' for i in range(250)}
+        batches = []
+        
+        def mock_new_batch(callback):
+            batch = MagicMock()
+            added = []
+            batch.add.side_effect = lambda request, request_id: added.append(request_id)
+            batch.execute.side_effect = lambda: [
+                callback(rid, {'trashed': rid == 'file199', 'name': rid}, None) for rid in added
+            ]
+            batches.append(added)
+            return batch
+        
+        watcher.service.new_batch_http_request.side_effect = mock_new_batch
+        
+        result = watcher.check_for_deleted_files()
+        
+        assert result == ['file199']
+        assert sorted(len(batch) for batch in batches) == [50, 100, 100]
+    
+    @patch.object(GoogleDriveWatcher, 'download_file')
+    def test_process_files(self, mock_download, watcher, common_mocks):
+        """Test that changed files are extracted and processed for RAG in one batch"""
+        mock_extract_text = common_mocks['extract_text_from_file']
+        mock_process_files_rag = common_mocks['process_files_for_rag']
+        files = [
+            {'id': 'file1', 'name': 'a.txt', 'mimeType': 'text/plain', 'modifiedTime': '2023-01-02T00:00:00Z'},
+            {'id': 'file2', 'name': 'b.txt', 'mimeType': 'text/plain', 'modifiedTime': '2023-01-03T00:00:00Z'},
+            {'id': 'file3', 'name': 'c.bin', 'mimeType': 'application/octet-stream', 'modifiedTime': '2023-01-04T00:00:00Z'}
+        ]
+        mock_download.side_effect = lambda file_id, mime_type: file_id.encode()
+        mock_extract_text.side_effect = lambda content, mime_type, name, config: content.decode()
+        mock_process_files_rag.return_value = [True, True]
+        
+        watcher.process_files(files)
+        
+        mock_process_files_rag.assert_called_once()
+        batch = mock_process_files_rag.call_args[0][0]
+        assert [item['file_id'] for item in batch] == ['file1', 'file2']
+        assert batch[0]['text'] == 'file1'
+        # Only files processed successfully are recorded as known
+        assert watcher.known_files == {
+            'file1': '2023-01-02T00:00:00Z',
+            'file2': '2023-01-03T00:00:00Z'
+        }
+    
+    @patch.object(GoogleDriveWatcher, 'download_file')
+    def test_process_files_retries_failed_file(self, mock_download, watcher, common_mocks):
+        """Test that a file that failed to process is processed again on the next pass"""
+        mock_extract_text = common_mocks['extract_text_from_file']
+        mock_process_files_rag = common_mocks['process_files_for_rag']
+        file_data = {'id': 'file1', 'name': 'a.txt', 'mimeType': 'text/plain', 'modifiedTime': '2023-01-02T00:00:00Z'}
+        mock_download.return_value = b'file content'
+        mock_extract_text.return_value = 'extracted text'
+        mock_process_files_rag.side_effect = [[False], [True]]
+        
+        watcher.process_files([file_data])
+        assert 'file1' not in watcher.known_files
+        
+        watcher.process_files([file_data])
+        assert mock_process_files_rag.call_count == 2
+        assert watcher.known_files == {'file1': '2023-01-02T00:00:00Z'}
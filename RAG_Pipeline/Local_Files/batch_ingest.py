@@ -6,26 +6,164 @@ Use this for initial data loading instead of the continuous file watcher.
 """
 import os
 import sys
+import copy
+import mmap
 import argparse
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Optional
 
 # Add parent directory to path to import common modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from common.text_processor import extract_text_from_file
 from common.db_handler import process_file_for_rag
 
-def get_mime_type(file_path: str) -> str:
-    """Get MIME type from file extension."""
-    extension_mappings = {
-        '.md': 'text/markdown',
-        '.txt': 'text/plain',
-        '.pdf': 'application/pdf',
-        '.csv': 'text/csv',
-        '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+# Configuration used when config.json is missing or unreadable
+DEFAULT_CONFIG = {
+    "supported_mime_types": [
+        "text/markdown",
+        "text/plain",
+        "application/pdf",
+        "text/csv"
+    ],
+    "text_processing": {
+        "default_chunk_size": 400,
+        "default_chunk_overlap": 0
     }
+}
 
-    _, ext = os.path.splitext(file_path.lower())
-    return extension_mappings.get(ext, 'text/plain')
+# Files at least this large are memory-mapped instead of read into a bytes object
+MMAP_THRESHOLD = 1024 * 1024
+
+# Progress messages from the worker threads are queued and printed by one listener
+# thread started in ingest_directory, so workers never wait on stdout
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+EXTENSION_MIME_TYPES = {
+    '.md': 'text/markdown',
+    '.txt': 'text/plain',
+    '.pdf': 'application/pdf',
+    '.csv': 'text/csv',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+def get_mime_type(file_path: str) -> Optional[str]:
+    """Get MIME type from file extension, or None if the extension is unknown."""
+    # Lowercase only the extension rather than the whole path
+    dot = file_path.rfind('.')
+    if dot < 0:
+        return None
+    return EXTENSION_MIME_TYPES.get(file_path[dot:].lower())
+
+
+def _iter_files(root: str):
+    """
+    Recursively yield the non-hidden files under a directory.
+
+    Uses os.scandir so the file/directory checks come from the cached
+    directory entry instead of an extra stat() per path.
+
+    Args:
+        root: Directory to walk
+
+    Returns:
+        Generator of Path objects for each file found
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.is_file():
+                yield Path(entry.path)
+
+
+def _ingest_one(file_path: Path, config: dict, supported_prefixes: tuple) -> str:
+    """
+    Read, extract and store a single file.
+
+    Args:
+        file_path: Path of the file to ingest
+        config: Configuration dictionary with processing settings
+        supported_prefixes: Tuple of supported MIME type prefixes
+
+    Returns:
+        'ok' if the file was ingested, 'skip' if its type is unsupported,
+        'fail' otherwise
+    """
+    try:
+        mime_type = get_mime_type(str(file_path))
+
+        # Unknown extensions are skipped without reading the file
+        if mime_type is None:
+            logger.info(f"[SKIP] Unknown extension: {file_path.name}")
+            return 'skip'
+
+        # Check if supported
+        if not mime_type.startswith(supported_prefixes):
+            logger.info(f"[SKIP] Unsupported type: {file_path.name} ({mime_type})")
+            return 'skip'
+
+        logger.info(f"[PROC] Processing: {file_path.name}")
+
+        # Read file content
+        with open(file_path, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                return _ingest_content(file_path, f.readall(), mime_type, config)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as file_content:
+                return _ingest_content(file_path, file_content, mime_type, config)
+
+    except Exception as e:
+        logger.info(f"  [ERROR] Error processing {file_path.name}: {e}")
+        return 'fail'
+
+
+def _ingest_content(file_path: Path, file_content, mime_type: str, config: dict) -> str:
+    """
+    Extract text from already-read file content and store it for RAG.
+
+    Args:
+        file_path: Path of the file being ingested
+        file_content: The file's bytes, or an mmap of the file for large files
+        mime_type: MIME type of the file
+        config: Configuration dictionary with processing settings
+
+    Returns:
+        'ok' if the file was ingested, 'fail' otherwise
+    """
+    # Extract text
+    text = extract_text_from_file(file_content, mime_type, file_path.name, config)
+
+    if not text:
+        logger.info(f"  [FAIL] No text extracted from {file_path.name}")
+        return 'fail'
+
+    # Process for RAG; the path doubles as the file ID and, prefixed, the link
+    file_id = os.fspath(file_path)
+    web_view_link = "file://" + file_id
+
+    success = process_file_for_rag(
+        file_content=file_content,
+        text=text,
+        file_id=file_id,
+        file_url=web_view_link,
+        file_title=file_path.stem,
+        mime_type=mime_type,
+        config=config
+    )
+
+    if success:
+        logger.info(f"  [OK] Successfully ingested: {file_path.name}")
+        return 'ok'
+    logger.info(f"  [FAIL] Failed to ingest: {file_path.name}")
+    return 'fail'
 
 
 def ingest_directory(directory_path: str, config: dict) -> None:
@@ -44,73 +182,44 @@ def ingest_directory(directory_path: str, config: dict) -> None:
 
     print(f"\n>> Starting batch ingestion from: {directory}\n")
 
-    # Get all files (recursively)
-    files = list(directory.rglob('*'))
-    files = [f for f in files if f.is_file() and not f.name.startswith('.')]
-
-    print(f"Found {len(files)} files to process\n")
-
-    processed = 0
-    skipped = 0
-    failed = 0
-
-    for file_path in files:
-        try:
-            file_name = file_path.stem
-            mime_type = get_mime_type(str(file_path))
+    supported_prefixes = tuple(config.get('supported_mime_types', []))
+    counts = {'ok': 0, 'skip': 0, 'fail': 0}
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
 
-            # Check if supported
-            supported_types = config.get('supported_mime_types', [])
-            if not any(mime_type.startswith(t) for t in supported_types):
-                print(f"[SKIP] Unsupported type: {file_path.name} ({mime_type})")
-                skipped += 1
-                continue
-
-            print(f"[PROC] Processing: {file_path.name}")
-
-            # Read file content
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = QueueListener(log_queue, stream_handler)
+    logger.addHandler(queue_handler)
+    listener.start()
 
-            # Extract text
-            text = extract_text_from_file(file_content, mime_type, file_path.name, config)
-
-            if not text:
-                print(f"  [FAIL] No text extracted from {file_path.name}")
-                failed += 1
-                continue
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Submit files as the walk finds them (recursively), so reads start
+            # while the rest of the tree is still being scanned
+            futures = [
+                executor.submit(_ingest_one, file_path, config, supported_prefixes)
+                for file_path in _iter_files(str(directory))
+            ]
+            logger.info(f"Found {len(futures)} files to process\n")
+            for future in as_completed(futures):
+                counts[future.result()] += 1
+    finally:
+        # Stopping the listener flushes the queued messages before the summary
+        logger.removeHandler(queue_handler)
+        listener.stop()
 
-            # Process for RAG
-            file_id = str(file_path)
-            web_view_link = f"file://{file_path}"
-
-            success = process_file_for_rag(
-                file_content=file_content,
-                text=text,
-                file_id=file_id,
-                file_url=web_view_link,
-                file_title=file_name,
-                mime_type=mime_type,
-                config=config
-            )
-
-            if success:
-                print(f"  [OK] Successfully ingested: {file_path.name}")
-                processed += 1
-            else:
-                print(f"  [FAIL] Failed to ingest: {file_path.name}")
-                failed += 1
-
-        except Exception as e:
-            print(f"  [ERROR] Error processing {file_path.name}: {e}")
-            failed += 1
+    processed = counts['ok']
+    skipped = counts['skip']
+    failed = counts['fail']
 
     print(f"\n{'='*60}")
     print(f"Ingestion Summary:")
     print(f"  Processed: {processed}")
     print(f"  Skipped:   {skipped}")
     print(f"  Failed:    {failed}")
-    print(f"  Total:     {len(files)}")
+    print(f"  Total:     {len(futures)}")
     print(f"{'='*60}\n")
 
 
@@ -138,18 +247,7 @@ def main():
         print(f"[OK] Loaded configuration from {config_path}")
     except Exception as e:
         print(f"Warning: Could not load config, using defaults: {e}")
-        config = {
-            "supported_mime_types": [
-                "text/markdown",
-                "text/plain",
-                "application/pdf",
-                "text/csv"
-            ],
-            "text_processing": {
-                "default_chunk_size": 400,
-                "default_chunk_overlap": 0
-            }
-        }
+        config = copy.deepcopy(DEFAULT_CONFIG)
 
     # Ingest directory
     ingest_directory(args.directory, config)
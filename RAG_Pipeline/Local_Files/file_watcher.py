@@ -1,5 +1,6 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
+from collections import defaultdict
 from pathlib import Path
 import mimetypes
 import time
@@ -8,10 +9,119 @@ import sys
 import os
 import io
 import shutil
+import copy
+import stat
+import mmap
+import hashlib
+import sqlite3
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# watchdog is optional; without it the watcher falls back to polling the directory
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from common.text_processor import extract_text_from_file, chunk_text, create_embeddings
-from common.db_handler import process_file_for_rag, delete_document_by_file_id
+from common.db_handler import process_file_for_rag, process_files_for_rag, delete_document_by_file_id
+
+# Per-file progress is logged at DEBUG so large scans don't pay for a stdout write
+# per file; summaries and errors are still printed
+logger = logging.getLogger(__name__)
+
+# Custom mappings for common file extensions
+EXTENSION_MIME_TYPES = {
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.xls': 'application/vnd.ms-excel',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.doc': 'application/msword',
+    '.csv': 'text/csv',
+    '.pdf': 'application/pdf',
+    '.txt': 'text/plain'
+}
+
+# Load the system MIME type tables once, rather than re-reading them for every watcher;
+# skip it if something imported earlier already did
+if not mimetypes.inited:
+    mimetypes.init()
+
+# Files at least this large are memory-mapped instead of read into a bytes object
+MMAP_THRESHOLD = 64 * 1024
+
+# Number of directories listed and stat-ed concurrently when scanning for changes
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Number of files read and extracted concurrently before their chunks are embedded together
+MAX_PROCESS_WORKERS = 8
+
+# Number of changed files gathered from a scan before they are processed together
+CHANGE_BATCH_SIZE = 64
+
+# Types whose text extraction is CPU-bound pure Python (pypdf holds the GIL), so in
+# batches they are extracted in worker processes instead of threads
+CPU_BOUND_MIME_TYPES = frozenset(['application/pdf'])
+EXTRACT_PROCESSES = os.cpu_count() or 1
+# The watcher runs several threads (observer, extraction pool, HTTP clients), and a
+# child forked from it could inherit a lock another thread holds, so the worker
+# processes come from a fork server instead, or are spawned where there is none
+EXTRACT_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Quiet period after a file system event before the queued paths are processed, so
+# editors that write and then rename a file only trigger one processing run
+EVENT_DEBOUNCE_SECONDS = 0.5
+
+# While watchdog is running, the directory is still rescanned this often (in seconds)
+# to pick up events the OS dropped, unless the interval is longer
+OBSERVER_RECONCILE_INTERVAL = 15 * 60
+
+# Minimum number of seconds between writes of the last check time to the state database
+STATE_SAVE_INTERVAL = 5
+
+# last_check_time is stored as local time, with the trailing 'Z' the config has always used
+EPOCH = datetime(1970, 1, 1)
+
+# Configuration used when the config file is missing or unreadable
+DEFAULT_CONFIG = {
+    "supported_mime_types": [
+        "application/pdf",
+        "text/plain",
+        "text/csv",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    ],
+    "tabular_mime_types": [
+        "text/csv",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    ],
+    "text_processing": {
+        "default_chunk_size": 400,
+        "default_chunk_overlap": 0
+    }
+}
+
+class _ChangeHandler(FileSystemEventHandler):
+    """
+    Hands the file paths reported by watchdog to the watcher and wakes it up.
+    """
+    EVENT_TYPES = frozenset(['created', 'modified', 'deleted', 'moved'])
+    
+    def __init__(self, watcher: 'LocalFileWatcher'):
+        super().__init__()
+        self.watcher = watcher
+    
+    def on_any_event(self, event) -> None:
+        if event.is_directory or event.event_type not in self.EVENT_TYPES:
+            return
+        self.watcher.queue_path(event.src_path)
+        # A move is a deletion of the old path and a change to the new one
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.queue_path(dest_path)
 
 class LocalFileWatcher:
     def __init__(self, watch_directory: str = None, config_path: str = None):
@@ -29,6 +139,11 @@ class LocalFileWatcher:
         else:
             # Default to config.json in the same directory as this script
             self.config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json')
+        # Runtime state lives next to the config so config.json is never rewritten by the watcher
+        self.state_db_path = os.path.splitext(self.config_path)[0] + '.state.db'
+        self._state_db: Optional[sqlite3.Connection] = None
+        self._state_dirty = False  # Set when last_check_time changed but was not written yet
+        self._state_saved_at = float('-inf')  # time.monotonic() of the last write
         self.load_config()
         
         # Set up the watch directory
@@ -44,10 +159,17 @@ class LocalFileWatcher:
         os.makedirs(self.watch_directory, exist_ok=True)
         
         self.known_files = {}  # Store file paths and their last modified time
-        self.initialized = False  # Flag to track if we've done the initial scan
-        
-        # Initialize mimetypes
-        mimetypes.init()
+        self._seen_mtimes: Dict[str, int] = {}  # st_mtime_ns of each file when it was last reported
+        self.load_known_files()
+        self._saved_known_files = dict(self.known_files)  # known_files as last written to the state database
+        self._content_hashes = self.load_content_hashes()  # (size, digest) of each file when it was last processed
+        # Flag to track if we've done the initial scan; known files restored from a
+        # previous run take its place
+        self.initialized = bool(self.known_files)
+        self.wake_event = threading.Event()  # Set when file system events are queued
+        self._pending_paths = set()  # Paths reported by watchdog since the last drain
+        self._pending_lock = threading.Lock()
+        self._extract_pool: Optional[ProcessPoolExecutor] = None  # Created on the first CPU-bound batch
         
         print(f"Local File Watcher initialized. Watching directory: {self.watch_directory}")
     
@@ -60,54 +182,186 @@ class LocalFileWatcher:
                 self.config = json.load(f)
             print(f"Loaded configuration from {self.config_path}")
             
-            # Load the last check time from config
-            last_check_time_str = self.config.get('last_check_time', '1970-01-01T00:00:00.000Z')
+            # Load the last check time from the state database, falling back to the
+            # config for setups that stored it there
+            last_check_time_str = self.load_state_check_time() or self.config.get('last_check_time', '1970-01-01T00:00:00.000Z')
             try:
-                self.last_check_time = datetime.strptime(last_check_time_str, '%Y-%m-%dT%H:%M:%S.%fZ')
+                self.last_check_time = datetime.fromisoformat(last_check_time_str.removesuffix('Z'))
                 print(f"Resuming from last check time: {self.last_check_time}")
             except ValueError:
                 # If the date format is invalid, use the default
-                self.last_check_time = datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+                self.last_check_time = EPOCH
                 print("Invalid last check time format in config, using default")
                 
         except Exception as e:
             print(f"Error loading configuration: {e}")
-            self.config = {
-                "supported_mime_types": [
-                    "application/pdf",
-                    "text/plain",
-                    "text/csv",
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                ],
-                "tabular_mime_types": [
-                    "text/csv",
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                ],
-                "text_processing": {
-                    "default_chunk_size": 400,
-                    "default_chunk_overlap": 0
-                },
-                "last_check_time": "1970-01-01T00:00:00.000Z"
-            }
-            self.last_check_time = datetime.strptime('1970-01-01T00:00:00.000Z', '%Y-%m-%dT%H:%M:%S.%fZ')
+            self.config = copy.deepcopy(DEFAULT_CONFIG)
+            self.last_check_time = EPOCH
             print("Using default configuration")
+        
+        # Cache the lookups used for every processed file
+        supported_mime_types = self.config.get('supported_mime_types', [])
+        self._mime_supported = dict.fromkeys(supported_mime_types, True)
+        self._supported_mime_prefixes = tuple(supported_mime_types)
             
-    def save_last_check_time(self) -> None:
+    def open_state_db(self) -> sqlite3.Connection:
+        """
+        Open the state database, creating it on first use.
+        
+        Returns:
+            sqlite3.Connection: Connection to the state database
+        """
+        if self._state_db is None:
+            db = sqlite3.connect(self.state_db_path, isolation_level=None)
+            # Updates are appended to the write-ahead log instead of rewriting the database
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), last_check_time TEXT NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS known_files ("
+                "path TEXT PRIMARY KEY, modified_time TEXT NOT NULL, mtime_ns INTEGER)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS content_hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, digest BLOB NOT NULL)"
+            )
+            self._state_db = db
+        return self._state_db
+    
+    def load_state_check_time(self) -> Optional[str]:
         """
-        Save the last check time to the config file.
+        Load the last check time from the state database.
+        
+        Returns:
+            Optional[str]: The stored last check time, or None if none was saved yet
         """
+        if not os.path.exists(self.state_db_path):
+            return None
         try:
-            # Update the last_check_time in the config
-            self.config['last_check_time'] = self.last_check_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-            
-            # Write the updated config back to the file
-            with open(self.config_path, 'w') as f:
-                json.dump(self.config, f, indent=2)
-                
-            print(f"Saved last check time: {self.last_check_time}")
+            row = self.open_state_db().execute("SELECT last_check_time FROM state").fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading state database: {e}")
+            return None
+        return row[0] if row else None
+    
+    def load_known_files(self) -> None:
+        """
+        Restore the known files recorded by a previous run from the state database.
+        """
+        if not os.path.exists(self.state_db_path):
+            return
+        try:
+            rows = self.open_state_db().execute("SELECT path, modified_time, mtime_ns FROM known_files")
+            for path, modified_time, mtime_ns in rows:
+                self.known_files[path] = modified_time
+                if mtime_ns is not None:
+                    self._seen_mtimes[path] = mtime_ns
+        except sqlite3.Error as e:
+            print(f"Error reading state database: {e}")
+            return
+        if self.known_files:
+            print(f"Restored {len(self.known_files)} known files from {self.state_db_path}")
+    
+    def load_content_hashes(self) -> Dict[str, Tuple[int, bytes]]:
+        """
+        Load the content fingerprints of processed files from the state database.
+        
+        Returns:
+            Dict[str, Tuple[int, bytes]]: File path to (size, digest) of its processed content
+        """
+        if not os.path.exists(self.state_db_path):
+            return {}
+        try:
+            rows = self.open_state_db().execute("SELECT path, size, digest FROM content_hashes")
+            return {path: (size, digest) for path, size, digest in rows}
+        except sqlite3.Error as e:
+            print(f"Error reading state database: {e}")
+            return {}
+    
+    def save_content_hash(self, file_path: str, fingerprint: Optional[Tuple[int, bytes]]) -> None:
+        """
+        Remember the content fingerprint of a processed file, or forget a deleted one.
+        
+        Args:
+            file_path: Path to the file
+            fingerprint: (size, digest) of the processed content, or None to remove the entry
+        """
+        try:
+            if fingerprint is None:
+                self._content_hashes.pop(file_path, None)
+                self.open_state_db().execute("DELETE FROM content_hashes WHERE path = ?", (file_path,))
+            else:
+                self._content_hashes[file_path] = fingerprint
+                self.open_state_db().execute(
+                    "INSERT OR REPLACE INTO content_hashes (path, size, digest) VALUES (?, ?, ?)",
+                    (file_path, *fingerprint)
+                )
+        except sqlite3.Error as e:
+            print(f"Error saving content hash: {e}")
+    
+    def save_last_check_time(self, force: bool = False) -> None:
+        """
+        Save the last check time to the state database.
+        
+        Writes are coalesced: a save within STATE_SAVE_INTERVAL seconds of the previous
+        one only marks the state as dirty, and it is written by the next save or flush.
+        
+        Args:
+            force: Write immediately, regardless of when the last write happened
+        """
+        self._state_dirty = True
+        now = time.monotonic()
+        if not force and now - self._state_saved_at < STATE_SAVE_INTERVAL:
+            return
+        try:
+            self._write_state()
+            self._state_dirty = False
+            self._state_saved_at = now
+            logger.debug("Saved last check time: %s", self.last_check_time)
         except Exception as e:
             print(f"Error saving last check time: {e}")
     
+    def _write_state(self) -> None:
+        """
+        Write the last check time and the known files changed since the last write
+        to the state database in one transaction.
+        """
+        saved = self._saved_known_files
+        changed = [
+            (path, modified_time, self._seen_mtimes.get(path))
+            for path, modified_time in self.known_files.items()
+            if saved.get(path) != modified_time
+        ]
+        removed = [(path,) for path in saved if path not in self.known_files]
+        
+        db = self.open_state_db()
+        db.execute("BEGIN")
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO state (id, last_check_time) VALUES (0, ?)",
+                (self.last_check_time.isoformat(timespec='microseconds') + 'Z',)
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO known_files (path, modified_time, mtime_ns) VALUES (?, ?, ?)",
+                changed
+            )
+            db.executemany("DELETE FROM known_files WHERE path = ?", removed)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._saved_known_files = dict(self.known_files)
+    
+    def flush_state(self) -> None:
+        """
+        Write the last check time and known files if they changed since the last write.
+        """
+        if self._state_dirty or self.known_files != self._saved_known_files:
+            self.save_last_check_time(force=True)
+    
     def get_mime_type(self, file_path: str) -> str:
         """
         Get the MIME type of a file.
@@ -118,23 +372,12 @@ class LocalFileWatcher:
         Returns:
             str: MIME type of the file
         """
-        # Custom mappings for common file extensions
-        extension_mappings = {
-            '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            '.xls': 'application/vnd.ms-excel',
-            '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            '.doc': 'application/msword',
-            '.csv': 'text/csv',
-            '.pdf': 'application/pdf',
-            '.txt': 'text/plain'
-        }
-        
-        # Get file extension
-        _, ext = os.path.splitext(file_path.lower())
-        
-        # Check if extension is in our custom mappings
-        if ext in extension_mappings:
-            return extension_mappings[ext]
+        # Check if the extension is in our custom mappings, lowercasing only the extension
+        dot = file_path.rfind('.')
+        if dot >= 0:
+            mime_type = EXTENSION_MIME_TYPES.get(file_path[dot:].lower())
+            if mime_type:
+                return mime_type
         
         # Fall back to mimetypes module
         mime_type, _ = mimetypes.guess_type(file_path)
@@ -144,19 +387,30 @@ class LocalFileWatcher:
             
         return mime_type
     
-    def get_file_content(self, file_path: str) -> Optional[bytes]:
+    def get_file_content(self, file_path: str) -> Optional[Union[bytes, mmap.mmap]]:
         """
         Read the content of a file.
         
+        Files of MMAP_THRESHOLD bytes or more are memory-mapped instead of copied
+        into memory; the caller closes the returned mmap when done with it.
+        
         Args:
             file_path: Path to the file
             
         Returns:
-            bytes: Content of the file, or None if reading fails
+            bytes or mmap: Content of the file, or None if reading fails
         """
         try:
-            with open(file_path, 'rb') as f:
-                return f.read()
+            # Unbuffered: the whole file is read in one call, so a BufferedReader would
+            # only add an 8 KiB buffer allocation per file
+            with open(file_path, 'rb', buffering=0) as f:
+                if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                    return f.readall()
+                content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Extraction reads the file front to back, so favour readahead
+                if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    content.madvise(mmap.MADV_SEQUENTIAL)
+                return content
         except Exception as e:
             print(f"Error reading file {file_path}: {e}")
             return None
@@ -168,49 +422,203 @@ class LocalFileWatcher:
         Returns:
             List[Dict[str, Any]]: List of file information dictionaries
         """
-        changed_files = []
+        return list(self.iter_changes())
+    
+    def iter_changes(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield files that have been created or modified since the last check.
         
-        # Walk through the watch directory
-        for root, _, files in os.walk(self.watch_directory):
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                file_stat = os.stat(file_path)
+        Files are yielded as their directories are scanned, so they can be processed
+        while the rest of the tree is still being walked. The last check time is only
+        advanced once the scan has been fully consumed.
+        
+        Yields:
+            Dict[str, Any]: File information dictionary of each changed file
+        """
+        changed_count = 0
+        
+        # Files modified while the scan is running are picked up by the next one
+        scan_started = datetime.now()
+        
+        # Compare the raw integer stat timestamps, so datetimes are only built for
+        # changed files; last_check_time has microsecond precision, so this is exact
+        since_ns = round(self.last_check_time.timestamp() * 1_000_000) * 1000
+        
+        # Scan the watch directory tree, listing and stat-ing several directories at
+        # once; each scan hands back the subdirectories it found to be scanned next
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            pending = {executor.submit(self._scan_directory, self.watch_directory, since_ns)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subdirectories, files = future.result()
+                    pending.update(executor.submit(self._scan_directory, path, since_ns) for path in subdirectories)
+                    changed_count += len(files)
+                    yield from files
+        
+        # Update the last check time
+        self.last_check_time = scan_started
+        
+        # Save the updated last check time; when nothing changed the saved time can
+        # stay behind, since the next scan would find the same files anyway
+        if changed_count:
+            self.save_last_check_time()
+    
+    def _scan_directory(self, directory: str, since_ns: int) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        List one directory, returning its subdirectories and its new or modified files.
+        
+        Args:
+            directory: Path of the directory to scan
+            since_ns: Time of the last check, in nanoseconds since the epoch
+            
+        Returns:
+            Tuple[List[str], List[Dict[str, Any]]]: Subdirectory paths to scan, and
+            file information dictionaries for the changed files
+        """
+        subdirectories = []
+        changed_files = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # The entry type comes from the directory listing itself, so these
+                # checks cost no extra syscall for plain files and directories
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                    continue
+                # Like os.walk, symlinked directories are not followed
+                if not entry.is_file():
+                    continue
+                
+                file_path = entry.path
+                file_stat = entry.stat()
                 
-                # Convert to datetime for comparison
-                mod_time = datetime.fromtimestamp(file_stat.st_mtime)
-                create_time = datetime.fromtimestamp(file_stat.st_ctime)
+                # Known files whose content timestamp is exactly as last reported are unchanged
+                if file_path in self.known_files and self._seen_mtimes.get(file_path) == file_stat.st_mtime_ns:
+                    continue
                 
                 # Check if the file is new or modified
                 if file_path not in self.known_files or \
-                   mod_time > self.last_check_time or \
-                   create_time > self.last_check_time:
-                    
-                    # Get relative path for display
-                    rel_path = os.path.relpath(file_path, self.watch_directory)
-                    
-                    # Get MIME type
-                    mime_type = self.get_mime_type(file_path)
-                    
-                    # Create a file info dictionary similar to Google Drive
-                    file_info = {
-                        'id': file_path,  # Use file path as ID
-                        'name': file_name,
-                        'mimeType': mime_type,
-                        'webViewLink': f"file://{file_path}",  # Local file URL
-                        'modifiedTime': mod_time.isoformat(),
-                        'createdTime': create_time.isoformat(),
-                        'trashed': False
-                    }
-                    
-                    changed_files.append(file_info)
+                   file_stat.st_mtime_ns > since_ns or \
+                   file_stat.st_ctime_ns > since_ns:
+                    self._seen_mtimes[file_path] = file_stat.st_mtime_ns
+                    changed_files.append(self._file_info(
+                        file_path,
+                        datetime.fromtimestamp(file_stat.st_mtime),
+                        datetime.fromtimestamp(file_stat.st_ctime)
+                    ))
+        return subdirectories, changed_files
+    
+    def _file_info(self, file_path: str, mod_time: datetime, create_time: datetime) -> Dict[str, Any]:
+        """
+        Build the file information dictionary for a local file.
         
-        # Update the last check time
-        self.last_check_time = datetime.now()
+        Args:
+            file_path: Path to the file
+            mod_time: The file's modification time
+            create_time: The file's creation (ctime) time
+            
+        Returns:
+            Dict[str, Any]: File information dictionary similar to Google Drive's
+        """
+        return {
+            'id': file_path,  # Use file path as ID
+            'name': os.path.basename(file_path),
+            'mimeType': self.get_mime_type(file_path),
+            'webViewLink': f"file://{file_path}",  # Local file URL
+            'modifiedTime': mod_time.isoformat(),
+            'createdTime': create_time.isoformat(),
+            'trashed': False
+        }
+    
+    def queue_path(self, file_path: str) -> None:
+        """
+        Queue a path reported by a file system event and wake the watcher.
         
-        # Save the updated last check time to config
-        self.save_last_check_time()
+        Args:
+            file_path: Path of the created, modified, deleted or moved file
+        """
+        with self._pending_lock:
+            self._pending_paths.add(file_path)
+        self.wake_event.set()
+    
+    def wait_for_events(self, timeout: float) -> bool:
+        """
+        Wait for file system events, then for the burst they belong to to settle.
+        
+        Args:
+            timeout: Maximum number of seconds to wait for the first event
+            
+        Returns:
+            bool: True if events were queued, False if the timeout passed without any
+        """
+        if not self.wake_event.wait(timeout):
+            return False
+        # Keep waiting while events keep arriving, but never for longer than the timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            self.wake_event.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.wake_event.wait(min(EVENT_DEBOUNCE_SECONDS, remaining)):
+                return True
+    
+    def process_pending_paths(self) -> int:
+        """
+        Process the paths queued by file system events since the last call.
+        
+        Paths that no longer exist are removed from the database; new or modified
+        files are processed, and files whose modification time is unchanged are skipped.
+        
+        Returns:
+            int: The number of files processed or deleted
+        """
+        with self._pending_lock:
+            paths, self._pending_paths = self._pending_paths, set()
         
-        return changed_files
+        handled = 0
+        changed_files = []
+        for file_path in sorted(paths):
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                if file_path in self.known_files:
+                    logger.debug("Processing deleted file: %s", file_path)
+                    delete_document_by_file_id(file_path)
+                    del self.known_files[file_path]
+                    self.save_content_hash(file_path, None)
+                    handled += 1
+                continue
+            
+            if not stat.S_ISREG(file_stat.st_mode):
+                continue
+            
+            # Like the directory scan, check whether the file changed before building
+            # anything for it: first against the exact timestamp last seen, then
+            # against the recorded modification time
+            if file_path in self.known_files and self._seen_mtimes.get(file_path) == file_stat.st_mtime_ns:
+                continue
+            self._seen_mtimes[file_path] = file_stat.st_mtime_ns
+            mod_time = datetime.fromtimestamp(file_stat.st_mtime)
+            if self.known_files.get(file_path) == mod_time.isoformat():
+                continue
+            changed_files.append(self._file_info(file_path, mod_time, datetime.fromtimestamp(file_stat.st_ctime)))
+        
+        if changed_files:
+            self.process_files(changed_files)
+        return handled + len(changed_files)
+    
+    def start_observer(self):
+        """
+        Start watching the directory for file system events, if watchdog is installed.
+        
+        Returns:
+            The running watchdog Observer, or None when the watcher has to poll
+        """
+        if Observer is None:
+            return None
+        observer = Observer()
+        observer.schedule(_ChangeHandler(self), self.watch_directory, recursive=True)
+        observer.start()
+        return observer
     
     def check_for_deleted_files(self) -> List[str]:
         """
@@ -219,58 +627,253 @@ class LocalFileWatcher:
         Returns:
             List[str]: List of deleted file IDs (paths)
         """
-        deleted_files = []
+        # Group the known files by directory, so each directory is listed once
+        # instead of checking every file with its own syscall
+        files_by_directory = defaultdict(list)
+        for file_path in self.known_files:
+            files_by_directory[os.path.dirname(file_path)].append(file_path)
         
-        # Check each known file to see if it still exists
-        for file_path in list(self.known_files.keys()):
-            if not os.path.exists(file_path):
-                deleted_files.append(file_path)
+        deleted_files = []
+        for directory, file_paths in files_by_directory.items():
+            try:
+                names = set(os.listdir(directory))
+            except OSError:
+                # Missing or unreadable directory; check its files one by one
+                deleted_files.extend(path for path in file_paths if not os.path.exists(path))
+                continue
+            deleted_files.extend(path for path in file_paths if os.path.basename(path) not in names)
         
         return deleted_files
     
-    def process_file(self, file: Dict[str, Any]) -> None:
+    def _is_supported_mime_type(self, mime_type: str) -> bool:
         """
-        Process a single file for the RAG pipeline.
+        Check whether a MIME type is supported, remembering the answer for the type.
+        
+        Args:
+            mime_type: The MIME type of the file
+            
+        Returns:
+            bool: True if files of this type should be processed
+        """
+        supported = self._mime_supported.get(mime_type)
+        if supported is None:
+            # Most types match exactly, but entries such as 'image/svg' are also
+            # prefixes of the real type ('image/svg+xml')
+            supported = mime_type.startswith(self._supported_mime_prefixes)
+            self._mime_supported[mime_type] = supported
+        return supported
+    
+    def extract_file(self, file: Dict[str, Any], extract_pool: Optional[Executor] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read a file and extract its text for the RAG pipeline.
         
         Args:
             file: File information dictionary
+            extract_pool: Worker processes to extract CPU_BOUND_MIME_TYPES in, if any
+            
+        Returns:
+            Optional[Dict[str, Any]]: The process_file_for_rag arguments plus the content
+            fingerprint, or None if the file is skipped. The caller closes the content
+            with close_content once it is done with it.
         """
         file_path = file['id']
         file_name, extension = os.path.splitext(file['name'])
         mime_type = file['mimeType']
         web_view_link = file['webViewLink']
         
-        print(f"Processing file: {file_name}.{extension} (Path: {file_path})")
+        logger.debug("Processing file: %s%s (Path: %s)", file_name, extension, file_path)
         
         # Skip unsupported file types
-        supported_mime_types = self.config.get('supported_mime_types', [])
-        if not any(mime_type.startswith(t) for t in supported_mime_types):
+        if not self._is_supported_mime_type(mime_type):
             print(f"Skipping unsupported file type: {mime_type}")
-            return
+            return None
         
         # Get the file content
         file_content = self.get_file_content(file_path)
         if not file_content:
             print(f"Failed to read file '{file_name}' (Path: {file_path})")
+            return None
+        
+        extracted = None
+        try:
+            # A file whose modification time changed but whose content did not (touched,
+            # metadata-only saves) is not extracted and embedded again; the size is
+            # compared first so only same-sized files need a matching digest
+            fingerprint = (len(file_content), hashlib.blake2b(file_content, digest_size=16).digest())
+            if self._content_hashes.get(file_path) == fingerprint:
+                logger.debug("Skipping file '%s' with unchanged content (Path: %s)", file_name, file_path)
+                self.known_files[file_path] = file.get('modifiedTime')
+                return None
+            
+            # Extract text from the file
+            if extract_pool is not None and mime_type in CPU_BOUND_MIME_TYPES:
+                text = extract_pool.submit(
+                    extract_text_from_file, bytes(file_content), mime_type, file['name'], self.config
+                ).result()
+            else:
+                text = extract_text_from_file(file_content, mime_type, file['name'], self.config)
+            if not text:
+                print(f"No text could be extracted from file '{file_name}' (Path: {file_path})")
+                return None
+            
+            extracted = {
+                'file_content': file_content,
+                'text': text,
+                'file_id': file_path,
+                'file_url': web_view_link,
+                'file_title': file_name,
+                'mime_type': mime_type,
+                'fingerprint': fingerprint
+            }
+            return extracted
+        finally:
+            if extracted is None:
+                self.close_content(file_content)
+    
+    @staticmethod
+    def close_content(file_content: Union[bytes, mmap.mmap]) -> None:
+        """
+        Release file content returned by get_file_content.
+        
+        Args:
+            file_content: The file content
+        """
+        if isinstance(file_content, mmap.mmap):
+            file_content.close()
+    
+    def process_file(self, file: Dict[str, Any]) -> None:
+        """
+        Process a single file for the RAG pipeline.
+        
+        Args:
+            file: File information dictionary
+        """
+        extracted = self.extract_file(file)
+        if extracted is None:
             return
         
-        # Extract text from the file
-        text = extract_text_from_file(file_content, mime_type, file['name'], self.config)
-        if not text:
-            print(f"No text could be extracted from file '{file_name}' (Path: {file_path})")
+        try:
+            # Process the file for RAG
+            success = process_file_for_rag(
+                extracted['file_content'], extracted['text'], extracted['file_id'], extracted['file_url'],
+                extracted['file_title'], extracted['mime_type'], self.config
+            )
+        finally:
+            self.close_content(extracted['file_content'])
+        self._record_processed(file, extracted['fingerprint'], success)
+    
+    def process_files(self, files: List[Dict[str, Any]]) -> None:
+        """
+        Process several files for the RAG pipeline.
+        
+        Files are read and extracted concurrently, with CPU-bound types parsed in
+        worker processes, then the chunks of all of them are embedded together
+        before being stored.
+        
+        Args:
+            files: File information dictionaries
+        """
+        extract_pool = None
+        if any(file.get('mimeType') in CPU_BOUND_MIME_TYPES for file in files):
+            extract_pool = self._get_extract_pool()
+        
+        def extract(file):
+            try:
+                return self.extract_file(file, extract_pool)
+            except Exception as e:
+                print(f"Error processing file {file.get('id')}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=MAX_PROCESS_WORKERS) as executor:
+            extracted = list(executor.map(extract, files))
+        
+        ready = [(file, item) for file, item in zip(files, extracted) if item is not None]
+        if not ready:
             return
+        try:
+            results = process_files_for_rag([item for _, item in ready], self.config)
+        finally:
+            for _, item in ready:
+                self.close_content(item['file_content'])
+        for (file, item), success in zip(ready, results):
+            self._record_processed(file, item['fingerprint'], success)
+    
+    def _get_extract_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the worker processes used to extract text from CPU-bound file types.
+        
+        Returns:
+            ProcessPoolExecutor: The pool, started on first use
+        """
+        if self._extract_pool is None:
+            self._extract_pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context(EXTRACT_START_METHOD)
+            )
+        return self._extract_pool
+    
+    def _record_processed(self, file: Dict[str, Any], fingerprint: Tuple[int, bytes], success: bool) -> None:
+        """
+        Record a file processed for the RAG pipeline and report the outcome.
         
-        # Process the file for RAG
-        success = process_file_for_rag(file_content, text, file_path, web_view_link, file_name, mime_type, self.config)
+        A file that failed is forgotten, so the next scan (periodic or polling) or
+        the next event for it processes it again.
         
-        # Update the known files dictionary
-        self.known_files[file_path] = file.get('modifiedTime')
+        Args:
+            file: File information dictionary
+            fingerprint: (size, digest) of the processed content
+            success: Whether the file was processed successfully
+        """
+        file_path = file['id']
+        file_name = os.path.splitext(file['name'])[0]
         
         if success:
-            print(f"Successfully processed file '{file_name}' (Path: {file_path})")
+            self.known_files[file_path] = file.get('modifiedTime')
+            self.save_content_hash(file_path, fingerprint)
+            logger.debug("Successfully processed file '%s' (Path: %s)", file_name, file_path)
         else:
+            self.known_files.pop(file_path, None)
             print(f"Failed to process file '{file_name}' (Path: {file_path})")
     
+    def check_for_changes(self) -> None:
+        """
+        Scan for new, modified and deleted files since the last check and process them.
+        """
+        # Process changes since the last check in batches while the scan runs
+        changed_count = 0
+        batch = []
+        for file in self.iter_changes():
+            batch.append(file)
+            if len(batch) >= CHANGE_BATCH_SIZE:
+                self.process_files(batch)
+                changed_count += len(batch)
+                batch = []
+        if batch:
+            self.process_files(batch)
+            changed_count += len(batch)
+        
+        if changed_count:
+            print(f"Found {changed_count} new or modified files.")
+        else:
+            print("No new or modified files found.")
+        
+        # Check for deleted files
+        deleted_file_ids = self.check_for_deleted_files()
+        
+        # Process deleted files
+        if deleted_file_ids:
+            print(f"Found {len(deleted_file_ids)} deleted files.")
+            for file_id in deleted_file_ids:
+                logger.debug("Processing deleted file: %s", file_id)
+                # Delete from database
+                delete_document_by_file_id(file_id)
+                # Remove from known_files
+                del self.known_files[file_id]
+                self.save_content_hash(file_id, None)
+        
+        # Record what was processed, so a restart resumes from here
+        self.flush_state()
+    
     def watch_for_changes(self, interval_seconds: int = 60) -> None:
         """
         Watch for changes in the local directory at regular intervals.
@@ -280,45 +883,55 @@ class LocalFileWatcher:
         """
         print(f"Starting Local File watcher in {self.watch_directory}. Checking for changes every {interval_seconds} seconds...")
         
+        observer = None
         try:
+            # Set up the extraction processes before any of the watcher's threads start
+            self._get_extract_pool()
+            
+            # Start listening before the initial scan so no change made during it is missed
+            observer = self.start_observer()
+            
             # Initial scan to build the known_files dictionary
             if not self.initialized:
                 print("Performing initial scan of files...")
-                # Get all files in the watched directory
-                initial_files = self.get_changes()
-                
-                # Build the known_files dictionary - only store the modifiedTime
-                for file in initial_files:
+                # Build the known_files dictionary from all files in the watched
+                # directory - only store the modifiedTime
+                for file in self.iter_changes():
                     # Only store the modifiedTime to avoid processing all files
                     self.known_files[file['id']] = file.get('modifiedTime')
                 
                 print(f"Found {len(self.known_files)} files in initial scan.")
                 self.initialized = True
+                self.flush_state()
+            elif observer:
+                # Catch up on changes made while the watcher was not running; without
+                # watchdog the polling loop below does this on its first pass
+                print("Checking for changes made since the last run...")
+                self.check_for_changes()
             
-            while True:
-                # Get changes since the last check
-                changed_files = self.get_changes()
-                
-                # Check for deleted files
-                deleted_file_ids = self.check_for_deleted_files()
-                
-                # Process changed files
-                if changed_files:
-                    print(f"Found {len(changed_files)} new or modified files.")
-                    for file in changed_files:
-                        self.process_file(file)
+            # With watchdog, only the paths the OS reports are looked at instead of
+            # walking the whole directory every interval. Events can still be lost
+            # (inotify queue overflow, watch limit), so the tree is rescanned now and
+            # then; the last check time is only advanced by those scans, so they see
+            # every file changed since the previous one
+            if observer:
+                print("Watching for file system events...")
+            reconcile_seconds = max(interval_seconds, OBSERVER_RECONCILE_INTERVAL)
+            next_reconcile = time.monotonic() + reconcile_seconds
+            while observer and observer.is_alive():
+                self.wait_for_events(min(interval_seconds, max(0, next_reconcile - time.monotonic())))
+                self.process_pending_paths()
+                if time.monotonic() >= next_reconcile:
+                    self.check_for_changes()
+                    next_reconcile = time.monotonic() + reconcile_seconds
                 else:
-                    print("No new or modified files found.")
-                
-                # Process deleted files
-                if deleted_file_ids:
-                    print(f"Found {len(deleted_file_ids)} deleted files.")
-                    for file_id in deleted_file_ids:
-                        print(f"Processing deleted file: {file_id}")
-                        # Delete from database
-                        delete_document_by_file_id(file_id)
-                        # Remove from known_files
-                        del self.known_files[file_id]
+                    self.flush_state()
+            
+            if observer:
+                print("File system observer stopped, falling back to polling for changes...")
+            
+            while True:
+                self.check_for_changes()
                 
                 # Wait for the next check
                 print(f"Waiting {interval_seconds} seconds until next check...")
@@ -328,3 +941,11 @@ class LocalFileWatcher:
             print("Stopping Local File watcher...")
         except Exception as e:
             print(f"Error in Local File watcher: {e}")
+        finally:
+            if observer:
+                observer.stop()
+                observer.join()
+            if self._extract_pool:
+                self._extract_pool.shutdown()
+                self._extract_pool = None
+            self.flush_state()
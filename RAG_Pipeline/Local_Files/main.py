@@ -1,9 +1,13 @@
 import os
 import argparse
 import sys
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
-from file_watcher import LocalFileWatcher
+from file_watcher import LocalFileWatcher, logger as watcher_logger
+from common.db_handler import logger as db_logger
 
 def main():
     """
@@ -20,9 +24,24 @@ def main():
                         help='Directory to watch for files (relative to script location)')
     parser.add_argument('--interval', type=int, default=60,
                         help='Interval in seconds between checks for changes')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Log the progress of every processed file')
     
     args = parser.parse_args()
     
+    # Per-file messages are formatted and written on a background thread, so they
+    # don't hold up processing
+    listener = None
+    if args.verbose:
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter('%(message)s'))
+        listener = QueueListener(log_queue, stream_handler)
+        for verbose_logger in (watcher_logger, db_logger):
+            verbose_logger.addHandler(QueueHandler(log_queue))
+            verbose_logger.setLevel(logging.DEBUG)
+        listener.start()
+    
     try:
         # Start the Local File watcher
         watcher = LocalFileWatcher(
@@ -38,6 +57,9 @@ def main():
     except Exception as e:
         print(f"Error running Local Files RAG Pipeline: {e}")
         sys.exit(1)
+    finally:
+        if listener:
+            listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,7 @@ import pytest
 import os
 import sys
 import json
+import shutil
 from pathlib import Path
 from unittest.mock import MagicMock
 
@@ -37,3 +38,26 @@ def tmp_test_dir(tmp_path):
     (test_dir / "sample.csv").write_text("a,b,c\n1,2,3")
     
     return test_dir
+
+def _populate_corpus(root):
+    """Write the sample ingest corpus, including nested and hidden entries"""
+    (root / "nested" / "deeper").mkdir(parents=True)
+    (root / ".git").mkdir()
+    (root / "case_study.md").write_text("# Case Study\n\nA short case study.")
+    (root / "notes.txt").write_text("Plain text notes.")
+    (root / "nested" / "metrics.csv").write_text("a,b,c\n1,2,3")
+    (root / "nested" / "deeper" / "summary.md").write_text("# Summary\n\nDeeply nested.")
+    (root / ".hidden.md").write_text("# Hidden file")
+    (root / ".git" / "config.md").write_text("# Inside a hidden directory")
+
+@pytest.fixture(scope="session")
+def _corpus_template(tmp_path_factory):
+    """Build the sample ingest corpus once per session"""
+    root = tmp_path_factory.mktemp("corpus")
+    _populate_corpus(root)
+    return root
+
+@pytest.fixture
+def corpus(_corpus_template, tmp_path):
+    """A private copy of the sample ingest corpus that tests can change freely"""
+    return Path(shutil.copytree(_corpus_template, tmp_path / "corpus"))
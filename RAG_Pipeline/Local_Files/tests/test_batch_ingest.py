@@ -0,0 +1,85 @@
+import pytest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import mmap
+
+# Mock environment variables before importing modules that use them
+with patch.dict(os.environ, {
+    'SUPABASE_URL': 'https://test-supabase-url.com',
+    'SUPABASE_SERVICE_KEY': 'test-supabase-key',
+    'EMBEDDING_PROVIDER': 'openai',
+    'EMBEDDING_BASE_URL': 'https://api.openai.com/v1',
+    'EMBEDDING_API_KEY': 'test-embedding-key',
+    'EMBEDDING_MODEL_CHOICE': 'text-embedding-3-small',
+    'LLM_PROVIDER': 'openai',
+    'LLM_BASE_URL': 'https://api.openai.com/v1',
+    'LLM_API_KEY': 'test-llm-key',
+    'VISION_LLM_CHOICE': 'gpt-4-vision-preview'
+}):
+    # Mock the Supabase client
+    with patch('supabase.create_client') as mock_create_client:
+        mock_supabase = MagicMock()
+        mock_create_client.return_value = mock_supabase
+        
+        # Add the parent directory to sys.path to import the modules
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+        from Local_Files.batch_ingest import ingest_directory, get_mime_type
+
+class TestBatchIngest:
+    @pytest.fixture
+    def mock_config(self):
+        """Fixture for a configuration that leaves plain text unsupported"""
+        return {
+            "supported_mime_types": [
+                "text/markdown",
+                "text/csv"
+            ],
+            "text_processing": {
+                "default_chunk_size": 400,
+                "default_chunk_overlap": 0
+            }
+        }
+    
+    def test_get_mime_type(self):
+        """Test MIME type detection from the file extension"""
+        assert get_mime_type('/docs/Report.PDF') == 'application/pdf'
+        assert get_mime_type('/docs/data.csv') == 'text/csv'
+        assert get_mime_type('/docs/notes.txt') == 'text/plain'
+        # Unknown extensions are not guessed as plain text
+        assert get_mime_type('/docs.v2/README') is None
+        assert get_mime_type('/media/video.mp4') is None
+    
+    @patch('Local_Files.batch_ingest.process_file_for_rag', return_value=True)
+    def test_ingest_directory(self, mock_process_rag, corpus, mock_config, capfd):
+        """Test that supported files are ingested recursively and hidden entries ignored"""
+        (corpus / 'archive.zip').write_bytes(b'PK\x03\x04')
+        
+        ingest_directory(str(corpus), mock_config)
+        
+        ingested = sorted(c.kwargs['file_id'] for c in mock_process_rag.call_args_list)
+        assert ingested == sorted(str(corpus / p) for p in (
+            'case_study.md', 'nested/metrics.csv', 'nested/deeper/summary.md'
+        ))
+        
+        captured = capfd.readouterr()
+        assert "[SKIP] Unsupported type: notes.txt (text/plain)" in captured.out
+        assert "Processed: 3" in captured.out
+        assert "[SKIP] Unknown extension: archive.zip" in captured.out
+        assert "Skipped:   2" in captured.out
+        assert "Total:     5" in captured.out
+    
+    @patch('Local_Files.batch_ingest.MMAP_THRESHOLD', 1)
+    @patch('Local_Files.batch_ingest.process_file_for_rag')
+    def test_ingest_directory_memory_maps_large_files(self, mock_process_rag, corpus, mock_config):
+        """Test that files over the threshold are ingested from an mmap"""
+        contents = []
+        mock_process_rag.side_effect = lambda **kwargs: contents.append(
+            (type(kwargs['file_content']), kwargs['text'])
+        ) or True
+        (corpus / 'case_study.md').unlink()
+        (corpus / 'nested').joinpath('metrics.csv').unlink()
+        
+        ingest_directory(str(corpus), mock_config)
+        
+        assert contents == [(mmap.mmap, "# Summary\n\nDeeply nested.")]
@@ -10,6 +10,8 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import time
 import shutil
+import mmap
+import logging
 
 # Mock environment variables before importing modules that use them
 with patch.dict(os.environ, {
@@ -31,7 +33,7 @@ with patch.dict(os.environ, {
         
         # Add the parent directory to sys.path to import the modules
         sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-        from Local_Files.file_watcher import LocalFileWatcher
+        from Local_Files.file_watcher import LocalFileWatcher, _ChangeHandler
 
 class TestLocalFileWatcher:
     @pytest.fixture
@@ -132,28 +134,60 @@ class TestLocalFileWatcher:
         captured = capfd.readouterr()
         assert "Invalid last check time format" in captured.out
     
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('json.dump')
-    def test_save_last_check_time(self, mock_json_dump, mock_file_open, watcher):
-        """Test saving last check time to config file"""
+    def test_save_last_check_time(self, watcher):
+        """Test saving last check time to the state database"""
         # Set a specific last check time
         test_time = datetime(2023, 5, 15, 10, 30, 0)
         watcher.last_check_time = test_time
         
+        with open(watcher.config_path) as f:
+            config_before = f.read()
+        
         # Call the method
         watcher.save_last_check_time()
         
-        # Verify the config was updated and written to file
-        assert watcher.config['last_check_time'] == test_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        mock_json_dump.assert_called_once()
-        mock_file_open.assert_called_once_with(watcher.config_path, 'w')
+        # The config file is left alone and a new watcher resumes from the saved time
+        with open(watcher.config_path) as f:
+            assert f.read() == config_before
+        assert watcher.load_state_check_time() == test_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        resumed = LocalFileWatcher(watch_directory=watcher.watch_directory, config_path=watcher.config_path)
+        assert resumed.last_check_time == test_time
+    
+    def test_save_last_check_time_coalesces_writes(self, watcher):
+        """Test that saves in quick succession are deferred until flushed"""
+        watcher.last_check_time = datetime(2023, 5, 15, 10, 30, 0)
+        watcher.save_last_check_time()
+        
+        watcher.last_check_time = datetime(2023, 5, 15, 10, 31, 0)
+        watcher.save_last_check_time()
+        assert watcher.load_state_check_time() == '2023-05-15T10:30:00.000000Z'
+        
+        watcher.flush_state()
+        assert watcher.load_state_check_time() == '2023-05-15T10:31:00.000000Z'
+    
+    def test_known_files_restored(self, watcher):
+        """Test that known files are persisted and restored by the next watcher"""
+        watcher.known_files = {'/test_dir/a.txt': '2023-01-01T00:00:00', '/test_dir/b.txt': '2023-01-02T00:00:00'}
+        watcher._seen_mtimes['/test_dir/a.txt'] = 1672531200000000000
+        watcher.flush_state()
+        
+        resumed = LocalFileWatcher(watch_directory=watcher.watch_directory, config_path=watcher.config_path)
+        assert resumed.known_files == watcher.known_files
+        assert resumed._seen_mtimes == {'/test_dir/a.txt': 1672531200000000000}
+        # The restored state takes the place of the initial scan
+        assert resumed.initialized
+        
+        # Only the difference is written on the next save
+        del resumed.known_files['/test_dir/b.txt']
+        resumed.known_files['/test_dir/c.txt'] = '2023-01-03T00:00:00'
+        resumed.flush_state()
+        restarted = LocalFileWatcher(watch_directory=watcher.watch_directory, config_path=watcher.config_path)
+        assert restarted.known_files == {'/test_dir/a.txt': '2023-01-01T00:00:00', '/test_dir/c.txt': '2023-01-03T00:00:00'}
     
-    @patch('builtins.open')
-    @patch('json.dump')
-    def test_save_last_check_time_error(self, mock_json_dump, mock_open, watcher, capfd):
+    def test_save_last_check_time_error(self, watcher, capfd):
         """Test error handling when saving last check time"""
-        # Setup mock to raise an exception
-        mock_open.side_effect = Exception("Write error")
+        # Point the state database at a path that cannot be created
+        watcher.state_db_path = os.path.join(watcher.watch_directory, 'missing', 'state.db')
         
         # Set a specific last check time
         test_time = datetime(2023, 5, 15, 10, 30, 0)
@@ -191,6 +225,18 @@ class TestLocalFileWatcher:
         # Verify the result
         assert result == test_content
     
+    @patch('Local_Files.file_watcher.MMAP_THRESHOLD', 1)
+    def test_get_file_content_large_file(self, watcher, tmp_path):
+        """Test that files over the threshold are memory-mapped"""
+        test_file = tmp_path / "large.txt"
+        test_file.write_bytes(b"Large test content")
+        
+        result = watcher.get_file_content(str(test_file))
+        
+        assert isinstance(result, mmap.mmap)
+        assert result[:] == b"Large test content"
+        result.close()
+    
     def test_get_file_content_error(self, watcher, capfd):
         """Test error handling when reading file content"""
         # Call the method with a non-existent file
@@ -203,35 +249,23 @@ class TestLocalFileWatcher:
         captured = capfd.readouterr()
         assert "Error reading file" in captured.out
     
-    @patch('os.walk')
-    @patch('os.stat')
-    @patch.object(LocalFileWatcher, 'get_mime_type')
     @patch.object(LocalFileWatcher, 'save_last_check_time')
-    def test_get_changes(self, mock_save, mock_get_mime, mock_stat, mock_walk, watcher):
+    def test_get_changes(self, mock_save, watcher):
         """Test getting changes in watched directory"""
-        # Setup mocks
-        mock_walk.return_value = [
-            ('/test_dir', [], ['file1.txt', 'file2.pdf'])
-        ]
-        
-        # Create mock stat results
-        class MockStat:
-            def __init__(self, mtime, ctime):
-                self.st_mtime = mtime
-                self.st_ctime = ctime
-        
-        # Set file modification and creation times
-        now_timestamp = datetime.now().timestamp()
-        mock_stat.side_effect = [
-            MockStat(now_timestamp, now_timestamp),  # file1.txt
-            MockStat(now_timestamp, now_timestamp)   # file2.pdf
-        ]
-        
-        # Set MIME types
-        mock_get_mime.side_effect = ['text/plain', 'application/pdf']
+        # Setup files, including one in a subdirectory and one that is unchanged
+        watch_dir = Path(watcher.watch_directory)
+        (watch_dir / 'file1.txt').write_text('text')
+        (watch_dir / 'nested').mkdir()
+        (watch_dir / 'nested' / 'file2.pdf').write_bytes(b'%PDF')
+        unchanged = watch_dir / 'unchanged.txt'
+        unchanged.write_text('old')
+        
+        # Only files unknown to the watcher are new when nothing changed since the last check
+        watcher.known_files = {str(unchanged): '2023-01-01T00:00:00'}
+        watcher.last_check_time = datetime.now() + timedelta(minutes=1)
         
         # Call the method
-        result = watcher.get_changes()
+        result = sorted(watcher.get_changes(), key=lambda f: f['name'])
         
         # Verify results
         assert len(result) == 2
@@ -239,6 +273,30 @@ class TestLocalFileWatcher:
         assert result[0]['mimeType'] == 'text/plain'
         assert result[1]['name'] == 'file2.pdf'
         assert result[1]['mimeType'] == 'application/pdf'
+        assert result[1]['id'] == str(watch_dir / 'nested' / 'file2.pdf')
+        mock_save.assert_called_once()
+        
+        # Once recorded, files whose mtime did not move are skipped without a save
+        for file in result:
+            watcher.known_files[file['id']] = file['modifiedTime']
+        watcher._seen_mtimes[str(unchanged)] = unchanged.stat().st_mtime_ns
+        watcher.last_check_time = datetime.now() - timedelta(hours=1)
+        assert watcher.get_changes() == []
+        mock_save.assert_called_once()
+    
+    @patch.object(LocalFileWatcher, 'save_last_check_time')
+    def test_iter_changes(self, mock_save, watcher):
+        """Test that the last check time only advances once all changes were consumed"""
+        (Path(watcher.watch_directory) / 'file1.txt').write_text('text')
+        (Path(watcher.watch_directory) / 'file2.txt').write_text('text')
+        before = watcher.last_check_time
+        
+        changes = watcher.iter_changes()
+        assert next(changes)['name'] in ('file1.txt', 'file2.txt')
+        assert watcher.last_check_time == before
+        
+        assert len(list(changes)) == 1
+        assert watcher.last_check_time > before
         mock_save.assert_called_once()
     
     @patch('os.path.exists')
@@ -262,6 +320,26 @@ class TestLocalFileWatcher:
         assert '/test_dir/file2.pdf' in result
         assert '/test_dir/file3.csv' in result
     
+    def test_check_for_deleted_files_lists_directories(self, watcher):
+        """Test that deleted files are found by listing each known directory"""
+        subdir = os.path.join(watcher.watch_directory, 'sub')
+        os.makedirs(subdir)
+        kept = os.path.join(subdir, 'kept.txt')
+        with open(kept, 'w') as f:
+            f.write('content')
+        watcher.known_files = {
+            kept: '2023-01-01T00:00:00',
+            os.path.join(subdir, 'removed.txt'): '2023-01-01T00:00:00',
+            os.path.join(watcher.watch_directory, 'gone', 'file.txt'): '2023-01-01T00:00:00'
+        }
+        
+        with patch('os.path.exists', wraps=os.path.exists) as mock_exists:
+            result = watcher.check_for_deleted_files()
+        
+        assert sorted(result) == sorted(path for path in watcher.known_files if path != kept)
+        # Only the file in the missing directory needed its own check
+        mock_exists.assert_called_once_with(os.path.join(watcher.watch_directory, 'gone', 'file.txt'))
+    
     def test_process_file(self, watcher):
         """Test processing a file for the RAG pipeline"""
         # Create a mock file
@@ -286,6 +364,127 @@ class TestLocalFileWatcher:
             # Verify the known_files was updated
             assert watcher.known_files['/test_dir/test.txt'] == '2023-01-01T00:00:00Z'
     
+    def test_process_file_unchanged_content(self, watcher, caplog):
+        """Test that a file whose content did not change is not processed again"""
+        file_data = {
+            'id': '/test_dir/test.txt',
+            'name': 'test.txt',
+            'mimeType': 'text/plain',
+            'webViewLink': 'file:///test_dir/test.txt',
+            'modifiedTime': '2023-01-01T00:00:00Z'
+        }
+        watcher.get_file_content = MagicMock(return_value=b'test content')
+        caplog.set_level(logging.DEBUG, logger='Local_Files.file_watcher')
+        
+        with patch('Local_Files.file_watcher.extract_text_from_file', return_value='test content'), \
+             patch('Local_Files.file_watcher.process_file_for_rag', return_value=True) as mock_process:
+            watcher.process_file(file_data)
+            # Only the modification time changed
+            watcher.process_file(dict(file_data, modifiedTime='2023-01-02T00:00:00Z'))
+            assert mock_process.call_count == 1
+            assert watcher.known_files['/test_dir/test.txt'] == '2023-01-02T00:00:00Z'
+            assert "unchanged content" in caplog.text
+            
+            # The fingerprints survive a restart
+            resumed = LocalFileWatcher(watch_directory=watcher.watch_directory, config_path=watcher.config_path)
+            resumed.get_file_content = watcher.get_file_content
+            resumed.process_file(file_data)
+            assert mock_process.call_count == 1
+            
+            # Changed content of the same size is processed
+            watcher.get_file_content.return_value = b'test CONTENT'
+            watcher.process_file(file_data)
+            assert mock_process.call_count == 2
+    
+    def test_process_files(self, watcher):
+        """Test that the chunks of several files are processed in one batch"""
+        files = []
+        for name in ('a.txt', 'b.txt', 'c.bin'):
+            path = os.path.join(watcher.watch_directory, name)
+            with open(path, 'w') as f:
+                f.write(f'content of {name}')
+            files.append({
+                'id': path,
+                'name': name,
+                'mimeType': watcher.get_mime_type(path) if name.endswith('.txt') else 'application/octet-stream',
+                'webViewLink': f'file://{path}',
+                'modifiedTime': '2023-01-01T00:00:00'
+            })
+        
+        with patch('Local_Files.file_watcher.extract_text_from_file', side_effect=lambda content, *args: bytes(content).decode()), \
+             patch('Local_Files.file_watcher.process_files_for_rag', return_value=[True, False]) as mock_process:
+            watcher.process_files(files)
+        
+        # The unsupported file is skipped and the other two are stored together
+        mock_process.assert_called_once()
+        batch = mock_process.call_args[0][0]
+        assert [item['file_id'] for item in batch] == [files[0]['id'], files[1]['id']]
+        assert batch[0]['text'] == 'content of a.txt'
+        # Only the successfully stored file is recorded and fingerprinted
+        assert set(watcher.known_files) == {files[0]['id']}
+        assert set(watcher._content_hashes) == {files[0]['id']}
+    
+    def test_failed_file_is_picked_up_by_next_scan(self, watcher):
+        """Test that a known file that failed to process is found again by the next scan"""
+        path = os.path.join(watcher.watch_directory, 'a.txt')
+        with open(path, 'w') as f:
+            f.write('content')
+        file_stat = os.stat(path)
+        file = watcher._file_info(path, datetime.fromtimestamp(file_stat.st_mtime), datetime.fromtimestamp(file_stat.st_ctime))
+        watcher.known_files[path] = '2023-01-01T00:00:00'
+        watcher.last_check_time = datetime.now() + timedelta(minutes=1)
+        
+        with patch('Local_Files.file_watcher.extract_text_from_file', return_value='content'), \
+             patch('Local_Files.file_watcher.process_files_for_rag', return_value=[False]):
+            watcher.process_files([file])
+        
+        with patch.object(watcher, 'save_last_check_time'):
+            assert [changed['id'] for changed in watcher.get_changes()] == [path]
+    
+    def test_process_files_extracts_pdfs_in_worker_processes(self, watcher):
+        """Test that CPU-bound types are extracted in the process pool and others inline"""
+        files = []
+        for name in ('a.pdf', 'b.txt'):
+            path = os.path.join(watcher.watch_directory, name)
+            with open(path, 'wb') as f:
+                f.write(b'content')
+            files.append({
+                'id': path,
+                'name': name,
+                'mimeType': watcher.get_mime_type(path),
+                'webViewLink': f'file://{path}',
+                'modifiedTime': '2023-01-01T00:00:00'
+            })
+        pool = MagicMock()
+        pool.submit.return_value.result.return_value = 'pdf text'
+        
+        with patch.object(watcher, '_get_extract_pool', return_value=pool), \
+             patch('Local_Files.file_watcher.extract_text_from_file', return_value='plain text') as mock_extract, \
+             patch('Local_Files.file_watcher.process_files_for_rag', return_value=[True, True]) as mock_process:
+            watcher.process_files(files)
+        
+        pool.submit.assert_called_once()
+        assert pool.submit.call_args[0][2:4] == ('application/pdf', 'a.pdf')
+        mock_extract.assert_called_once()
+        assert [item['text'] for item in mock_process.call_args[0][0]] == ['pdf text', 'plain text']
+    
+    def test_extract_pool_does_not_fork(self, watcher):
+        """Test that extraction workers are not forked from the multi-threaded watcher"""
+        pool = watcher._get_extract_pool()
+        try:
+            assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+            assert watcher._get_extract_pool() is pool
+        finally:
+            pool.shutdown()
+    
+    def test_is_supported_mime_type(self, watcher):
+        """Test exact and prefix MIME type matches, and that answers are remembered"""
+        assert watcher._is_supported_mime_type('application/pdf')
+        assert watcher._is_supported_mime_type('text/plain; charset=utf-8')
+        assert not watcher._is_supported_mime_type('application/octet-stream')
+        assert watcher._mime_supported['text/plain; charset=utf-8'] is True
+        assert watcher._mime_supported['application/octet-stream'] is False
+    
     def test_process_file_unsupported_type(self, watcher, capfd):
         """Test processing a file with unsupported MIME type"""
         # Create a mock file with unsupported MIME type
@@ -345,16 +544,83 @@ class TestLocalFileWatcher:
         captured = capfd.readouterr()
         assert "No text could be extracted" in captured.out
     
-    @patch.object(LocalFileWatcher, 'get_changes')
+    @patch.object(LocalFileWatcher, 'process_files')
+    @patch('Local_Files.file_watcher.delete_document_by_file_id')
+    def test_process_pending_paths(self, mock_delete, mock_process, watcher):
+        """Test that queued event paths are processed, deleted or skipped as unchanged"""
+        new_file = os.path.join(watcher.watch_directory, 'new.txt')
+        unchanged_file = os.path.join(watcher.watch_directory, 'unchanged.txt')
+        deleted_file = os.path.join(watcher.watch_directory, 'deleted.txt')
+        for path in (new_file, unchanged_file):
+            with open(path, 'w') as f:
+                f.write('content')
+        watcher.known_files = {
+            unchanged_file: datetime.fromtimestamp(os.stat(unchanged_file).st_mtime).isoformat(),
+            deleted_file: '2023-01-01T00:00:00'
+        }
+        
+        # A move reports both the old and the new path
+        event = MagicMock(is_directory=False, event_type='moved', src_path=deleted_file, dest_path=new_file)
+        _ChangeHandler(watcher).on_any_event(event)
+        watcher.queue_path(unchanged_file)
+        assert watcher.wake_event.is_set()
+        
+        assert watcher.process_pending_paths() == 2
+        
+        mock_process.assert_called_once()
+        assert [file['id'] for file in mock_process.call_args[0][0]] == [new_file]
+        assert mock_process.call_args[0][0][0]['mimeType'] == 'text/plain'
+        mock_delete.assert_called_once_with(deleted_file)
+        assert deleted_file not in watcher.known_files
+        # The queue is drained
+        assert watcher.process_pending_paths() == 0
+        
+        # Once its timestamp was seen, an unchanged file is skipped before anything is built for it
+        watcher.queue_path(unchanged_file)
+        with patch.object(watcher, '_file_info') as mock_file_info:
+            assert watcher.process_pending_paths() == 0
+        mock_file_info.assert_not_called()
+    
+    def test_wait_for_events(self, watcher):
+        """Test that waiting returns once a burst of events settles, or on timeout"""
+        assert watcher.wait_for_events(0.01) is False
+        
+        watcher.queue_path(os.path.join(watcher.watch_directory, 'a.txt'))
+        watcher.queue_path(os.path.join(watcher.watch_directory, 'b.txt'))
+        assert watcher.wait_for_events(1) is True
+        assert not watcher.wake_event.is_set()
+    
+    @patch('Local_Files.file_watcher.OBSERVER_RECONCILE_INTERVAL', 0)
+    @patch('time.sleep', side_effect=KeyboardInterrupt())
+    def test_watch_for_changes_reconciles_and_falls_back_to_polling(self, mock_sleep, watcher):
+        """Test that the observer loop rescans periodically and polls once the observer dies"""
+        watcher.initialized = True
+        observer = MagicMock()
+        observer.is_alive.side_effect = [True, False]
+        
+        with patch.object(watcher, 'start_observer', return_value=observer), \
+             patch.object(watcher, 'wait_for_events', return_value=False), \
+             patch.object(watcher, 'process_pending_paths', return_value=0) as mock_pending, \
+             patch.object(watcher, 'check_for_changes') as mock_check:
+            watcher.watch_for_changes(interval_seconds=0)
+        
+        # Catch-up on start, a reconciliation scan, then the first polling pass
+        assert mock_check.call_count == 3
+        mock_pending.assert_called_once()
+        mock_sleep.assert_called_once_with(0)
+        observer.stop.assert_called_once()
+    
+    @patch('Local_Files.file_watcher.Observer', None)
+    @patch.object(LocalFileWatcher, 'iter_changes')
     @patch.object(LocalFileWatcher, 'check_for_deleted_files')
-    @patch.object(LocalFileWatcher, 'process_file')
+    @patch.object(LocalFileWatcher, 'process_files')
     @patch('Local_Files.file_watcher.delete_document_by_file_id')
     @patch('time.sleep')
-    def test_watch_for_changes(self, mock_sleep, mock_delete, mock_process, mock_check_deleted, mock_get_changes, watcher):
+    def test_watch_for_changes(self, mock_sleep, mock_delete, mock_process, mock_check_deleted, mock_iter_changes, watcher):
         """Test watching for changes in the local directory"""
         # Setup mocks
         # First call is for initial scan, second call is for the first check
-        mock_get_changes.side_effect = [
+        mock_iter_changes.side_effect = [
             # Initial scan
             [
                 {'id': '/test_dir/file1.txt', 'modifiedTime': '2023-01-01T00:00:00Z', 'webViewLink': 'file:///test_dir/file1.txt'},
@@ -369,11 +635,12 @@ class TestLocalFileWatcher:
         # Mock check_for_deleted_files to return one deleted file
         mock_check_deleted.return_value = ['/test_dir/file1.txt']
         
-        # We need to make sure process_file is called before check_for_deleted_files
+        # We need to make sure process_files is called before check_for_deleted_files
         # to ensure both files are added to known_files before one is deleted
-        def side_effect_process_file(file):
-            watcher.known_files[file['id']] = file.get('modifiedTime')
-        mock_process.side_effect = side_effect_process_file
+        def side_effect_process_files(files):
+            for file in files:
+                watcher.known_files[file['id']] = file.get('modifiedTime')
+        mock_process.side_effect = side_effect_process_files
         
         # Mock sleep to raise KeyboardInterrupt after first iteration
         mock_sleep.side_effect = KeyboardInterrupt()
@@ -387,8 +654,9 @@ class TestLocalFileWatcher:
         assert watcher.known_files['/test_dir/file3.csv'] == '2023-01-02T00:00:00Z'
         assert '/test_dir/file1.txt' not in watcher.known_files
         
-        # Verify process_file was called for the new file
+        # Verify process_files was called for the new file
         mock_process.assert_called_once()
+        assert [file['id'] for file in mock_process.call_args[0][0]] == ['/test_dir/file3.csv']
         
         # Verify delete_document_by_file_id was called for the deleted file
         mock_delete.assert_called_once_with('/test_dir/file1.txt')
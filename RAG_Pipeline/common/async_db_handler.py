@@ -2,6 +2,7 @@
 Async database handler for RAG pipeline.
 
 This module provides async Supabase operations for:
+- A shared, connection-pooled client
 - Document deletion by file_id
 - Batch chunk insertion
 - Metadata management
@@ -12,25 +13,41 @@ All I/O operations are async following CLAUDE.md standards.
 
 import asyncio
 import base64
+import hashlib
 import json
+import logging
+import os
+import random
+import struct
 import traceback
+import weakref
+from dataclasses import dataclass, field
 from datetime import datetime
 from functools import wraps
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Awaitable, Optional
 
+import httpx
 from dotenv import load_dotenv
-from supabase import AClient, create_async_client
+from supabase import AClient, AsyncClientOptions, create_async_client
+
+# asyncpg is optional; without it large files are inserted through PostgREST too
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
 
 from .schemas import FileMetadata, IngestionResult, CaseStudyFrontmatter
 from .text_processor import (
     chunk_text,
     create_embeddings,
+    serialize_embedding,
     is_tabular_file,
-    extract_schema_from_csv,
-    extract_rows_from_csv
+    extract_schema_and_rows_from_csv
 )
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from project root
 project_root = Path(__file__).resolve().parent.parent.parent
 dotenv_path = project_root / '.env'
@@ -38,19 +55,166 @@ load_dotenv(dotenv_path, override=True)
 
 # Constants
 BATCH_SIZE = 100
+MAX_CONCURRENT_INSERTS = 8
+# Embedded batches waiting to be inserted; bounds memory when the API outpaces the database
+EMBEDDING_QUEUE_SIZE = 4
 DEFAULT_CHUNK_SIZE = 400
 DEFAULT_CHUNK_OVERLAP = 0
+# Transient failures worth retrying; anything else is raised immediately
+RETRYABLE_EXCEPTIONS = (httpx.HTTPError, asyncio.TimeoutError, ConnectionError)
+# Connection pool shared by every request made through get_supabase()
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+CLIENT_TIMEOUT = 30.0
+# Files with at least this many chunks are written with COPY over a direct
+# Postgres connection (DATABASE_URL) when asyncpg is installed
+COPY_MIN_CHUNKS = 2000
+
+
+
+@dataclass
+class _LoopClients:
+    """Shared clients of one event loop; their connections cannot be used from another loop."""
+    supabase: Optional[AClient] = None
+    http_client: Optional[httpx.AsyncClient] = None
+    supabase_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pg_pool: Any = None
+    pg_pool_failed: bool = False
+    pg_pool_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+# Dropped automatically when a loop (e.g. one from asyncio.run) is garbage collected
+_loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+
+
+def _get_loop_clients() -> _LoopClients:
+    """Get the shared clients of the running event loop."""
+    loop = asyncio.get_running_loop()
+    clients = _loop_clients.get(loop)
+    if clients is None:
+        clients = _loop_clients[loop] = _LoopClients()
+    return clients
+
+
+# ========== Client ==========
+
+async def get_supabase() -> AClient:
+    """
+    Get the running event loop's shared async Supabase client, creating it on first use.
+
+    The client sends all requests over one HTTP/2-capable connection pool,
+    so concurrent batch inserts reuse connections instead of opening new ones.
+    Each event loop gets its own client, so separate asyncio.run() calls work.
+
+    Returns:
+        Async Supabase client
+    """
+    clients = _get_loop_clients()
+    async with clients.supabase_lock:
+        if clients.supabase is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+                ),
+                http2=True,
+                timeout=CLIENT_TIMEOUT
+            )
+            clients.supabase = await create_async_client(
+                os.getenv("SUPABASE_URL"),
+                os.getenv("SUPABASE_SERVICE_KEY"),
+                options=AsyncClientOptions(httpx_client=http_client)
+            )
+            clients.http_client = http_client
+    return clients.supabase
+
+
+async def close_supabase() -> None:
+    """
+    Close the running event loop's shared Supabase client and Postgres pool.
+
+    Call before the loop finishes (e.g. at the end of the coroutine passed to
+    asyncio.run()); the next get_supabase() call creates a new client.
+    """
+    clients = _loop_clients.pop(asyncio.get_running_loop(), None)
+    if clients is None:
+        return
+    if clients.http_client is not None:
+        await clients.http_client.aclose()
+    if clients.pg_pool is not None:
+        await clients.pg_pool.close()
+
+
+def _encode_vector(embedding: List[float]) -> bytes:
+    """Encode an embedding in pgvector's binary format (dimensions, unused, float4 values)."""
+    return struct.pack(f">HH{len(embedding)}f", len(embedding), 0, *embedding)
+
+
+def _decode_vector(data: bytes) -> List[float]:
+    """Decode an embedding from pgvector's binary format."""
+    dimensions, _ = struct.unpack_from(">HH", data)
+    return list(struct.unpack_from(f">{dimensions}f", data, 4))
+
+
+async def _init_pg_connection(connection) -> None:
+    """Register the pgvector codec, which asyncpg does not know, on a new connection."""
+    schema = await connection.fetchval(
+        "SELECT typnamespace::regnamespace::text FROM pg_type WHERE typname = 'vector'"
+    )
+    await connection.set_type_codec(
+        "vector", schema=schema, encoder=_encode_vector, decoder=_decode_vector, format="binary"
+    )
+
+
+async def get_pg_pool():
+    """
+    Get the running event loop's shared direct Postgres connection pool, creating it on first use.
+
+    Returns:
+        asyncpg pool, or None if asyncpg is not installed, DATABASE_URL is not
+        set or the connection failed
+    """
+    dsn = os.getenv("DATABASE_URL")
+    if asyncpg is None or not dsn:
+        return None
+
+    clients = _get_loop_clients()
+    if clients.pg_pool_failed:
+        return None
+
+    async with clients.pg_pool_lock:
+        if clients.pg_pool is None and not clients.pg_pool_failed:
+            try:
+                # No statement cache, so the pool also works through the Supabase pooler
+                clients.pg_pool = await asyncpg.create_pool(
+                    dsn,
+                    max_size=MAX_CONCURRENT_INSERTS,
+                    statement_cache_size=0,
+                    init=_init_pg_connection
+                )
+            except Exception as e:
+                clients.pg_pool_failed = True
+                print(f"Error connecting to DATABASE_URL, inserting through Supabase instead: {e}")
+    return clients.pg_pool
 
 
 # ========== Retry Decorator ==========
 
-def async_retry(max_attempts: int = 3, backoff_factor: int = 2):
+def async_retry(
+    max_attempts: int = 3,
+    backoff_factor: int = 2,
+    retry_on: tuple = RETRYABLE_EXCEPTIONS
+):
     """
-    Retry decorator for async functions with exponential backoff.
+    Retry decorator for async functions with jittered exponential backoff.
+
+    Only exceptions in retry_on are retried; permanent failures such as
+    ValueError are raised on the first attempt.
 
     Args:
         max_attempts: Maximum number of retry attempts
-        backoff_factor: Multiplier for wait time between retries
+        backoff_factor: Base of the maximum wait time between retries
+        retry_on: Tuple of exception types that trigger a retry
     """
     def decorator(func):
         @wraps(func)
@@ -58,11 +222,12 @@ def async_retry(max_attempts: int = 3, backoff_factor: int = 2):
             for attempt in range(max_attempts):
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
+                except retry_on as e:
                     if attempt == max_attempts - 1:
                         raise
-                    wait_time = backoff_factor ** attempt
-                    print(f"Retry {attempt + 1}/{max_attempts} after {wait_time}s: {e}")
+                    # Full jitter keeps concurrent callers from retrying in lockstep
+                    wait_time = random.uniform(0, backoff_factor ** attempt)
+                    print(f"Retry {attempt + 1}/{max_attempts} after {wait_time:.2f}s: {e}")
                     await asyncio.sleep(wait_time)
         return wrapper
     return decorator
@@ -74,7 +239,7 @@ async def delete_document_by_file_id_async(supabase: AClient, file_id: str) -> N
     """
     Delete all records related to a specific file ID (async).
 
-    Removes from:
+    Removes, in one transaction:
     - documents table (chunks)
     - document_rows table (tabular data)
     - document_metadata table (file info)
@@ -84,45 +249,138 @@ async def delete_document_by_file_id_async(supabase: AClient, file_id: str) -> N
         file_id: File identifier (path or GDrive ID)
     """
     try:
-        print(f"Starting deletion for file_id: {file_id}")
-
-        # Delete all documents with the specified file_id in metadata
-        response = await supabase.table("documents").delete().eq("metadata->>file_id", file_id).execute()
-        print(f"Deleted {len(response.data)} document chunks for file ID: {file_id}")
-
-        # Delete all document_rows with the specified dataset_id
-        try:
-            rows_response = await supabase.table("document_rows").delete().eq("dataset_id", file_id).execute()
-            print(f"Deleted {len(rows_response.data)} document rows for file ID: {file_id}")
-        except Exception as e:
-            print(f"Error deleting document rows for file_id {file_id}: {e}")
-
-        # Delete the document_metadata record
-        try:
-            metadata_response = await supabase.table("document_metadata").delete().eq("id", file_id).execute()
-            print(f"Deleted metadata for file ID: {file_id}")
-        except Exception as e:
-            print(f"Error deleting document metadata for file_id {file_id}: {e}")
+        logger.debug("Starting deletion for file_id: %s", file_id)
+
+        # One call deletes from all three tables in a single transaction; this
+        # handler keys document_metadata by id, so it uses the id-matching variant
+        # (see db_migrations/003_add_document_replace_functions.sql)
+        response = await supabase.rpc("delete_document_cascade_by_id", {"p_file_id": file_id}).execute()
+        print(f"Deleted {response.data} document chunks, rows and metadata for file ID: {file_id}")
 
     except Exception as e:
         print(f"Error in delete_document_by_file_id_async for file_id {file_id}: {e}")
 
 
+def _chunk_base_metadata(file_meta: FileMetadata) -> Dict[str, Any]:
+    """
+    Build the metadata shared by every chunk of a file.
+
+    Args:
+        file_meta: File metadata including case study frontmatter
+
+    Returns:
+        Metadata dict without the per-chunk chunk_index
+    """
+    base_metadata = {
+        "file_id": file_meta.file_id,
+        "file_url": file_meta.file_url,
+        "file_title": file_meta.file_title,
+        "mime_type": file_meta.mime_type,
+    }
+
+    # Merge case study frontmatter if available; unset optional fields are left
+    # out so they are not copied into and sent with every chunk
+    if file_meta.case_study_metadata:
+        frontmatter_dict = file_meta.case_study_metadata.model_dump(exclude_none=True)
+        base_metadata.update(frontmatter_dict)
+
+    return base_metadata
+
+
+def _chunk_records(
+    chunks: List[str],
+    embeddings: List[List[float]],
+    base_metadata: Dict[str, Any],
+    start: int
+) -> List[Dict[str, Any]]:
+    """
+    Build the documents rows for one batch of chunks.
+
+    Args:
+        chunks: Text chunks in the batch
+        embeddings: Embedding vectors for the batch
+        base_metadata: Metadata shared by every chunk of the file
+        start: Chunk index of the first chunk in the batch
+
+    Returns:
+        Rows ready for insertion into the documents table
+    """
+    return [
+        {
+            "content": chunk,
+            "metadata": {**base_metadata, "chunk_index": start + i},
+            "embedding": serialize_embedding(embedding)
+        }
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+    ]
+
+
+@async_retry(max_attempts=3)
+async def _create_batch_embeddings(chunks: List[str]) -> List[List[float]]:
+    """Create the embeddings of one batch of chunks in a worker thread."""
+    return await asyncio.to_thread(create_embeddings, chunks)
+
+
 @async_retry(max_attempts=3)
+async def _insert_chunk_batch(
+    supabase: AClient,
+    pg_pool,
+    chunks: List[str],
+    embeddings: List[List[float]],
+    base_metadata: Dict[str, Any],
+    start: int
+) -> None:
+    """
+    Insert one batch of chunks, with COPY when a direct Postgres pool is given.
+
+    Transient failures are retried per batch, so one dropped connection does not
+    fail, or re-insert, the batches that already succeeded.
+
+    Args:
+        supabase: Async Supabase client
+        pg_pool: asyncpg pool from get_pg_pool(), or None to insert through PostgREST
+        chunks: Text chunks in the batch
+        embeddings: Embedding vectors for the batch
+        base_metadata: Metadata shared by every chunk of the file
+        start: Chunk index of the first chunk in the batch
+    """
+    if pg_pool is None:
+        batch = _chunk_records(chunks, embeddings, base_metadata, start)
+        await supabase.table("documents").insert(batch).execute()
+        return
+
+    records = [
+        (chunk, json.dumps({**base_metadata, "chunk_index": start + i}), embedding)
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings))
+    ]
+    await pg_pool.copy_records_to_table(
+        "documents",
+        records=records,
+        columns=["content", "metadata", "embedding"],
+        schema_name="public"
+    )
+
+
 async def insert_document_chunks_batch(
     supabase: AClient,
     chunks: List[str],
     embeddings: List[List[float]],
-    file_meta: FileMetadata
+    file_meta: FileMetadata,
+    max_concurrent: int = MAX_CONCURRENT_INSERTS
 ) -> int:
     """
     Insert document chunks in batches for performance (async).
 
+    Batches are independent, so up to max_concurrent of them are in flight at once.
+    Files with at least COPY_MIN_CHUNKS chunks are written with COPY over a direct
+    Postgres connection when one is available.
+
     Args:
         supabase: Async Supabase client
         chunks: List of text chunks
         embeddings: List of embedding vectors
         file_meta: File metadata including case study frontmatter
+        max_concurrent: Maximum number of batch inserts sent concurrently
 
     Returns:
         Total number of chunks inserted
@@ -130,45 +388,107 @@ async def insert_document_chunks_batch(
     if len(chunks) != len(embeddings):
         raise ValueError("Number of chunks and embeddings must match")
 
-    print(f"Starting batch insert for file_id: {file_meta.file_id} ({len(chunks)} chunks)")
-
-    # Prepare base metadata
-    base_metadata = {
-        "file_id": file_meta.file_id,
-        "file_url": file_meta.file_url,
-        "file_title": file_meta.file_title,
-        "mime_type": file_meta.mime_type,
-    }
-
-    # Merge case study frontmatter if available
-    if file_meta.case_study_metadata:
-        frontmatter_dict = file_meta.case_study_metadata.model_dump()
-        base_metadata.update(frontmatter_dict)
+    logger.debug("Starting batch insert for file_id: %s (%d chunks)", file_meta.file_id, len(chunks))
 
-    # Prepare all chunks
-    data = []
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        data.append({
-            "content": chunk,
-            "metadata": {**base_metadata, "chunk_index": i},
-            "embedding": embedding
-        })
+    base_metadata = _chunk_base_metadata(file_meta)
+    pg_pool = await get_pg_pool() if len(chunks) >= COPY_MIN_CHUNKS else None
 
     # Insert in batches
-    total_chunks = len(data)
+    total_chunks = len(chunks)
     total_batches = (total_chunks + BATCH_SIZE - 1) // BATCH_SIZE
 
-    for i in range(0, total_chunks, BATCH_SIZE):
-        batch = data[i:i + BATCH_SIZE]
-        batch_num = i // BATCH_SIZE + 1
-        print(f"Inserting batch {batch_num}/{total_batches} ({len(batch)} chunks)")
+    semaphore = asyncio.Semaphore(max_concurrent)
 
-        await supabase.table("documents").insert(batch).execute()
+    async def insert_batch(batch_num: int, start: int) -> None:
+        async with semaphore:
+            # Build the rows only once the batch is allowed to send, so at most
+            # max_concurrent batches of records exist at a time
+            end = min(start + BATCH_SIZE, total_chunks)
+            logger.debug("Inserting batch %d/%d (%d chunks)", batch_num, total_batches, end - start)
+            await _insert_chunk_batch(
+                supabase, pg_pool, chunks[start:end], embeddings[start:end], base_metadata, start
+            )
+
+    await asyncio.gather(*(
+        insert_batch(start // BATCH_SIZE + 1, start)
+        for start in range(0, total_chunks, BATCH_SIZE)
+    ))
+
+    print(f"Successfully inserted {total_chunks} chunks for file_id: {file_meta.file_id}")
+    return total_chunks
+
+
+async def embed_and_insert_chunks(
+    supabase: AClient,
+    chunks: List[str],
+    file_meta: FileMetadata,
+    max_concurrent: int = MAX_CONCURRENT_INSERTS,
+    ready: Optional[Awaitable[Any]] = None
+) -> int:
+    """
+    Create embeddings and insert chunks as a pipeline (async).
+
+    Embeddings are requested one batch at a time and handed to insert workers
+    through a bounded queue, so the database inserts of earlier batches overlap
+    the embedding requests of later ones instead of waiting for all of them.
+
+    Args:
+        supabase: Async Supabase client
+        chunks: List of text chunks
+        file_meta: File metadata including case study frontmatter
+        max_concurrent: Maximum number of batch inserts sent concurrently
+        ready: Optional awaitable that must finish before the first insert
+            (e.g. deleting the file's old records)
+
+    Returns:
+        Total number of chunks inserted
+    """
+    logger.debug("Starting pipelined insert for file_id: %s (%d chunks)", file_meta.file_id, len(chunks))
+
+    base_metadata = _chunk_base_metadata(file_meta)
+    pg_pool = await get_pg_pool() if len(chunks) >= COPY_MIN_CHUNKS else None
+    total_batches = (len(chunks) + BATCH_SIZE - 1) // BATCH_SIZE
+    queue: asyncio.Queue = asyncio.Queue(maxsize=EMBEDDING_QUEUE_SIZE)
+    worker_count = max(1, min(max_concurrent, total_batches))
+    # Every worker waits on the same future, so a coroutine is wrapped only once
+    ready = asyncio.ensure_future(ready) if ready is not None else None
+
+    async def produce() -> None:
+        for start in range(0, len(chunks), BATCH_SIZE):
+            batch_chunks = chunks[start:start + BATCH_SIZE]
+            embeddings = await _create_batch_embeddings(batch_chunks)
+            if len(embeddings) != len(batch_chunks):
+                raise ValueError("Number of chunks and embeddings must match")
+            await queue.put((start, batch_chunks, embeddings))
+        for _ in range(worker_count):
+            await queue.put(None)
+
+    async def consume() -> int:
+        if ready is not None:
+            await ready
+        inserted = 0
+        while (item := await queue.get()) is not None:
+            start, batch_chunks, embeddings = item
+            logger.debug("Inserting batch %d/%d (%d chunks)", start // BATCH_SIZE + 1, total_batches, len(batch_chunks))
+            await _insert_chunk_batch(supabase, pg_pool, batch_chunks, embeddings, base_metadata, start)
+            inserted += len(batch_chunks)
+        return inserted
+
+    producer = asyncio.create_task(produce())
+    workers = [asyncio.create_task(consume()) for _ in range(worker_count)]
+    try:
+        results = await asyncio.gather(producer, *workers)
+    finally:
+        # If any stage failed, stop the others rather than leave them blocked on the queue
+        for task in (producer, *workers):
+            task.cancel()
 
+    total_chunks = sum(results[1:])
     print(f"Successfully inserted {total_chunks} chunks for file_id: {file_meta.file_id}")
     return total_chunks
 
 
+@async_retry(max_attempts=3)
 async def insert_or_update_document_metadata_async(
     supabase: AClient,
     file_meta: FileMetadata,
@@ -177,16 +497,15 @@ async def insert_or_update_document_metadata_async(
     """
     Insert or update document metadata record (async).
 
+    Errors are raised after logging, so the file is not recorded as ingested.
+
     Args:
         supabase: Async Supabase client
         file_meta: File metadata
         schema: Optional schema for tabular files (column names)
     """
     try:
-        print(f"Upserting metadata for file_id: {file_meta.file_id}")
-
-        # Check if record exists
-        response = await supabase.table("document_metadata").select("*").eq("id", file_meta.file_id).execute()
+        logger.debug("Upserting metadata for file_id: %s", file_meta.file_id)
 
         # Prepare data
         data = {
@@ -199,26 +518,27 @@ async def insert_or_update_document_metadata_async(
         if schema:
             data["schema"] = json.dumps(schema)
 
-        if response.data and len(response.data) > 0:
-            # Update existing record
-            await supabase.table("document_metadata").update(data).eq("id", file_meta.file_id).execute()
-            print(f"Updated metadata for file '{file_meta.file_title}' (ID: {file_meta.file_id})")
-        else:
-            # Insert new record
-            await supabase.table("document_metadata").insert(data).execute()
-            print(f"Inserted metadata for file '{file_meta.file_title}' (ID: {file_meta.file_id})")
+        # Insert or update in one statement, rather than checking for the record first
+        await supabase.table("document_metadata").upsert(data, on_conflict="id").execute()
+        print(f"Upserted metadata for file '{file_meta.file_title}' (ID: {file_meta.file_id})")
 
     except Exception as e:
         print(f"Error in insert_or_update_document_metadata_async for file_id {file_meta.file_id}: {e}")
+        raise
 
 
+@async_retry(max_attempts=3)
 async def insert_document_rows_async(
     supabase: AClient,
     file_id: str,
     rows: List[Dict[str, Any]]
 ) -> int:
     """
-    Insert tabular rows from CSV/Excel files (async).
+    Replace the tabular rows of a CSV/Excel file (async).
+
+    Existing rows are deleted and the new ones inserted in one transaction and
+    one round-trip, through the replace_document_rows database function. Errors
+    are raised after logging, so the file is not recorded as ingested.
 
     Args:
         supabase: Async Supabase client
@@ -229,25 +549,87 @@ async def insert_document_rows_async(
         Number of rows inserted
     """
     try:
-        print(f"Inserting {len(rows)} rows for file_id: {file_id}")
-
-        # First, delete any existing rows for this file (idempotent)
-        await supabase.table("document_rows").delete().eq("dataset_id", file_id).execute()
-        print(f"Deleted existing rows for file ID: {file_id}")
+        logger.debug("Inserting %d rows for file_id: %s", len(rows), file_id)
 
-        # Insert new rows
-        for row in rows:
-            await supabase.table("document_rows").insert({
-                "dataset_id": file_id,
-                "row_data": row
-            }).execute()
+        # Delete any existing rows for this file and insert the new ones atomically
+        response = await supabase.rpc(
+            "replace_document_rows", {"p_file_id": file_id, "p_rows": rows}
+        ).execute()
 
-        print(f"Inserted {len(rows)} rows for file ID: {file_id}")
-        return len(rows)
+        print(f"Inserted {response.data} rows for file ID: {file_id}")
+        return response.data
 
     except Exception as e:
         print(f"Error in insert_document_rows_async for file_id {file_id}: {e}")
-        return 0
+        raise
+
+
+def compute_content_hash(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    file_content: Optional[bytes] = None,
+    file_meta: Optional[FileMetadata] = None
+) -> str:
+    """
+    Fingerprint everything that determines a file's chunks, embeddings and rows.
+
+    Args:
+        text: Extracted text content
+        chunk_size: Chunk size used to split the text
+        chunk_overlap: Overlap between chunks
+        file_content: Binary file content, for tabular files whose rows come from it
+        file_meta: File metadata whose title, URL, MIME type and frontmatter are
+            copied into every chunk's metadata
+
+    Returns:
+        Hex digest of the content, chunking settings and chunk metadata
+    """
+    digest = hashlib.blake2b(f"{chunk_size}:{chunk_overlap}:".encode('utf-8'), digest_size=16)
+    digest.update(text.encode('utf-8'))
+    if file_content is not None:
+        digest.update(file_content)
+    if file_meta is not None:
+        # A renamed or moved file, or a frontmatter-only edit, changes the chunks'
+        # metadata even when the text is the same
+        chunk_metadata = json.dumps(_chunk_base_metadata(file_meta), sort_keys=True, default=str)
+        digest.update(chunk_metadata.encode('utf-8'))
+    return digest.hexdigest()
+
+
+async def get_content_hash_async(supabase: AClient, file_id: str) -> Optional[str]:
+    """
+    Get the content hash stored for a file's last successful ingestion (async).
+
+    Args:
+        supabase: Async Supabase client
+        file_id: File identifier
+
+    Returns:
+        Stored content hash, or None if the file has none or the lookup failed
+    """
+    try:
+        response = await supabase.table("document_metadata").select("content_hash").eq("id", file_id).execute()
+        if response.data:
+            return response.data[0].get("content_hash")
+    except Exception as e:
+        print(f"Error in get_content_hash_async for file_id {file_id}: {e}")
+    return None
+
+
+async def save_content_hash_async(supabase: AClient, file_id: str, content_hash: str) -> None:
+    """
+    Store the content hash of a successfully ingested file (async).
+
+    Args:
+        supabase: Async Supabase client
+        file_id: File identifier
+        content_hash: Hash from compute_content_hash
+    """
+    try:
+        await supabase.table("document_metadata").update({"content_hash": content_hash}).eq("id", file_id).execute()
+    except Exception as e:
+        print(f"Error in save_content_hash_async for file_id {file_id}: {e}")
 
 
 @async_retry(max_attempts=3)
@@ -262,12 +644,13 @@ async def process_file_for_rag_async(
     Process a file for RAG pipeline - full async workflow.
 
     Workflow:
-    1. Delete existing records for file_id (idempotent)
-    2. Check if tabular file (CSV/Excel)
-    3. Insert/update document metadata
-    4. Insert tabular rows if applicable
-    5. Chunk text and create embeddings
-    6. Batch insert chunks
+    1. Skip the file if its content, chunk metadata and chunking settings match the last
+       successful ingestion (only the metadata record is refreshed)
+    2. Check if tabular file (CSV/Excel) and chunk text
+    3. Delete existing records for file_id (idempotent) and insert/update
+       document metadata, while the first embeddings are created
+    4. Pipeline the remaining embedding requests with the chunk batch inserts,
+       inserting tabular rows if applicable at the same time
 
     Args:
         supabase: Async Supabase client
@@ -282,10 +665,7 @@ async def process_file_for_rag_async(
     start_time = datetime.now()
 
     try:
-        print(f"Starting process_file_for_rag_async for file_id: {file_meta.file_id}")
-
-        # Delete existing records first (idempotent operation)
-        await delete_document_by_file_id_async(supabase, file_meta.file_id)
+        logger.debug("Starting process_file_for_rag_async for file_id: %s", file_meta.file_id)
 
         # Check if tabular file
         is_tabular = False
@@ -294,27 +674,53 @@ async def process_file_for_rag_async(
         if file_meta.mime_type:
             is_tabular = is_tabular_file(file_meta.mime_type, config)
 
-        if is_tabular:
-            schema = extract_schema_from_csv(file_content)
-
-        # Insert or update document metadata (needed for foreign key)
-        await insert_or_update_document_metadata_async(supabase, file_meta, schema)
-
-        # Insert tabular rows if applicable
-        rows_inserted = 0
-        if is_tabular:
-            rows = extract_rows_from_csv(file_content)
-            if rows:
-                rows_inserted = await insert_document_rows_async(supabase, file_meta.file_id, rows)
-
         # Get text processing settings from config
         text_processing = config.get('text_processing', {})
         chunk_size = text_processing.get('default_chunk_size', DEFAULT_CHUNK_SIZE)
         chunk_overlap = text_processing.get('default_chunk_overlap', DEFAULT_CHUNK_OVERLAP)
 
+        # Unchanged files keep their chunks, embeddings and rows; only the
+        # metadata record (title, URL) is refreshed
+        content_hash = compute_content_hash(
+            text, chunk_size, chunk_overlap, file_content if is_tabular else None, file_meta
+        )
+        if await get_content_hash_async(supabase, file_meta.file_id) == content_hash:
+            await insert_or_update_document_metadata_async(supabase, file_meta)
+            print(f"Skipping unchanged file '{file_meta.file_title}' (ID: {file_meta.file_id})")
+            end_time = datetime.now()
+            processing_time = int((end_time - start_time).total_seconds() * 1000)
+
+            return IngestionResult(
+                success=True,
+                file_id=file_meta.file_id,
+                chunks_inserted=0,
+                rows_inserted=0,
+                error_message=None,
+                processing_time_ms=processing_time,
+                frontmatter_extracted=file_meta.case_study_metadata is not None
+            )
+
+        # CSV parsing and chunking are CPU-bound, so they run in worker threads
+        # to keep other files' database calls moving on the event loop. Tabular
+        # rows, if applicable, are inserted along with the chunks below
+        rows = []
+        if is_tabular:
+            schema, rows = await asyncio.to_thread(extract_schema_and_rows_from_csv, file_content)
+        rows_inserted = 0
+
         # Chunk the text
-        chunks = chunk_text(text, chunk_size=chunk_size, overlap=chunk_overlap)
+        chunks = await asyncio.to_thread(chunk_text, text, chunk_size, chunk_overlap)
+
+        async def reset_file_records() -> None:
+            # Delete existing records (idempotent operation), then insert or
+            # update the document metadata (needed for foreign key)
+            await delete_document_by_file_id_async(supabase, file_meta.file_id)
+            await insert_or_update_document_metadata_async(supabase, file_meta, schema)
+
         if not chunks:
+            await reset_file_records()
+            if rows:
+                rows_inserted = await insert_document_rows_async(supabase, file_meta.file_id, rows)
             print(f"No chunks created for file '{file_meta.file_title}' (ID: {file_meta.file_id})")
             end_time = datetime.now()
             processing_time = int((end_time - start_time).total_seconds() * 1000)
@@ -329,11 +735,26 @@ async def process_file_for_rag_async(
                 frontmatter_extracted=file_meta.case_study_metadata is not None
             )
 
-        # Create embeddings for chunks
-        embeddings = create_embeddings(chunks)
+        # Embedding starts right away; rows and chunks are only inserted once
+        # the old records are gone and the metadata record exists
+        records_ready = asyncio.create_task(reset_file_records())
+        chunk_insert = embed_and_insert_chunks(
+            supabase, chunks, file_meta,
+            config.get('max_concurrent_inserts', MAX_CONCURRENT_INSERTS),
+            ready=records_ready
+        )
+        if rows:
+            async def insert_rows() -> int:
+                await records_ready
+                return await insert_document_rows_async(supabase, file_meta.file_id, rows)
+
+            rows_inserted, chunks_inserted = await asyncio.gather(insert_rows(), chunk_insert)
+        else:
+            chunks_inserted = await chunk_insert
 
-        # Batch insert chunks
-        chunks_inserted = await insert_document_chunks_batch(supabase, chunks, embeddings, file_meta)
+        # Record the hash only now, so a failed ingestion is retried next time;
+        # metadata and row failures have already raised by this point
+        await save_content_hash_async(supabase, file_meta.file_id, content_hash)
 
         # Calculate processing time
         end_time = datetime.now()
@@ -2,6 +2,7 @@ from typing import List, Dict, Any, Optional
 import os
 import io
 import json
+import logging
 import traceback
 from datetime import datetime
 from dotenv import load_dotenv
@@ -11,9 +12,11 @@ import sys
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from text_processor import chunk_text, create_embeddings, is_tabular_file, extract_schema_from_csv, extract_rows_from_csv, extract_text_and_metadata
+from text_processor import chunk_text, create_embeddings, serialize_embedding, is_tabular_file, extract_schema_from_csv, extract_rows_from_csv, extract_text_and_metadata
 from section_aware_chunking import create_section_aware_chunks, chunks_to_db_format
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from the project root .env file
 # Get the path to the project root (4_Pydantic_AI_Agent directory)
 project_root = Path(__file__).resolve().parent.parent.parent
@@ -27,31 +30,25 @@ supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(supabase_url, supabase_key)
 
+# Maximum number of chunks sent in one embeddings request
+EMBEDDING_BATCH_SIZE = 512
+
+# Maximum number of document rows sent in one insert request
+ROWS_BATCH_SIZE = 500
+
 def delete_document_by_file_id(file_id: str) -> None:
     """
     Delete all records related to a specific file ID (documents, document_rows, and document_metadata).
+
+    All three tables are cleared by one RPC call in a single transaction
+    (see db_migrations/003_add_document_replace_functions.sql).
     
     Args:
         file_id: The Google Drive file ID
     """
     try:
-        # Delete all documents with the specified file_id in metadata
-        response = supabase.table("documents").delete().eq("metadata->>file_id", file_id).execute()
-        print(f"Deleted {len(response.data)} document chunks for file ID: {file_id}")
-        
-        # Delete all document_rows with the specified dataset_id
-        try:
-            rows_response = supabase.table("document_rows").delete().eq("dataset_id", file_id).execute()
-            print(f"Deleted {len(rows_response.data)} document rows for file ID: {file_id}")
-        except Exception as e:
-            print(f"Error deleting document rows: {e}")
-            
-        # Delete the document_metadata record
-        try:
-            metadata_response = supabase.table("document_metadata").delete().eq("file_id", file_id).execute()
-            print(f"Deleted metadata for file ID: {file_id}")
-        except Exception as e:
-            print(f"Error deleting document metadata: {e}")
+        response = supabase.rpc("delete_document_cascade", {"p_file_id": file_id}).execute()
+        print(f"Deleted {response.data} document chunks, rows and metadata for file ID: {file_id}")
             
     except Exception as e:
         print(f"Error deleting documents: {e}")
@@ -77,17 +74,19 @@ def insert_document_chunks(chunks: List[str], embeddings: List[List[float]], fil
         if len(chunks) != len(embeddings):
             raise ValueError("Number of chunks and embeddings must match")
 
+        # Encode the file once; every chunk's metadata shares the same string
+        file_bytes_str = base64.b64encode(file_contents).decode('utf-8') if file_contents else None
+
         # Prepare the data for insertion
         data = []
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            file_bytes_str = base64.b64encode(file_contents).decode('utf-8') if file_contents else None
-
             # Use enriched metadata if provided, otherwise create basic metadata
             if enriched_metadata and i < len(enriched_metadata):
-                metadata = enriched_metadata[i].copy()
-                # Add file_contents if present
+                # Only copy the enriched metadata when file_contents has to be added;
+                # otherwise it is sent as is
+                metadata = enriched_metadata[i]
                 if file_bytes_str:
-                    metadata["file_contents"] = file_bytes_str
+                    metadata = {**metadata, "file_contents": file_bytes_str}
             else:
                 metadata = {
                     "file_id": file_id,
@@ -101,7 +100,7 @@ def insert_document_chunks(chunks: List[str], embeddings: List[List[float]], fil
             data.append({
                 "content": chunk,
                 "metadata": metadata,
-                "embedding": embedding
+                "embedding": serialize_embedding(embedding)
             })
 
         # Batch insert for performance (100 chunks at a time)
@@ -112,7 +111,7 @@ def insert_document_chunks(chunks: List[str], embeddings: List[List[float]], fil
             batch = data[i:i + BATCH_SIZE]
             supabase.table("documents").insert(batch).execute()
             if total_batches > 1:
-                print(f"  Inserted batch {i//BATCH_SIZE + 1}/{total_batches} ({len(batch)} chunks)")
+                logger.debug("  Inserted batch %d/%d (%d chunks)", i // BATCH_SIZE + 1, total_batches, len(batch))
     except Exception as e:
         print(f"Error inserting/updating document chunks: {e}")
 
@@ -126,9 +125,6 @@ def insert_or_update_document_metadata(file_id: str, file_name: str, schema: Dic
         schema: Schema data - for CSV: column names, for Markdown: frontmatter dict
     """
     try:
-        # Check if the record already exists
-        response = supabase.table("document_metadata").select("*").eq("file_id", file_id).execute()
-
         # Prepare the data
         data = {
             "file_id": file_id,
@@ -136,18 +132,14 @@ def insert_or_update_document_metadata(file_id: str, file_name: str, schema: Dic
             "schema": schema  # JSONB - stores frontmatter for markdown or columns for CSV
         }
 
-        if response.data and len(response.data) > 0:
-            # Update existing record
-            supabase.table("document_metadata").update(data).eq("file_id", file_id).execute()
-            print(f"Updated metadata for file '{file_name}' (ID: {file_id})")
-        else:
-            # Insert new record
-            supabase.table("document_metadata").insert(data).execute()
-            print(f"Inserted metadata for file '{file_name}' (ID: {file_id})")
+        # Insert or update in one statement, rather than checking for the record first
+        supabase.table("document_metadata").upsert(data, on_conflict="file_id").execute()
+        print(f"Upserted metadata for file '{file_name}' (ID: {file_id})")
     except Exception as e:
         print(f"Error inserting/updating document metadata: {e}")
 
-def insert_document_rows(file_id: str, rows: List[Dict[str, Any]]) -> None:
+def insert_document_rows(file_id: str, rows: List[Dict[str, Any]], batch_size: int = ROWS_BATCH_SIZE,
+                         delete_existing: bool = True) -> None:
     """
     Insert rows into the document_rows table.
 
@@ -158,26 +150,28 @@ def insert_document_rows(file_id: str, rows: List[Dict[str, Any]]) -> None:
     Args:
         file_id: The file ID (references document_metadata.file_id)
         rows: List of row data as dictionaries
+        batch_size: Maximum number of rows sent per insert request
+        delete_existing: Whether to delete the file's existing rows first; callers
+            that already cleared them (e.g. via delete_document_by_file_id) skip it
     """
     try:
         # First, delete any existing rows for this file
-        supabase.table("document_rows").delete().eq("dataset_id", file_id).execute()
-        print(f"Deleted existing rows for file ID: {file_id}")
-
-        # Insert new rows
-        for row in rows:
-            supabase.table("document_rows").insert({
-                "dataset_id": file_id,
-                "row_data": row
-            }).execute()
+        if delete_existing:
+            supabase.table("document_rows").delete().eq("dataset_id", file_id).execute()
+            print(f"Deleted existing rows for file ID: {file_id}")
+
+        # Insert new rows, many per request instead of one round-trip per row
+        data = [{"dataset_id": file_id, "row_data": row} for row in rows]
+        for i in range(0, len(data), batch_size):
+            supabase.table("document_rows").insert(data[i:i + batch_size]).execute()
         print(f"Inserted {len(rows)} rows for file ID: {file_id}")
     except Exception as e:
         print(f"Error inserting document rows: {e}")
 
-def process_file_for_rag(file_content: bytes, text: str, file_id: str, file_url: str,
-                        file_title: str, mime_type: str = None, config: Dict[str, Any] = None) -> None:
+def prepare_file_for_rag(file_content: bytes, text: str, file_id: str, file_url: str,
+                         file_title: str, mime_type: str = None, config: Dict[str, Any] = None) -> Dict[str, Any]:
     """
-    Process a file for the RAG pipeline - delete existing records and insert new ones.
+    Chunk a file and collect its metadata for the RAG pipeline without touching the database.
 
     Uses section-aware chunking for markdown files with frontmatter,
     falls back to regular chunking for other file types.
@@ -190,150 +184,269 @@ def process_file_for_rag(file_content: bytes, text: str, file_id: str, file_url:
         file_title: The title of the file
         mime_type: Mime type of the file
         config: Configuration for things like the chunk size and overlap
+
+    Returns:
+        The prepared file: its identifiers, content, chunks, schema data, metric rows and chunk metadata
     """
-    try:
-        # First, delete any existing records for this file
-        delete_document_by_file_id(file_id)
-
-        # Prepare schema data for document_metadata table
-        schema_data = {}
-        metrics_rows = []
-
-        # Get text processing settings from config
-        text_processing = config.get('text_processing', {})
-        chunk_size = text_processing.get('default_chunk_size', 1500)  # Updated default
-        chunk_overlap = text_processing.get('default_chunk_overlap', 200)  # Updated default
-
-        # Check if this is a markdown file that might have frontmatter
-        is_markdown = (
-            mime_type and
-            ('text/markdown' in mime_type or
-             (mime_type.startswith('text/') and file_title.endswith('.md')))
+    # Prepare schema data for document_metadata table
+    schema_data = {}
+    metrics_rows = []
+
+    # Get text processing settings from config
+    text_processing = config.get('text_processing', {})
+    chunk_size = text_processing.get('default_chunk_size', 1500)  # Updated default
+    chunk_overlap = text_processing.get('default_chunk_overlap', 200)  # Updated default
+
+    # Check if this is a markdown file that might have frontmatter
+    is_markdown = (
+        mime_type and
+        ('text/markdown' in mime_type or
+         (mime_type.startswith('text/') and file_title.endswith('.md')))
+    )
+
+    chunks_list = []
+    enriched_metadata_list = None
+
+    if is_markdown:
+        print(f"Detected markdown file, using section-aware chunking for: {file_title}")
+
+        # Extract text and metadata (frontmatter)
+        body_text, frontmatter = extract_text_and_metadata(
+            file_content, mime_type, file_title, config
         )
 
-        chunks_list = []
-        embeddings = []
-        enriched_metadata_list = None
-
-        if is_markdown:
-            print(f"Detected markdown file, using section-aware chunking for: {file_title}")
-
-            # Extract text and metadata (frontmatter)
-            body_text, frontmatter = extract_text_and_metadata(
-                file_content, mime_type, file_title, config
-            )
-
-            # Create section-aware chunks ONCE
-            enriched_chunks = create_section_aware_chunks(
-                text=body_text,
-                frontmatter=frontmatter,
-                max_chunk_size=chunk_size,
-                file_id=file_id,
-                file_url=file_url,
-                file_title=file_title
-            )
-
-            # Extract section names (unique, ordered)
-            section_names = list(dict.fromkeys([chunk.section_name for chunk in enriched_chunks]))
-
-            # Store frontmatter + sections in document_metadata.schema
-            if frontmatter:
-                schema_data = {
-                    "type": "markdown",
-                    "frontmatter": frontmatter.model_dump(),
-                    "sections": section_names,
-                    "total_sections": len(section_names)
-                }
+        # Create section-aware chunks ONCE
+        enriched_chunks = create_section_aware_chunks(
+            text=body_text,
+            frontmatter=frontmatter,
+            max_chunk_size=chunk_size,
+            file_id=file_id,
+            file_url=file_url,
+            file_title=file_title
+        )
 
-                # Extract metrics as rows for document_rows
-                if frontmatter.key_metrics:
-                    if isinstance(frontmatter.key_metrics, dict):
-                        # Store each metric as a row
-                        for key, value in frontmatter.key_metrics.items():
-                            if isinstance(value, dict):
-                                # Nested metric (type/value/unit structure)
-                                metrics_rows.append({
-                                    "metric_name": key,
-                                    **value
-                                })
-                            else:
-                                # Simple key-value metric
-                                metrics_rows.append({
-                                    "metric_name": key,
-                                    "value": value
-                                })
-                    elif isinstance(frontmatter.key_metrics, list):
-                        # Already a list of metric objects
-                        metrics_rows = frontmatter.key_metrics
-            else:
-                schema_data = {
-                    "type": "markdown",
-                    "frontmatter": None,
-                    "sections": section_names,
-                    "total_sections": len(section_names)
-                }
+        # Extract section names (unique, ordered)
+        section_names = list(dict.fromkeys([chunk.section_name for chunk in enriched_chunks]))
+
+        # Store frontmatter + sections in document_metadata.schema
+        if frontmatter:
+            schema_data = {
+                "type": "markdown",
+                "frontmatter": frontmatter.model_dump(),
+                "sections": section_names,
+                "total_sections": len(section_names)
+            }
+
+            # Extract metrics as rows for document_rows
+            if frontmatter.key_metrics:
+                if isinstance(frontmatter.key_metrics, dict):
+                    # Store each metric as a row
+                    for key, value in frontmatter.key_metrics.items():
+                        if isinstance(value, dict):
+                            # Nested metric (type/value/unit structure)
+                            metrics_rows.append({
+                                "metric_name": key,
+                                **value
+                            })
+                        else:
+                            # Simple key-value metric
+                            metrics_rows.append({
+                                "metric_name": key,
+                                "value": value
+                            })
+                elif isinstance(frontmatter.key_metrics, list):
+                    # Already a list of metric objects
+                    metrics_rows = frontmatter.key_metrics
+        else:
+            schema_data = {
+                "type": "markdown",
+                "frontmatter": None,
+                "sections": section_names,
+                "total_sections": len(section_names)
+            }
+
+        # Extract text chunks and MINIMAL metadata (no frontmatter duplication)
+        chunks_list = [chunk.content for chunk in enriched_chunks]
+        enriched_metadata_list = [
+            {
+                "file_id": chunk.metadata["file_id"],
+                "file_title": chunk.metadata["file_title"],
+                "chunk_index": chunk.metadata["chunk_index"],
+                "section": chunk.metadata["section"],
+                "section_chunk_index": chunk.metadata["section_chunk_index"],
+                "chunk_role": chunk.metadata["chunk_role"]
+            }
+            for chunk in enriched_chunks
+        ]
+
+        print(f"Created {len(chunks_list)} section-aware chunks (frontmatter: {'Yes' if frontmatter else 'No'})")
+
+    else:
+        # Use regular chunking for non-markdown files
+        print(f"Using regular chunking for: {file_title}")
+        chunks_list = chunk_text(text, chunk_size=chunk_size, overlap=chunk_overlap)
+
+        # Set basic schema for non-markdown files
+        if not schema_data:
+            schema_data = {"type": "text", "mime_type": mime_type}
+
+    return {
+        "file_content": file_content,
+        "file_id": file_id,
+        "file_url": file_url,
+        "file_title": file_title,
+        "mime_type": mime_type,
+        "chunks": chunks_list,
+        "schema_data": schema_data,
+        "metrics_rows": metrics_rows,
+        "rows_batch_size": config.get('rows_batch_size', ROWS_BATCH_SIZE),
+        "enriched_metadata": enriched_metadata_list
+    }
+
+def store_prepared_file(prepared: Dict[str, Any], embeddings: List[List[float]]) -> bool:
+    """
+    Replace a file's records in the database with a prepared file and its chunk embeddings.
 
-            # Extract text chunks and MINIMAL metadata (no frontmatter duplication)
-            chunks_list = [chunk.content for chunk in enriched_chunks]
-            enriched_metadata_list = [
-                {
-                    "file_id": chunk.metadata["file_id"],
-                    "file_title": chunk.metadata["file_title"],
-                    "chunk_index": chunk.metadata["chunk_index"],
-                    "section": chunk.metadata["section"],
-                    "section_chunk_index": chunk.metadata["section_chunk_index"],
-                    "chunk_role": chunk.metadata["chunk_role"]
-                }
-                for chunk in enriched_chunks
-            ]
+    Args:
+        prepared: The file returned by prepare_file_for_rag
+        embeddings: One embedding per prepared chunk
 
-            print(f"Created {len(chunks_list)} section-aware chunks (frontmatter: {'Yes' if frontmatter else 'No'})")
+    Returns:
+        True if chunks were inserted, False if the file produced no chunks
+    """
+    file_id = prepared["file_id"]
+    file_url = prepared["file_url"]
+    file_title = prepared["file_title"]
+    mime_type = prepared["mime_type"]
+    chunks_list = prepared["chunks"]
+
+    # First, delete any existing records for this file
+    delete_document_by_file_id(file_id)
+
+    # Insert document metadata (YAML frontmatter or CSV schema)
+    if prepared["schema_data"]:
+        insert_or_update_document_metadata(file_id, file_title, prepared["schema_data"])
+
+    # Insert metrics/rows if present
+    if prepared["metrics_rows"]:
+        # delete_document_by_file_id above already removed the old rows
+        insert_document_rows(file_id, prepared["metrics_rows"], prepared.get("rows_batch_size", ROWS_BATCH_SIZE),
+                             delete_existing=False)
+
+    if not chunks_list:
+        print(f"No chunks were created for file '{file_title}' (ID: {file_id})")
+        return False
 
-        else:
-            # Use regular chunking for non-markdown files
-            print(f"Using regular chunking for: {file_title}")
-            chunks_list = chunk_text(text, chunk_size=chunk_size, overlap=chunk_overlap)
+    # For images, don't chunk the image, just store the title for RAG and include the binary in the metadata
+    if mime_type and mime_type.startswith("image"):
+        insert_document_chunks(chunks_list, embeddings, file_id, file_url, file_title, mime_type, prepared["file_content"])
+        return True
 
-            # Set basic schema for non-markdown files
-            if not schema_data:
-                schema_data = {"type": "text", "mime_type": mime_type}
+    # Insert the chunks with their embeddings (with enriched metadata if available)
+    print(f"Inserting {len(chunks_list)} chunks into database...")
+    insert_document_chunks(
+        chunks_list,
+        embeddings,
+        file_id,
+        file_url,
+        file_title,
+        mime_type,
+        enriched_metadata=prepared["enriched_metadata"]
+    )
+
+    print(f"SUCCESS: Processed {file_title}: {len(chunks_list)} chunks inserted")
+    return True
 
-        # Insert document metadata (YAML frontmatter or CSV schema)
-        if schema_data:
-            insert_or_update_document_metadata(file_id, file_title, schema_data)
+def process_file_for_rag(file_content: bytes, text: str, file_id: str, file_url: str,
+                        file_title: str, mime_type: str = None, config: Dict[str, Any] = None) -> None:
+    """
+    Process a file for the RAG pipeline - delete existing records and insert new ones.
 
-        # Insert metrics/rows if present
-        if metrics_rows:
-            insert_document_rows(file_id, metrics_rows)
+    Uses section-aware chunking for markdown files with frontmatter,
+    falls back to regular chunking for other file types.
 
-        if not chunks_list:
-            print(f"No chunks were created for file '{file_title}' (ID: {file_id})")
-            return False
+    Args:
+        file_content: The binary content of the file
+        text: The text content extracted from the file (may be unused if frontmatter extraction happens)
+        file_id: The Google Drive file ID
+        file_url: The URL to access the file
+        file_title: The title of the file
+        mime_type: Mime type of the file
+        config: Configuration for things like the chunk size and overlap
+    """
+    try:
+        prepared = prepare_file_for_rag(file_content, text, file_id, file_url, file_title, mime_type, config)
 
         # Create embeddings for the chunks
-        print(f"Generating embeddings for {len(chunks_list)} chunks...")
-        embeddings = create_embeddings(chunks_list)
-
-        # For images, don't chunk the image, just store the title for RAG and include the binary in the metadata
-        if mime_type and mime_type.startswith("image"):
-            insert_document_chunks(chunks_list, embeddings, file_id, file_url, file_title, mime_type, file_content)
-            return True
-
-        # Insert the chunks with their embeddings (with enriched metadata if available)
-        print(f"Inserting {len(chunks_list)} chunks into database...")
-        insert_document_chunks(
-            chunks_list,
-            embeddings,
-            file_id,
-            file_url,
-            file_title,
-            mime_type,
-            enriched_metadata=enriched_metadata_list
-        )
+        embeddings = []
+        if prepared["chunks"]:
+            print(f"Generating embeddings for {len(prepared['chunks'])} chunks...")
+            embeddings = create_embeddings(prepared["chunks"])
 
-        print(f"SUCCESS: Processed {file_title}: {len(chunks_list)} chunks inserted")
-        return True
+        return store_prepared_file(prepared, embeddings)
     except Exception as e:
         traceback.print_exc()
         print(f"Error processing file for RAG: {e}")
         return False
+
+def process_files_for_rag(files: List[Dict[str, Any]], config: Dict[str, Any] = None) -> List[bool]:
+    """
+    Process several files for the RAG pipeline, embedding all of their chunks together.
+
+    Embedding requests are batched across files rather than made once per file,
+    which matters most when many small files change at once.
+
+    Args:
+        files: Dicts with the process_file_for_rag arguments file_content, text,
+               file_id, file_url, file_title and mime_type
+        config: Configuration for things like the chunk size and overlap
+
+    Returns:
+        Whether each file was processed successfully, in input order
+    """
+    prepared_files = []
+    for file in files:
+        try:
+            prepared_files.append(prepare_file_for_rag(
+                file["file_content"], file["text"], file["file_id"], file["file_url"],
+                file["file_title"], file.get("mime_type"), config
+            ))
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error processing file for RAG: {e}")
+            prepared_files.append(None)
+
+    # Embed the chunks of all files together, in slices the embedding API accepts
+    all_chunks = [chunk for prepared in prepared_files if prepared for chunk in prepared["chunks"]]
+    all_embeddings = None
+    if all_chunks:
+        print(f"Generating embeddings for {len(all_chunks)} chunks across {len(files)} files...")
+        try:
+            all_embeddings = []
+            for start in range(0, len(all_chunks), EMBEDDING_BATCH_SIZE):
+                all_embeddings.extend(create_embeddings(all_chunks[start:start + EMBEDDING_BATCH_SIZE]))
+        except Exception as e:
+            # Fall back to embedding each file on its own so one bad file doesn't fail the rest
+            print(f"Error creating batched embeddings, embedding files one at a time: {e}")
+            all_embeddings = None
+
+    results = []
+    offset = 0
+    for prepared in prepared_files:
+        if prepared is None:
+            results.append(False)
+            continue
+        chunk_count = len(prepared["chunks"])
+        try:
+            if all_embeddings is not None:
+                embeddings = all_embeddings[offset:offset + chunk_count]
+            else:
+                embeddings = create_embeddings(prepared["chunks"]) if chunk_count else []
+            results.append(store_prepared_file(prepared, embeddings))
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Error processing file for RAG: {e}")
+            results.append(False)
+        offset += chunk_count
+
+    return results
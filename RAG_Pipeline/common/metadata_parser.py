@@ -14,6 +14,15 @@ from pydantic import ValidationError
 
 from schemas import CaseStudyFrontmatter
 
+# Frontmatter at the start of the file: ---, YAML content, ---, rest of content
+FRONTMATTER_PATTERN = re.compile(r'^---\s*\n(.*?)\n---\s*\n(.*)$', re.DOTALL)
+
+# libyaml's C loader is much faster; PyYAML builds without it fall back to pure Python
+try:
+    YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    YAML_LOADER = yaml.SafeLoader
+
 
 def extract_frontmatter(content: str) -> Tuple[Dict[str, Any], str]:
     """
@@ -35,9 +44,7 @@ def extract_frontmatter(content: str) -> Tuple[Dict[str, Any], str]:
         If no frontmatter found, returns ({}, original_content)
     """
     # Match YAML frontmatter: ---\n...\n---
-    # Pattern: start of string, ---, yaml content, ---, rest of content
-    pattern = r'^---\s*\n(.*?)\n---\s*\n(.*)$'
-    match = re.match(pattern, content, re.DOTALL)
+    match = FRONTMATTER_PATTERN.match(content)
 
     if not match:
         return {}, content
@@ -46,7 +53,7 @@ def extract_frontmatter(content: str) -> Tuple[Dict[str, Any], str]:
     body = match.group(2)
 
     try:
-        frontmatter = yaml.safe_load(frontmatter_text)
+        frontmatter = yaml.load(frontmatter_text, Loader=YAML_LOADER)
         return frontmatter or {}, body
     except yaml.YAMLError as e:
         print(f"Error parsing YAML frontmatter: {e}")
@@ -67,8 +74,9 @@ def validate_frontmatter(frontmatter: Dict[str, Any]) -> Optional[CaseStudyFront
         return None
 
     try:
-        # Use Pydantic to validate and convert
-        validated = CaseStudyFrontmatter(**frontmatter)
+        # Validate the dict directly in pydantic-core, without unpacking it into
+        # keyword arguments; non-mapping YAML (e.g. a list) fails validation too
+        validated = CaseStudyFrontmatter.model_validate(frontmatter)
         return validated
     except ValidationError as e:
         print(f"Frontmatter validation error: {e}")
@@ -95,14 +103,16 @@ def parse_case_study(file_content: bytes, file_name: str) -> Tuple[Optional[Case
         - If no frontmatter or invalid: (None, full_text)
     """
     try:
-        # Decode bytes to string
-        text_content = file_content.decode('utf-8', errors='replace')
+        # Decode bytes (or any buffer, e.g. an mmap) to string
+        text_content = str(file_content, 'utf-8', errors='replace')
+        # Frontmatter has to open the file, so anything else skips the regex
+        has_frontmatter = file_content[:3] == b'---'
     except Exception as e:
         print(f"Error decoding file {file_name}: {e}")
         return None, ""
 
     # Extract frontmatter
-    frontmatter_dict, body = extract_frontmatter(text_content)
+    frontmatter_dict, body = extract_frontmatter(text_content) if has_frontmatter else ({}, text_content)
 
     if not frontmatter_dict:
         print(f"No frontmatter found in {file_name}")
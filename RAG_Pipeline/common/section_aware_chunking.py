@@ -23,6 +23,13 @@ from dataclasses import dataclass
 
 from schemas import CaseStudyFrontmatter
 
+# Section header (# to ### Title) on its own line; the group keeps headers in re.split output
+HEADER_PATTERN = re.compile(r'^(#{1,3}\s+.+)$', re.MULTILINE)
+# Leading markdown header markers
+HEADER_MARKER_PATTERN = re.compile(r'^#{1,6}\s+')
+# [START OF SECTION] / [END OF SECTION] markers
+SECTION_MARKER_PATTERN = re.compile(r'\[(START|END) OF SECTION\]')
+
 
 @dataclass
 class Section:
@@ -56,57 +63,27 @@ def extract_sections(text: str) -> List[Section]:
     """
     sections = []
 
-    # Pattern: Section header (## Title) followed by optional markers and content
-    # We'll split by section headers first
-    header_pattern = r'^(#{1,3}\s+.+)$'
-
-    # Split text by headers while keeping them
-    parts = re.split(header_pattern, text, flags=re.MULTILINE)
-
-    current_header = None
-    current_content = []
+    # One pass over the headers; each section's content is the text up to the
+    # next header, and text before the first header is dropped
+    headers = list(HEADER_PATTERN.finditer(text))
 
-    for part in parts:
-        part = part.strip()
-        if not part:
+    for i, header in enumerate(headers):
+        content_end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        content = text[header.end():content_end].strip()
+        if not content:
             continue
 
-        # Check if this is a header
-        if re.match(header_pattern, part, flags=re.MULTILINE):
-            # Save previous section if exists
-            if current_header and current_content:
-                full_content = '\n\n'.join(current_content)
-                has_start = '[START OF SECTION]' in full_content
-                has_end = '[END OF SECTION]' in full_content
-
-                # Clean markers from content
-                clean_content = full_content.replace('[START OF SECTION]', '').replace('[END OF SECTION]', '').strip()
-
-                sections.append(Section(
-                    header=current_header,
-                    content=clean_content,
-                    start_marker=has_start,
-                    end_marker=has_end
-                ))
-
-            # Start new section
-            current_header = part
-            current_content = []
-        else:
-            current_content.append(part)
-
-    # Don't forget the last section
-    if current_header and current_content:
-        full_content = '\n\n'.join(current_content)
-        has_start = '[START OF SECTION]' in full_content
-        has_end = '[END OF SECTION]' in full_content
-        clean_content = full_content.replace('[START OF SECTION]', '').replace('[END OF SECTION]', '').strip()
+        # Find and clean the markers in the same pass
+        markers = set()
+        clean_content = SECTION_MARKER_PATTERN.sub(
+            lambda marker: markers.add(marker.group(1)) or '', content
+        ).strip()
 
         sections.append(Section(
-            header=current_header,
+            header=header.group(1).strip(),
             content=clean_content,
-            start_marker=has_start,
-            end_marker=has_end
+            start_marker='START' in markers,
+            end_marker='END' in markers
         ))
 
     return sections
@@ -138,7 +115,10 @@ def split_section_at_paragraphs(
     paragraphs = section.content.split('\n\n')
 
     chunks = []
-    current_chunk = section.header + '\n\n'
+    # Paragraphs of the chunk being built, joined once when it is saved
+    header_prefix = section.header + '\n\n'
+    current_parts = [header_prefix]
+    current_length = len(header_prefix)
 
     for para in paragraphs:
         para = para.strip()
@@ -146,23 +126,26 @@ def split_section_at_paragraphs(
             continue
 
         # If adding this paragraph would exceed max_chunk_size
-        if len(current_chunk) + len(para) + 2 > max_chunk_size:
+        if current_length + len(para) + 2 > max_chunk_size:
             # Save current chunk if it's not just the header
-            if len(current_chunk) > len(section.header) + 10:
-                chunks.append(current_chunk.strip())
+            if current_length > len(section.header) + 10:
+                chunks.append(''.join(current_parts).strip())
                 # Start new chunk with header
-                current_chunk = section.header + '\n\n' + para + '\n\n'
+                current_parts = [header_prefix, para, '\n\n']
+                current_length = len(header_prefix) + len(para) + 2
             else:
                 # First paragraph itself is huge, include it anyway
-                current_chunk += para + '\n\n'
-                chunks.append(current_chunk.strip())
-                current_chunk = section.header + '\n\n'
+                current_parts += [para, '\n\n']
+                chunks.append(''.join(current_parts).strip())
+                current_parts = [header_prefix]
+                current_length = len(header_prefix)
         else:
-            current_chunk += para + '\n\n'
+            current_parts += [para, '\n\n']
+            current_length += len(para) + 2
 
     # Add the last chunk
-    if len(current_chunk) > len(section.header) + 10:
-        chunks.append(current_chunk.strip())
+    if current_length > len(section.header) + 10:
+        chunks.append(''.join(current_parts).strip())
 
     return chunks
 
@@ -177,7 +160,7 @@ def extract_section_name(header: str) -> str:
         "# Title" -> "Title"
     """
     # Remove markdown header markers
-    clean = re.sub(r'^#{1,6}\s+', '', header)
+    clean = HEADER_MARKER_PATTERN.sub('', header)
     # Take first part before colon if exists
     clean = clean.split(':')[0].strip()
     return clean
@@ -224,6 +207,24 @@ def create_section_aware_chunks(
             end_marker=False
         )]
 
+    # Frontmatter fields are the same for every chunk, so read them off the
+    # model once instead of once per chunk
+    frontmatter_fields = {}
+    if frontmatter:
+        frontmatter_fields = {
+            "title": frontmatter.title,
+            "client": frontmatter.client,
+            "industry": frontmatter.industry,
+            "project_type": frontmatter.project_type,
+            "tech_stack": frontmatter.tech_stack,
+            "function": frontmatter.function,
+            "project_status": frontmatter.project_status,
+        }
+
+        # Add key metrics if present
+        if frontmatter.key_metrics:
+            frontmatter_fields["key_metrics"] = frontmatter.key_metrics
+
     enriched_chunks = []
     global_chunk_index = 0
 
@@ -247,20 +248,7 @@ def create_section_aware_chunks(
             }
 
             # Add frontmatter fields to metadata if available
-            if frontmatter:
-                metadata.update({
-                    "title": frontmatter.title,
-                    "client": frontmatter.client,
-                    "industry": frontmatter.industry,
-                    "project_type": frontmatter.project_type,
-                    "tech_stack": frontmatter.tech_stack,
-                    "function": frontmatter.function,
-                    "project_status": frontmatter.project_status,
-                })
-
-                # Add key metrics if present
-                if frontmatter.key_metrics:
-                    metadata["key_metrics"] = frontmatter.key_metrics
+            metadata.update(frontmatter_fields)
 
             # Determine chunk role
             if total_section_chunks == 1:
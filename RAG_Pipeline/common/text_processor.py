@@ -1,14 +1,21 @@
 import os
 import io
 import csv
+import mmap
 import sys
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple, Optional
 import pypdf
 from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 
+# orjson is optional; without it embeddings are sent as JSON float arrays
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Add common directory to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
@@ -27,6 +34,23 @@ load_dotenv(dotenv_path, override=True)
 api_key = os.getenv("EMBEDDING_API_KEY", "") or "ollama"
 openai_client = OpenAI(api_key=api_key, base_url=os.getenv("EMBEDDING_BASE_URL"))
 
+# Texts sent per embeddings request, and requests in flight at once
+EMBEDDING_REQUEST_SIZE = 100
+MAX_CONCURRENT_EMBEDDING_REQUESTS = 8
+
+# Decimal places kept per embedding component when sending vectors to the
+# database; about float16 precision for unit-normalized embeddings
+EMBEDDING_DECIMALS = 5
+
+# Tabular MIME type prefixes used when the config does not list any
+DEFAULT_TABULAR_MIME_TYPES = (
+    'csv',
+    'xlsx',
+    'text/csv',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'application/vnd.google-apps.spreadsheet'
+)
+
 def chunk_text(text: str, chunk_size: int = 400, overlap: int = 0) -> List[str]:
     """
     Split text into chunks of specified size with optional overlap.
@@ -45,28 +69,33 @@ def chunk_text(text: str, chunk_size: int = 400, overlap: int = 0) -> List[str]:
     # Clean the text
     text = text.replace('\r', '')
     
+    # An overlap as large as the chunk would only advance one character at a time
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    
     # Split text into chunks
     chunks = []
+    text_length = len(text)
+    min_break = chunk_size * 0.5
     i = 0
-    while i < len(text):
+    while i < text_length:
         # Get chunk of desired size
-        end = min(i + chunk_size, len(text))
-        chunk = text[i:end]
+        end = min(i + chunk_size, text_length)
 
-        # If not at end of text, find last space to avoid cutting words
-        if end < len(text):
-            last_space = chunk.rfind(' ')
-            last_newline = chunk.rfind('\n')
-            last_break = max(last_space, last_newline)
+        # If not at end of text, find last space to avoid cutting words; searching
+        # the text in place saves slicing each chunk twice
+        if end < text_length:
+            last_break = max(text.rfind(' ', i, end), text.rfind('\n', i, end)) - i
 
-            if last_break > chunk_size * 0.5:  # Only if we found a break in second half
-                chunk = text[i:i + last_break + 1]
+            if last_break > min_break:  # Only if we found a break in second half
+                end = i + last_break + 1
 
+        chunk = text[i:end]
         if chunk.strip():  # Only add non-empty chunks
             chunks.append(chunk)
 
         # Move forward by chunk_size - overlap, ensuring we always progress
-        i += max(len(chunk) - overlap, 1)
+        i += max(end - i - overlap, 1)
 
     return chunks
 
@@ -80,28 +109,14 @@ def extract_text_from_pdf(file_content: bytes) -> str:
     Returns:
         Extracted text from the PDF
     """
-    # Create a temporary file to store the PDF content
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
+    # Read the PDF straight from memory rather than through a temporary file;
+    # an mmap is already a seekable stream, so it is read in place
+    stream = file_content if isinstance(file_content, mmap.mmap) else io.BytesIO(file_content)
+    pdf_reader = pypdf.PdfReader(stream)
     
-    try:
-        # Open the PDF file
-        with open(temp_file_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            text = ""
-            
-            # Extract text from each page
-            for page in pdf_reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n\n"
-        
-        return text
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
+    # Extract text from each page, joining once instead of growing a string per page
+    page_texts = (page.extract_text() for page in pdf_reader.pages)
+    return "".join(page_text + "\n\n" for page_text in page_texts if page_text)
 
 def extract_text_from_file(file_content: bytes, mime_type: str, file_name: str, config: Dict[str, Any] = None) -> str:
     """
@@ -110,48 +125,88 @@ def extract_text_from_file(file_content: bytes, mime_type: str, file_name: str,
     Args:
         file_content: Binary content of the file
         mime_type: MIME type of the file
-        config: Configuration dictionary with supported_mime_types
+        config: Configuration dictionary (accepted for compatibility; extraction depends only on the MIME type)
         
     Returns:
         Extracted text from the file
     """
-    supported_mime_types = []
-    if config and 'supported_mime_types' in config:
-        supported_mime_types = config['supported_mime_types']
-    
     if 'application/pdf' in mime_type:
         return extract_text_from_pdf(file_content)
     elif mime_type.startswith('image'):
         return file_name
-    elif config and any(mime_type.startswith(t) for t in supported_mime_types):
-        return file_content.decode('utf-8', errors='replace')
     else:
-        # For unsupported file types, just try to extract the text
-        return file_content.decode('utf-8', errors='replace')
+        # Supported text types and anything else are decoded the same way, so
+        # there is no need to scan supported_mime_types here
+        return str(file_content, 'utf-8', errors='replace')
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """Create embeddings for one request's worth of texts."""
+    response = openai_client.embeddings.create(
+        model=os.getenv("EMBEDDING_MODEL_CHOICE"),
+        input=texts
+    )
+    
+    # Extract the embedding vectors from the response
+    return [item.embedding for item in response.data]
 
-def create_embeddings(texts: List[str]) -> List[List[float]]:
+def create_embeddings(texts: List[str], batch_size: int = EMBEDDING_REQUEST_SIZE,
+                      max_concurrent: int = MAX_CONCURRENT_EMBEDDING_REQUESTS) -> List[List[float]]:
     """
     Create embeddings for a list of text chunks using OpenAI.
+
+    More than batch_size texts are split into requests of similar-length texts,
+    sent up to max_concurrent at a time.
     
     Args:
         texts: List of text chunks to embed
+        batch_size: Maximum number of texts per embeddings request
+        max_concurrent: Maximum number of requests in flight at once
         
     Returns:
-        List of embedding vectors
+        List of embedding vectors, in the same order as texts
     """
     if not texts:
         return []
     
-    response = openai_client.embeddings.create(
-        model=os.getenv("EMBEDDING_MODEL_CHOICE"),
-        input=texts
-    )
+    if len(texts) <= batch_size:
+        return _embed_batch(texts)
     
-    # Extract the embedding vectors from the response
-    embeddings = [item.embedding for item in response.data]
+    # Sort by length so every request carries a similar number of tokens
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    
+    embeddings = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=min(max_concurrent, len(batches))) as executor:
+        results = executor.map(lambda batch: _embed_batch([texts[i] for i in batch]), batches)
+        for batch, batch_embeddings in zip(batches, results):
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
     
     return embeddings
 
+def serialize_embedding(embedding: List[float], decimals: int = EMBEDDING_DECIMALS) -> List[float] | str:
+    """
+    Prepare an embedding vector for a Supabase insert.
+
+    Components are rounded to float16-level precision, which keeps cosine
+    similarity practically unchanged while cutting each float from ~20
+    characters of JSON to ~8. When orjson is installed the vector is also
+    encoded up front as a pgvector text literal, so the client's stdlib JSON
+    encoder only has to copy one string instead of formatting every float.
+
+    Args:
+        embedding: Embedding vector
+        decimals: Decimal places kept per component
+
+    Returns:
+        The pgvector literal (e.g. "[0.1,0.2]"), or the rounded vector
+        when orjson is not available
+    """
+    embedding = [round(value, decimals) for value in embedding]
+    if orjson is None:
+        return embedding
+    return orjson.dumps(embedding).decode('utf-8')
+
 def is_tabular_file(mime_type: str, config: Dict[str, Any] = None) -> bool:
     """
     Check if a file is tabular based on its MIME type.
@@ -163,20 +218,17 @@ def is_tabular_file(mime_type: str, config: Dict[str, Any] = None) -> bool:
     Returns:
         bool: True if the file is tabular (CSV or Excel), False otherwise
     """
-    # Default tabular MIME types if config is not provided
-    tabular_mime_types = [
-        'csv',
-        'xlsx',
-        'text/csv',
-        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        'application/vnd.google-apps.spreadsheet'
-    ]
-    
     # Use tabular_mime_types from config if available
+    tabular_mime_types = DEFAULT_TABULAR_MIME_TYPES
     if config and 'tabular_mime_types' in config:
-        tabular_mime_types = config['tabular_mime_types']
+        tabular_mime_types = tuple(config['tabular_mime_types'])
     
-    return any(mime_type.startswith(t) for t in tabular_mime_types)
+    # str.startswith checks all prefixes in one call
+    return mime_type.startswith(tabular_mime_types)
+
+def _open_csv_text(file_content: bytes) -> io.TextIOWrapper:
+    """Decode CSV content lazily as it is read, instead of copying it into one string."""
+    return io.TextIOWrapper(io.BytesIO(file_content), encoding='utf-8', errors='replace', newline='')
 
 def extract_schema_from_csv(file_content: bytes) -> List[str]:
     """
@@ -189,10 +241,8 @@ def extract_schema_from_csv(file_content: bytes) -> List[str]:
         List[str]: List of column names
     """
     try:
-        # Decode the CSV content
-        text_content = file_content.decode('utf-8', errors='replace')
-        csv_reader = csv.reader(io.StringIO(text_content))
-        # Get the header row (first row)
+        # Only the header row (first row) is decoded
+        csv_reader = csv.reader(_open_csv_text(file_content))
         header = next(csv_reader)
         return header
     except Exception as e:
@@ -209,14 +259,25 @@ def extract_rows_from_csv(file_content: bytes) -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: List of row data as dictionaries
     """
+    return extract_schema_and_rows_from_csv(file_content)[1]
+
+def extract_schema_and_rows_from_csv(file_content: bytes) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Extract the column names and rows of a CSV file in a single parse.
+
+    Args:
+        file_content: The binary content of the CSV file
+
+    Returns:
+        Tuple of (column names, list of row data as dictionaries)
+    """
     try:
-        # Decode the CSV content
-        text_content = file_content.decode('utf-8', errors='replace')
-        csv_reader = csv.DictReader(io.StringIO(text_content))
-        return list(csv_reader)
+        csv_reader = csv.DictReader(_open_csv_text(file_content))
+        rows = list(csv_reader)
+        return list(csv_reader.fieldnames or []), rows
     except Exception as e:
         print(f"Error extracting rows from CSV: {e}")
-        return []
+        return [], []
 
 
 def extract_text_and_metadata(
@@ -23,7 +23,8 @@ with patch.dict(os.environ, {
             insert_document_chunks,
             insert_or_update_document_metadata,
             insert_document_rows,
-            process_file_for_rag
+            process_file_for_rag,
+            process_files_for_rag
         )
 
 # Create a mock for supabase client
@@ -33,51 +34,24 @@ def mock_supabase():
 
 class TestDeleteDocumentByFileId:
     @patch('common.db_handler.supabase')
-    def test_successful_deletion(self, mock_supabase):
+    def test_successful_deletion(self, mock_supabase, capfd):
         """Test deleting document by file ID"""
-        # Setup mocks
-        mock_documents_delete = MagicMock()
-        mock_documents_delete.eq.return_value.execute.return_value.data = [{"id": 1}, {"id": 2}]
-        
-        mock_rows_delete = MagicMock()
-        mock_rows_delete.eq.return_value.execute.return_value.data = [{"id": 3}, {"id": 4}, {"id": 5}]
-        
-        mock_metadata_delete = MagicMock()
-        mock_metadata_delete.eq.return_value.execute.return_value.data = [{"id": "file123"}]
-        
-        mock_supabase.table.side_effect = [
-            mock_documents_delete,
-            mock_rows_delete,
-            mock_metadata_delete
-        ]
+        mock_supabase.rpc.return_value.execute.return_value.data = 2
         
         # Call the function
         delete_document_by_file_id("file123")
         
         # Assertions
-        mock_supabase.table.assert_has_calls([
-            call("documents"),
-            call("document_rows"),
-            call("document_metadata")
-        ])
-        
-        mock_documents_delete.delete.assert_called_once()
-        mock_documents_delete.delete.return_value.eq.assert_called_once_with("metadata->>file_id", "file123")
-        
-        mock_rows_delete.delete.assert_called_once()
-        mock_rows_delete.delete.return_value.eq.assert_called_once_with("dataset_id", "file123")
-        
-        mock_metadata_delete.delete.assert_called_once()
-        mock_metadata_delete.delete.return_value.eq.assert_called_once_with("id", "file123")
+        mock_supabase.rpc.assert_called_once_with("delete_document_cascade", {"p_file_id": "file123"})
+        mock_supabase.table.assert_not_called()
+        captured = capfd.readouterr()
+        assert "Deleted 2 document chunks" in captured.out
     
     @patch('common.db_handler.supabase')
     def test_with_error(self, mock_supabase, capfd):
         """Test handling errors when deleting document"""
         # Setup mocks to raise exceptions
-        mock_documents_delete = MagicMock()
-        mock_documents_delete.delete.return_value.eq.return_value.execute.side_effect = Exception("DB error")
-        
-        mock_supabase.table.return_value = mock_documents_delete
+        mock_supabase.rpc.return_value.execute.side_effect = Exception("DB error")
         
         # Call the function with error handling
         delete_document_by_file_id("file123")
@@ -141,78 +115,52 @@ class TestInsertDocumentChunks:
             captured = capfd.readouterr()
             assert "Error inserting/updating document chunks: Number of chunks and embeddings must match" in captured.out
 
-class TestInsertOrUpdateDocumentMetadata:
     @patch('common.db_handler.supabase')
-    def test_insert_new_record(self, mock_supabase, capfd):
-        """Test inserting new document metadata"""
-        # Setup mocks
-        mock_select = MagicMock()
-        mock_select.execute.return_value.data = []  # No existing record
-        
-        mock_table = MagicMock()
-        mock_table.select.return_value.eq.return_value = mock_select
+    def test_enriched_metadata_with_file_contents(self, mock_supabase):
+        """Test that file contents are added to enriched metadata without modifying it"""
+        enriched = [{"file_id": "file123", "section": "Intro"}]
         
-        mock_supabase.table.return_value = mock_table
-        
-        # Call the function
-        insert_or_update_document_metadata("file123", "Test File", "https://example.com")
-        
-        # Assertions
-        mock_table.select.assert_called_once_with("*")
-        mock_table.select.return_value.eq.assert_called_once_with("id", "file123")
-        
-        # Should insert new record
-        mock_table.insert.assert_called_once()
-        insert_args = mock_table.insert.call_args[0][0]
-        assert insert_args["id"] == "file123"
-        assert insert_args["title"] == "Test File"
-        assert insert_args["url"] == "https://example.com"
+        insert_document_chunks(["Chunk 1"], [[0.1, 0.2]], "file123", "url", "Test File", "image/png",
+                               b"binary", enriched_metadata=enriched)
         
-        # Should print success message
-        captured = capfd.readouterr()
-        assert "Inserted metadata for file 'Test File' (ID: file123)" in captured.out
-    
+        batch = mock_supabase.table.return_value.insert.call_args[0][0]
+        assert batch[0]["metadata"]["section"] == "Intro"
+        assert batch[0]["metadata"]["file_contents"] == "YmluYXJ5"
+        assert "file_contents" not in enriched[0]
+
+class TestInsertOrUpdateDocumentMetadata:
     @patch('common.db_handler.supabase')
-    def test_update_existing_record(self, mock_supabase, capfd):
-        """Test updating existing document metadata"""
-        # Setup mocks
-        mock_select = MagicMock()
-        mock_select.execute.return_value.data = [{"id": "file123"}]  # Existing record
-        
+    def test_upsert_record(self, mock_supabase, capfd):
+        """Test inserting or updating document metadata with a single upsert"""
         mock_table = MagicMock()
-        mock_table.select.return_value.eq.return_value = mock_select
-        
         mock_supabase.table.return_value = mock_table
         
         # Call the function
-        insert_or_update_document_metadata("file123", "Test File", "https://example.com", ["col1", "col2"])
+        insert_or_update_document_metadata("file123", "Test File", {"type": "text"})
         
         # Assertions
-        # Should update existing record
-        mock_table.update.assert_called_once()
-        update_args = mock_table.update.call_args[0][0]
-        assert update_args["id"] == "file123"
-        assert update_args["title"] == "Test File"
-        assert update_args["url"] == "https://example.com"
-        assert update_args["schema"] == json.dumps(["col1", "col2"])
-        
-        mock_table.update.return_value.eq.assert_called_once_with("id", "file123")
+        # Should upsert without checking for an existing record first
+        mock_table.select.assert_not_called()
+        mock_table.upsert.assert_called_once_with(
+            {"file_id": "file123", "file_name": "Test File", "schema": {"type": "text"}},
+            on_conflict="file_id"
+        )
         
         # Should print success message
         captured = capfd.readouterr()
-        assert "Updated metadata for file 'Test File' (ID: file123)" in captured.out
+        assert "Upserted metadata for file 'Test File' (ID: file123)" in captured.out
     
     @patch('common.db_handler.supabase')
     def test_error_handling(self, mock_supabase, capfd):
         """Test error handling in metadata insertion/update"""
         # Setup mock to raise exception
         mock_table = MagicMock()
-        mock_table.select.return_value.eq.return_value.execute.side_effect = Exception("DB error")
+        mock_table.upsert.return_value.execute.side_effect = Exception("DB error")
         
         mock_supabase.table.return_value = mock_table
         
         # Call the function
-        insert_or_update_document_metadata("file123", "Test File", "https://example.com")
+        insert_or_update_document_metadata("file123", "Test File", {"type": "text"})
         
         # Verify error was logged
         captured = capfd.readouterr()
@@ -241,23 +189,37 @@ class TestInsertDocumentRows:
         mock_table.delete.assert_called_once()
         mock_table.delete.return_value.eq.assert_called_once_with("dataset_id", "file123")
         
-        # Should insert new rows
-        assert mock_table.insert.call_count == 2
-        
-        # Check first row insertion
-        first_call_args = mock_table.insert.call_args_list[0][0][0]
-        assert first_call_args["dataset_id"] == "file123"
-        assert first_call_args["row_data"] == {"name": "John", "age": 30}
-        
-        # Check second row insertion
-        second_call_args = mock_table.insert.call_args_list[1][0][0]
-        assert second_call_args["dataset_id"] == "file123"
-        assert second_call_args["row_data"] == {"name": "Jane", "age": 25}
+        # Should insert the new rows in one request
+        mock_table.insert.assert_called_once_with([
+            {"dataset_id": "file123", "row_data": {"name": "John", "age": 30}},
+            {"dataset_id": "file123", "row_data": {"name": "Jane", "age": 25}}
+        ])
         
         # Should print success message
         captured = capfd.readouterr()
         assert "Inserted 2 rows for file ID: file123" in captured.out
     
+    @patch('common.db_handler.supabase')
+    def test_insertion_in_batches(self, mock_supabase):
+        """Test that rows are sent in requests of at most batch_size rows"""
+        mock_table = MagicMock()
+        mock_supabase.table.return_value = mock_table
+        
+        insert_document_rows("file123", [{"n": i} for i in range(5)], batch_size=2)
+        
+        assert [len(call[0][0]) for call in mock_table.insert.call_args_list] == [2, 2, 1]
+    
+    @patch('common.db_handler.supabase')
+    def test_without_delete(self, mock_supabase):
+        """Test that existing rows are left alone when the caller already cleared them"""
+        mock_table = MagicMock()
+        mock_supabase.table.return_value = mock_table
+        
+        insert_document_rows("file123", [{"name": "John"}], delete_existing=False)
+        
+        mock_table.delete.assert_not_called()
+        mock_table.insert.assert_called_once()
+    
     @patch('common.db_handler.supabase')
     def test_error_handling(self, mock_supabase, capfd):
         """Test error handling in document rows insertion"""
@@ -374,3 +336,53 @@ class TestProcessFileForRag:
             ["Chunk 1", "Chunk 2"], [[0.1, 0.2], [0.3, 0.4]], 
             file_id, file_url, file_title, mime_type
         )
+
+class TestProcessFilesForRag:
+    @patch('common.db_handler.insert_document_chunks')
+    @patch('common.db_handler.insert_or_update_document_metadata')
+    @patch('common.db_handler.delete_document_by_file_id')
+    @patch('common.db_handler.create_embeddings')
+    @patch('common.db_handler.chunk_text')
+    def test_embeds_all_files_together(self, mock_chunk_text, mock_create_embeddings,
+                                       mock_delete_document, mock_insert_metadata, mock_insert_chunks):
+        """Test that chunks from several files are embedded in one request"""
+        mock_chunk_text.side_effect = [["A1", "A2"], ["B1"]]
+        mock_create_embeddings.return_value = [[0.1], [0.2], [0.3]]
+        config = {'text_processing': {'default_chunk_size': 400, 'default_chunk_overlap': 0}}
+        files = [
+            {'file_content': b'a', 'text': 'a', 'file_id': 'fileA', 'file_url': 'urlA',
+             'file_title': 'A.txt', 'mime_type': 'text/plain'},
+            {'file_content': b'b', 'text': 'b', 'file_id': 'fileB', 'file_url': 'urlB',
+             'file_title': 'B.txt', 'mime_type': 'text/plain'}
+        ]
+        
+        results = process_files_for_rag(files, config)
+        
+        assert results == [True, True]
+        mock_create_embeddings.assert_called_once_with(["A1", "A2", "B1"])
+        assert mock_delete_document.call_args_list == [call('fileA'), call('fileB')]
+        assert mock_insert_chunks.call_args_list[0][0][:3] == (["A1", "A2"], [[0.1], [0.2]], 'fileA')
+        assert mock_insert_chunks.call_args_list[1][0][:3] == (["B1"], [[0.3]], 'fileB')
+    
+    @patch('common.db_handler.insert_document_chunks')
+    @patch('common.db_handler.insert_or_update_document_metadata')
+    @patch('common.db_handler.delete_document_by_file_id')
+    @patch('common.db_handler.create_embeddings')
+    @patch('common.db_handler.chunk_text')
+    def test_falls_back_to_per_file_embeddings(self, mock_chunk_text, mock_create_embeddings,
+                                               mock_delete_document, mock_insert_metadata, mock_insert_chunks):
+        """Test that a failed batched request is retried one file at a time"""
+        mock_chunk_text.side_effect = [["A1"], ["B1"]]
+        mock_create_embeddings.side_effect = [Exception("Batch error"), [[0.1]], Exception("Bad file")]
+        config = {'text_processing': {'default_chunk_size': 400, 'default_chunk_overlap': 0}}
+        files = [
+            {'file_content': b'a', 'text': 'a', 'file_id': 'fileA', 'file_url': 'urlA',
+             'file_title': 'A.txt', 'mime_type': 'text/plain'},
+            {'file_content': b'b', 'text': 'b', 'file_id': 'fileB', 'file_url': 'urlB',
+             'file_title': 'B.txt', 'mime_type': 'text/plain'}
+        ]
+        
+        results = process_files_for_rag(files, config)
+        
+        assert results == [True, False]
+        mock_delete_document.assert_called_once_with('fileA')
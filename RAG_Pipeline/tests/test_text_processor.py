@@ -28,9 +28,11 @@ with patch.dict(os.environ, {
             extract_text_from_pdf, 
             extract_text_from_file, 
             create_embeddings, 
+            serialize_embedding,
             is_tabular_file, 
             extract_schema_from_csv, 
-            extract_rows_from_csv
+            extract_rows_from_csv,
+            extract_schema_and_rows_from_csv
         )
 
 class TestChunkText:
@@ -71,19 +73,23 @@ class TestChunkText:
         # Last chunk might be shorter
         assert len(result[3]) <= 400
 
+    def test_breaks_at_word_boundary(self):
+        """Test that chunks end after the last space in their second half"""
+        text = "word " * 100
+        result = chunk_text(text, chunk_size=42)
+        assert result[0] == "word " * 8
+        assert "".join(result) == text
+    
+    def test_overlap_not_smaller_than_chunk_size(self):
+        """Test that an overlap as large as the chunk size is rejected"""
+        with pytest.raises(ValueError):
+            chunk_text("A" * 1000, chunk_size=400, overlap=400)
+
 class TestExtractTextFromPdf:
-    @patch('tempfile.NamedTemporaryFile')
     @patch('pypdf.PdfReader')
-    @patch('os.path.exists')
-    @patch('os.remove')
-    @patch('builtins.open', new_callable=mock_open)
-    def test_extract_text(self, mock_file_open, mock_remove, mock_exists, mock_pdf_reader, mock_temp_file):
+    def test_extract_text(self, mock_pdf_reader):
         """Test extracting text from PDF"""
         # Setup mocks
-        mock_temp = MagicMock()
-        mock_temp.name = 'temp.pdf'
-        mock_temp_file.return_value.__enter__.return_value = mock_temp
-        
         mock_page1 = MagicMock()
         mock_page1.extract_text.return_value = "Page 1 content"
         mock_page2 = MagicMock()
@@ -93,15 +99,12 @@ class TestExtractTextFromPdf:
         mock_reader.pages = [mock_page1, mock_page2]
         mock_pdf_reader.return_value = mock_reader
         
-        mock_exists.return_value = True
-        
         # Call the function
         result = extract_text_from_pdf(b'fake pdf content')
         
         # Assertions
         assert result == "Page 1 content\n\nPage 2 content\n\n"
-        mock_temp.write.assert_called_once_with(b'fake pdf content')
-        mock_remove.assert_called_once_with('temp.pdf')
+        assert mock_pdf_reader.call_args[0][0].getvalue() == b'fake pdf content'
 
 class TestExtractTextFromFile:
     @patch('common.text_processor.extract_text_from_pdf')
@@ -172,6 +175,43 @@ class TestCreateEmbeddings:
             )
             assert result == [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]]
 
+    def test_batched_requests_keep_order(self, openai_client_mock):
+        """Test that texts are sent in length-sorted batches and results keep the input order"""
+        def create(model, input):
+            response = MagicMock()
+            response.data = [MagicMock(embedding=[float(len(text))]) for text in input]
+            return response
+        
+        openai_client_mock.embeddings.create.side_effect = create
+        texts = ["ccc", "a", "eeeee", "bb", "dddd"]
+        
+        with patch('common.text_processor.openai_client', openai_client_mock):
+            result = create_embeddings(texts, batch_size=2)
+        
+        assert result == [[3.0], [1.0], [5.0], [2.0], [4.0]]
+        inputs = sorted(call.kwargs["input"] for call in openai_client_mock.embeddings.create.call_args_list)
+        assert inputs == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+
+class TestSerializeEmbedding:
+    def test_without_orjson(self):
+        """Test the vector is passed through unchanged when orjson is missing"""
+        with patch('common.text_processor.orjson', None):
+            assert serialize_embedding([0.1, 0.2]) == [0.1, 0.2]
+
+    def test_with_orjson(self):
+        """Test the vector is encoded as a pgvector literal when orjson is available"""
+        orjson_mock = MagicMock()
+        orjson_mock.dumps.return_value = b"[0.1,0.2]"
+        with patch('common.text_processor.orjson', orjson_mock):
+            assert serialize_embedding([0.1, 0.2]) == "[0.1,0.2]"
+        orjson_mock.dumps.assert_called_once_with([0.1, 0.2])
+
+    def test_rounds_components(self):
+        """Test components are rounded to float16-level precision"""
+        with patch('common.text_processor.orjson', None):
+            result = serialize_embedding([0.0123456789, -0.98765432])
+        assert result == [0.01235, -0.98765]
+
 class TestIsTabularFile:
     @pytest.mark.parametrize("mime_type,expected", [
         ('text/csv', True),
@@ -239,3 +279,17 @@ class TestExtractRowsFromCsv:
         # Check that error was printed
         captured = capfd.readouterr()
         assert "Error extracting rows from CSV" in captured.out
+
+class TestExtractSchemaAndRowsFromCsv:
+    def test_valid_csv(self):
+        """Test extracting column names and rows from CSV in one parse"""
+        csv_content = 'Name,City\r\nJosé,"Lyon\r\nNord"\r\n'.encode('utf-8')
+        
+        schema, rows = extract_schema_and_rows_from_csv(csv_content)
+        
+        assert schema == ['Name', 'City']
+        assert rows == [{'Name': 'José', 'City': 'Lyon\r\nNord'}]
+    
+    def test_empty_csv(self):
+        """Test extracting from an empty CSV returns no columns or rows"""
+        assert extract_schema_and_rows_from_csv(b'') == ([], [])
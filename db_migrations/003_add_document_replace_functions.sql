@@ -0,0 +1,93 @@
+-- ============================================================
+-- RAG Pipeline - Atomic Document Replace Functions
+-- ============================================================
+-- This migration adds RPC functions that the RAG pipeline uses to
+-- replace a file's tabular rows (async handler) and to delete a file's
+-- records (sync and async handlers) in a single round-trip. Each call runs in one transaction, so a file is
+-- never left with only part of its rows.
+--
+-- Execute this in your Supabase SQL Editor after sql/schema.sql.
+-- ============================================================
+
+-- ============================================================
+-- 1. Replace the Rows of a Tabular File
+-- ============================================================
+-- Deletes the existing rows for the file and inserts the new ones
+-- (a JSONB array of row objects). Returns the number of rows inserted.
+CREATE OR REPLACE FUNCTION replace_document_rows (
+  p_file_id TEXT,
+  p_rows JSONB
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  inserted_count INT;
+BEGIN
+  DELETE FROM document_rows WHERE dataset_id = p_file_id;
+
+  INSERT INTO document_rows (dataset_id, row_data)
+  SELECT p_file_id, value
+  FROM jsonb_array_elements(p_rows);
+
+  GET DIAGNOSTICS inserted_count = ROW_COUNT;
+  RETURN inserted_count;
+END;
+$$;
+
+COMMENT ON FUNCTION replace_document_rows IS 'Atomically replace the document_rows of a file';
+
+
+-- ============================================================
+-- 2. Delete All Records of a File
+-- ============================================================
+-- Removes the file's chunks, tabular rows and metadata record.
+-- Returns the number of chunks deleted.
+CREATE OR REPLACE FUNCTION delete_document_cascade (
+  p_file_id TEXT
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  deleted_chunks INT;
+BEGIN
+  DELETE FROM documents WHERE metadata->>'file_id' = p_file_id;
+  GET DIAGNOSTICS deleted_chunks = ROW_COUNT;
+
+  DELETE FROM document_rows WHERE dataset_id = p_file_id;
+  DELETE FROM document_metadata WHERE file_id = p_file_id;
+
+  RETURN deleted_chunks;
+END;
+$$;
+
+COMMENT ON FUNCTION delete_document_cascade IS 'Delete the chunks, rows and metadata of a file in one transaction';
+
+
+-- ============================================================
+-- 3. Delete All Records of a File (async handler)
+-- ============================================================
+-- Same as delete_document_cascade, for the async handler, which keys
+-- document_metadata by id (the file ID) rather than file_id.
+-- Returns the number of chunks deleted.
+CREATE OR REPLACE FUNCTION delete_document_cascade_by_id (
+  p_file_id TEXT
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  deleted_chunks INT;
+BEGIN
+  DELETE FROM documents WHERE metadata->>'file_id' = p_file_id;
+  GET DIAGNOSTICS deleted_chunks = ROW_COUNT;
+
+  DELETE FROM document_rows WHERE dataset_id = p_file_id;
+  DELETE FROM document_metadata WHERE id::text = p_file_id;
+
+  RETURN deleted_chunks;
+END;
+$$;
+
+COMMENT ON FUNCTION delete_document_cascade_by_id IS 'Delete the chunks, rows and metadata (keyed by id) of a file in one transaction';
@@ -0,0 +1,15 @@
+-- ============================================================
+-- RAG Pipeline - Index Documents by File ID
+-- ============================================================
+-- Chunks are looked up by metadata->>'file_id' every time a file is
+-- re-ingested or deleted (delete_document_cascade), and the hybrid
+-- search functions join on it. The GIN index on metadata does not
+-- serve this expression, so without this index each of those queries
+-- scans the whole documents table.
+--
+-- Execute this in your Supabase SQL Editor. New installs that ran the
+-- current sql/schema.sql already have this index.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_documents_file_id
+ON documents ((metadata->>'file_id'));
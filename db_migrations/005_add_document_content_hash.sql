@@ -0,0 +1,15 @@
+-- ============================================================
+-- RAG Pipeline - Content Hash for Unchanged-File Detection
+-- ============================================================
+-- The async RAG pipeline stores a hash of each file's text, chunking
+-- settings and chunk metadata after a successful ingestion. When a file is processed again
+-- with the same hash, chunking, embedding and inserts are skipped.
+--
+-- Execute this in your Supabase SQL Editor. Not needed for databases
+-- created from sql/schema.sql, which already includes the column.
+-- ============================================================
+
+ALTER TABLE document_metadata
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+COMMENT ON COLUMN document_metadata.content_hash IS 'Hash of the content, chunking settings and chunk metadata at the last successful ingestion';
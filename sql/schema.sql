@@ -49,6 +49,10 @@ CREATE INDEX IF NOT EXISTS idx_documents_metadata
 ON documents
 USING GIN (metadata);
 
+-- Index for per-file lookups (re-ingestion deletes, joins to document_metadata)
+CREATE INDEX IF NOT EXISTS idx_documents_file_id
+ON documents ((metadata->>'file_id'));
+
 -- Index for created_at (helpful for chronological queries)
 CREATE INDEX IF NOT EXISTS idx_documents_created_at
 ON documents (created_at DESC);
@@ -103,10 +107,12 @@ CREATE TABLE IF NOT EXISTS document_metadata (
     file_id TEXT UNIQUE NOT NULL,
     file_name TEXT NOT NULL,
     schema JSONB NOT NULL,
+    content_hash TEXT,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 COMMENT ON TABLE document_metadata IS 'Metadata and schema definitions for structured documents (CSVs, Excel files)';
+COMMENT ON COLUMN document_metadata.content_hash IS 'Hash of the content, chunking settings and chunk metadata at the last successful ingestion';
 
 -- Table for document rows
 CREATE TABLE IF NOT EXISTS document_rows (
@@ -2,10 +2,16 @@
 Unit tests for async_db_handler.py - Async database operations.
 """
 
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from RAG_Pipeline.common.async_db_handler import (
+    async_retry,
+    close_supabase,
+    compute_content_hash,
+    get_supabase,
     delete_document_by_file_id_async,
+    embed_and_insert_chunks,
     insert_document_chunks_batch,
     insert_or_update_document_metadata_async,
     insert_document_rows_async,
@@ -34,6 +40,16 @@ def mock_supabase():
     insert_mock.return_value.data = []
     supabase.table.return_value.insert.return_value.execute = insert_mock
 
+    # Mock rpc().execute() chain
+    rpc_mock = AsyncMock()
+    rpc_mock.return_value.data = 0
+    supabase.rpc.return_value.execute = rpc_mock
+
+    # Mock table().upsert().execute() chain
+    upsert_mock = AsyncMock()
+    upsert_mock.return_value.data = []
+    supabase.table.return_value.upsert.return_value.execute = upsert_mock
+
     # Mock table().update().eq().execute() chain
     update_mock = AsyncMock()
     update_mock.return_value.data = []
@@ -81,14 +97,46 @@ def sample_embeddings():
     ]
 
 
+@pytest.mark.asyncio
+async def test_get_supabase_reuses_client():
+    """Test that one pooled client is created and shared by every caller."""
+    client = MagicMock()
+    with patch('RAG_Pipeline.common.async_db_handler.create_async_client',
+               new_callable=AsyncMock, return_value=client) as mock_create:
+        first, second = await asyncio.gather(get_supabase(), get_supabase())
+        http_client = mock_create.call_args.kwargs["options"].httpx_client
+        await close_supabase()
+
+    assert first is client and second is client
+    mock_create.assert_called_once()
+    assert http_client.is_closed
+
+
+def test_get_supabase_creates_client_per_event_loop():
+    """Test that separate asyncio.run() calls each get a client bound to their own loop."""
+    async def get_and_close():
+        client = await get_supabase()
+        await close_supabase()
+        return client
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_async_client',
+               new_callable=AsyncMock, side_effect=[MagicMock(), MagicMock()]) as mock_create:
+        first = asyncio.run(get_and_close())
+        second = asyncio.run(get_and_close())
+
+    assert first is not second
+    assert mock_create.call_count == 2
+    http_clients = [call.kwargs["options"].httpx_client for call in mock_create.call_args_list]
+    assert all(http_client.is_closed for http_client in http_clients)
+
+
 @pytest.mark.asyncio
 async def test_delete_document_by_file_id_async(mock_supabase):
     """Test async deletion of document by file_id."""
     await delete_document_by_file_id_async(mock_supabase, "test_file_001")
 
-    # Verify delete was called for documents table
-    assert mock_supabase.table.called
-    assert "documents" in str(mock_supabase.table.call_args_list)
+    # All records are deleted in one database call, matching document_metadata on id
+    mock_supabase.rpc.assert_called_once_with("delete_document_cascade_by_id", {"p_file_id": "test_file_001"})
 
 
 @pytest.mark.asyncio
@@ -106,13 +154,179 @@ async def test_insert_document_chunks_batch(mock_supabase, sample_file_metadata,
     assert mock_supabase.table.called
 
 
+@pytest.mark.asyncio
+async def test_insert_document_chunks_batch_metadata(mock_supabase, sample_file_metadata):
+    """Test that chunk metadata carries the frontmatter without unset fields."""
+    await insert_document_chunks_batch(mock_supabase, ["a", "b"], [[0.1], [0.2]], sample_file_metadata)
+
+    batch = mock_supabase.table.return_value.insert.call_args[0][0]
+    assert [record["metadata"]["chunk_index"] for record in batch] == [0, 1]
+    assert batch[1]["metadata"]["client"] == "Test Client"
+    assert "project_status" not in batch[1]["metadata"]
+
+
+@pytest.mark.asyncio
+async def test_insert_document_chunks_batch_concurrent(mock_supabase, sample_file_metadata):
+    """Test that batches are inserted concurrently, up to the concurrency limit."""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def execute():
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+
+    mock_supabase.table.return_value.insert.return_value.execute = execute
+    chunks = [f"chunk {i}" for i in range(250)]
+
+    chunks_inserted = await insert_document_chunks_batch(
+        mock_supabase, chunks, [[0.1]] * 250, sample_file_metadata, max_concurrent=2
+    )
+
+    assert chunks_inserted == 250
+    batches = [call[0][0] for call in mock_supabase.table.return_value.insert.call_args_list]
+    assert [len(batch) for batch in batches] == [100, 100, 50]
+    assert batches[2][-1]["metadata"]["chunk_index"] == 249
+    assert max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_insert_document_chunks_batch_copy_for_large_files(mock_supabase, sample_file_metadata):
+    """Test that large files are written with COPY when a direct Postgres pool is available."""
+    pg_pool = MagicMock()
+    pg_pool.copy_records_to_table = AsyncMock()
+
+    with patch('RAG_Pipeline.common.async_db_handler.COPY_MIN_CHUNKS', 2), \
+         patch('RAG_Pipeline.common.async_db_handler.get_pg_pool', new_callable=AsyncMock, return_value=pg_pool):
+        chunks_inserted = await insert_document_chunks_batch(
+            mock_supabase, ["a", "b"], [[0.1], [0.2]], sample_file_metadata
+        )
+
+    assert chunks_inserted == 2
+    assert not mock_supabase.table.return_value.insert.called
+    records = pg_pool.copy_records_to_table.call_args.kwargs["records"]
+    assert [record[0] for record in records] == ["a", "b"]
+    assert records[1][2] == [0.2]
+    assert '"chunk_index": 1' in records[1][1]
+
+
+@pytest.mark.asyncio
+async def test_insert_document_chunks_batch_mismatch_not_retried(mock_supabase, sample_file_metadata):
+    """Test that a chunk/embedding mismatch fails immediately without retries."""
+    with patch("RAG_Pipeline.common.async_db_handler.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        with pytest.raises(ValueError):
+            await insert_document_chunks_batch(mock_supabase, ["a", "b"], [[0.1]], sample_file_metadata)
+
+    mock_sleep.assert_not_called()
+    assert not mock_supabase.table.called
+
+
+@pytest.mark.asyncio
+async def test_async_retry_retries_transient_errors():
+    """Test that retryable errors are retried with a jittered wait."""
+    attempts = 0
+
+    @async_retry(max_attempts=3, backoff_factor=2)
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    with patch("RAG_Pipeline.common.async_db_handler.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        assert await flaky() == "ok"
+
+    assert attempts == 3
+    waits = [call[0][0] for call in mock_sleep.call_args_list]
+    assert len(waits) == 2
+    assert 0 <= waits[0] <= 1 and 0 <= waits[1] <= 2
+
+
+@pytest.mark.asyncio
+async def test_embed_and_insert_chunks(mock_supabase, sample_file_metadata):
+    """Test that chunks are embedded and inserted batch by batch once ready."""
+    events = []
+
+    def embed(batch):
+        events.append(("embed", len(batch)))
+        return [[0.1]] * len(batch)
+
+    async def execute():
+        events.append(("insert",))
+
+    async def ready():
+        events.append(("ready",))
+
+    mock_supabase.table.return_value.insert.return_value.execute = execute
+    chunks = [f"chunk {i}" for i in range(250)]
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', side_effect=embed):
+        chunks_inserted = await embed_and_insert_chunks(
+            mock_supabase, chunks, sample_file_metadata, max_concurrent=2, ready=ready()
+        )
+
+    assert chunks_inserted == 250
+    assert [event for event in events if event[0] == "embed"] == [("embed", 100), ("embed", 100), ("embed", 50)]
+    assert events.index(("ready",)) < events.index(("insert",))
+    batches = [call[0][0] for call in mock_supabase.table.return_value.insert.call_args_list]
+    assert sorted(batch[0]["metadata"]["chunk_index"] for batch in batches) == [0, 100, 200]
+
+
+@pytest.mark.asyncio
+async def test_embed_and_insert_chunks_embedding_error(mock_supabase, sample_file_metadata):
+    """Test that an embedding failure stops the pipeline instead of hanging it."""
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', side_effect=ValueError("API error")):
+        with pytest.raises(ValueError, match="API error"):
+            await asyncio.wait_for(
+                embed_and_insert_chunks(mock_supabase, ["a", "b"], sample_file_metadata),
+                timeout=1
+            )
+
+    assert not mock_supabase.table.return_value.insert.called
+
+
+@pytest.mark.asyncio
+async def test_embed_and_insert_chunks_retries_transient_errors(mock_supabase, sample_file_metadata):
+    """Test that a transient embedding or insert failure retries only that batch."""
+    embed_calls = 0
+
+    def embed(batch):
+        nonlocal embed_calls
+        embed_calls += 1
+        if embed_calls == 1:
+            raise ConnectionError("connection reset")
+        return [[0.1]] * len(batch)
+
+    insert_mock = AsyncMock(side_effect=[ConnectionError("connection reset"), MagicMock(), MagicMock()])
+    mock_supabase.table.return_value.insert.return_value.execute = insert_mock
+    chunks = [f"chunk {i}" for i in range(150)]
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', side_effect=embed), \
+         patch("RAG_Pipeline.common.async_db_handler.asyncio.sleep", new_callable=AsyncMock):
+        chunks_inserted = await embed_and_insert_chunks(
+            mock_supabase, chunks, sample_file_metadata, max_concurrent=1
+        )
+
+    assert chunks_inserted == 150
+    assert embed_calls == 3
+    assert insert_mock.await_count == 3
+
+
 @pytest.mark.asyncio
 async def test_insert_or_update_document_metadata_async(mock_supabase, sample_file_metadata):
     """Test upsert of document metadata."""
     await insert_or_update_document_metadata_async(mock_supabase, sample_file_metadata)
 
-    # Verify select was called to check existence
-    assert mock_supabase.table.called
+    # A single upsert, without checking for an existing record first
+    mock_supabase.table.assert_called_once_with("document_metadata")
+    mock_supabase.table.return_value.upsert.assert_called_once_with(
+        {"id": "test_file_001", "title": "Test Case Study", "url": "/path/to/test.md"},
+        on_conflict="id"
+    )
+    mock_supabase.table.return_value.select.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -123,9 +337,15 @@ async def test_insert_document_rows_async(mock_supabase):
         {"col1": "val3", "col2": "val4"}
     ]
 
+    mock_supabase.rpc.return_value.execute.return_value.data = 2
+
     rows_inserted = await insert_document_rows_async(mock_supabase, "test_file_001", rows)
 
     assert rows_inserted == 2
+    # Existing rows are replaced with the new ones in a single database call
+    mock_supabase.rpc.assert_called_once_with(
+        "replace_document_rows", {"p_file_id": "test_file_001", "p_rows": rows}
+    )
 
 
 @pytest.mark.asyncio
@@ -161,6 +381,130 @@ async def test_process_file_for_rag_async_success(mock_supabase, sample_file_met
     assert result.frontmatter_extracted is True
 
 
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_skips_unchanged(mock_supabase, sample_file_metadata):
+    """Test that a file with the stored content hash is not re-embedded."""
+    content_hash = compute_content_hash("Test content", 400, 0, None, sample_file_metadata)
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"content_hash": content_hash}
+    ]
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings') as mock_embed:
+        result = await process_file_for_rag_async(
+            mock_supabase, b"Test content", "Test content", sample_file_metadata, {}
+        )
+
+    assert result.success is True
+    assert result.chunks_inserted == 0
+    mock_embed.assert_not_called()
+    mock_supabase.rpc.assert_not_called()
+    mock_supabase.table.return_value.upsert.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_saves_content_hash(mock_supabase, sample_file_metadata):
+    """Test that the content hash is stored after a successful ingestion."""
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', return_value=[[0.1]]):
+        result = await process_file_for_rag_async(
+            mock_supabase, b"Test content", "Test content", sample_file_metadata, {}
+        )
+
+    assert result.success is True
+    mock_supabase.table.return_value.update.assert_called_once_with(
+        {"content_hash": compute_content_hash("Test content", 400, 0, None, sample_file_metadata)}
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_reingests_changed_frontmatter(mock_supabase, sample_file_metadata):
+    """Test that a frontmatter-only edit is not skipped, so chunk metadata is refreshed."""
+    content_hash = compute_content_hash("Test content", 400, 0, None, sample_file_metadata)
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"content_hash": content_hash}
+    ]
+    sample_file_metadata.case_study_metadata.client = "Renamed Client"
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', return_value=[[0.1]]) as mock_embed:
+        result = await process_file_for_rag_async(
+            mock_supabase, b"Test content", "Test content", sample_file_metadata, {}
+        )
+
+    assert result.success is True
+    mock_embed.assert_called_once()
+    batch = mock_supabase.table.return_value.insert.call_args[0][0]
+    assert batch[0]["metadata"]["client"] == "Renamed Client"
+
+
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_reingests_renamed_file(mock_supabase, sample_file_metadata):
+    """Test that a renamed file with the same content is re-ingested so chunk titles are refreshed."""
+    content_hash = compute_content_hash("Test content", 400, 0, None, sample_file_metadata)
+    mock_supabase.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [
+        {"content_hash": content_hash}
+    ]
+    sample_file_metadata.file_title = "Renamed Case Study"
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', return_value=[[0.1]]) as mock_embed:
+        result = await process_file_for_rag_async(
+            mock_supabase, b"Test content", "Test content", sample_file_metadata, {}
+        )
+
+    assert result.success is True
+    mock_embed.assert_called_once()
+    batch = mock_supabase.table.return_value.insert.call_args[0][0]
+    assert batch[0]["metadata"]["file_title"] == "Renamed Case Study"
+
+
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_rows_failure_not_recorded(mock_supabase, sample_file_metadata):
+    """Test that a file whose rows failed to insert keeps no content hash."""
+    sample_file_metadata.mime_type = "text/csv"
+
+    async def rpc_execute():
+        if mock_supabase.rpc.call_args[0][0] == "replace_document_rows":
+            raise ConnectionError("connection reset")
+        return MagicMock(data=0)
+
+    mock_supabase.rpc.return_value.execute = rpc_execute
+
+    with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', return_value=[[0.1]]), \
+         patch("RAG_Pipeline.common.async_db_handler.asyncio.sleep", new_callable=AsyncMock):
+        result = await process_file_for_rag_async(
+            mock_supabase, b"Name\nAda\n", "Name\nAda\n", sample_file_metadata, {}
+        )
+
+    assert result.success is False
+    mock_supabase.table.return_value.update.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_file_for_rag_async_overlaps_delete_and_embeddings(mock_supabase, sample_file_metadata):
+    """Test that existing records are deleted while embeddings are being created."""
+    loop = asyncio.get_running_loop()
+    embeddings_started = asyncio.Event()
+    overlapped = False
+
+    def embed(chunks):
+        loop.call_soon_threadsafe(embeddings_started.set)
+        return [[0.1]] * len(chunks)
+
+    async def delete_execute():
+        nonlocal overlapped
+        await asyncio.wait_for(embeddings_started.wait(), timeout=1)
+        overlapped = True
+
+    mock_supabase.rpc.return_value.execute = delete_execute
+
+    with patch('RAG_Pipeline.common.async_db_handler.chunk_text', return_value=["chunk1"]):
+        with patch('RAG_Pipeline.common.async_db_handler.create_embeddings', side_effect=embed):
+            result = await process_file_for_rag_async(
+                mock_supabase, b"content", "content", sample_file_metadata, {}
+            )
+
+    assert result.success is True
+    assert overlapped
+
+
 @pytest.mark.asyncio
 async def test_process_file_for_rag_async_no_chunks(mock_supabase, sample_file_metadata):
     """Test processing when no chunks are created."""
@@ -76,6 +76,12 @@ def test_validate_frontmatter_required_fields():
     assert result is None  # Should return None on validation error
 
 
+def test_validate_frontmatter_not_a_mapping():
+    """Test that frontmatter YAML that is not a mapping fails validation."""
+    result = validate_frontmatter(["title", "client"])
+    assert result is None
+
+
 def test_validate_frontmatter_valid():
     """Test Pydantic validation with all required fields."""
     valid_frontmatter = {